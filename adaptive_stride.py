@@ -0,0 +1,118 @@
+"""
+Adaptive inference stride
+When inference can't keep up with the target frame rate the model only runs
+on every Nth frame. The frames in between get the last tracked detections
+moved along each track's velocity, so zone membership, entry/exit transitions
+and track last-seen frames keep updating every frame. Movement is measured in
+source frames (frame_index), so frames dropped before inference still count.
+The stride follows the measured inference time, going up under load and back
+down to 1 when there is room.
+"""
+import math
+import time
+
+import numpy as np
+
+MAX_STRIDE = 4
+SMOOTHING = 0.2  # Weight of the newest inference time in the running average
+STRIDE_HEADROOM = 0.8  # Only lower the stride when the smaller one would use at most this share of its budget
+
+
+class StrideController:
+    """Number of frames each inference has to cover to hold target_fps"""
+
+    def __init__(self, target_fps, max_stride=MAX_STRIDE, smoothing=SMOOTHING):
+        self.frame_budget = 1.0 / target_fps
+        self.max_stride = max(1, max_stride)
+        self.smoothing = smoothing
+        self.stride = 1
+        self.avg_time = None
+
+    def record(self, seconds):
+        """Feed one inference time and adjust the stride"""
+        if self.avg_time is None:
+            self.avg_time = seconds
+        else:
+            self.avg_time += self.smoothing * (seconds - self.avg_time)
+
+        needed = min(self.max_stride, max(1, math.ceil(self.avg_time / self.frame_budget)))
+        if needed > self.stride:
+            self.stride = needed
+        elif self.stride > 1 and self.avg_time <= (self.stride - 1) * self.frame_budget * STRIDE_HEADROOM:
+            # Step down one at a time so a single fast frame doesn't cause oscillation
+            self.stride -= 1
+        return self.stride
+
+
+class TrackExtrapolator:
+    """Moves the last inferred detections along per-track velocities"""
+
+    def __init__(self):
+        self.detections = None
+        self.velocity = None  # Box movement per frame, (N, 4)
+
+    def update(self, detections, frames):
+        """New inferred detections, frames after the previous inference"""
+        velocity = np.zeros((len(detections), 4))
+        previous = self.detections
+        if previous is not None and len(previous) and len(detections):
+            tracked = detections[:, 0] >= 0
+            _, new_idx, old_idx = np.intersect1d(detections[:, 0], previous[:, 0], return_indices=True)
+            keep = tracked[new_idx]
+            new_idx, old_idx = new_idx[keep], old_idx[keep]
+            velocity[new_idx] = (detections[new_idx, 3:7] - previous[old_idx, 3:7]) / max(1, frames)
+        self.detections = detections
+        self.velocity = velocity
+
+    def predict(self, frames_ahead):
+        """Tracked detections frames_ahead frames after the last inference"""
+        # Untracked boxes (id -1) can't be followed, and repeating them would count them again
+        tracked = self.detections[:, 0] >= 0
+        predicted = self.detections[tracked]
+        predicted[:, 3:7] += self.velocity[tracked] * frames_ahead
+        return predicted
+
+
+class AdaptiveInference:
+    """Wraps infer(frame) -> extract_detections() array, skipping frames under load
+
+    Called as (frame, frame_index); without frame_index calls are counted as frames.
+    """
+
+    def __init__(self, infer, target_fps, max_stride=MAX_STRIDE):
+        self.infer = infer
+        self.controller = StrideController(target_fps, max_stride)
+        self.extrapolator = TrackExtrapolator()
+        self._since_inference = 0  # Calls skipped since the last inference
+        self._inferred_index = None  # frame_index of the last inference
+        self._calls = 0
+        self.frames_inferred = 0
+        self.frames_extrapolated = 0
+
+    def __call__(self, frame, frame_index=None):
+        if frame_index is None:
+            frame_index = self._calls
+        self._calls += 1
+        if self.extrapolator.detections is not None and self._since_inference + 1 < self.controller.stride:
+            self._since_inference += 1
+            self.frames_extrapolated += 1
+            return self.extrapolator.predict(frame_index - self._inferred_index)
+
+        start = time.perf_counter()
+        detections = self.infer(frame)
+        self.controller.record(time.perf_counter() - start)
+        frames = 1 if self._inferred_index is None else frame_index - self._inferred_index
+        self.extrapolator.update(detections, frames)
+        self._since_inference = 0
+        self._inferred_index = frame_index
+        self.frames_inferred += 1
+        return detections
+
+    def stats(self):
+        avg_time = self.controller.avg_time or 0.0
+        return {
+            'stride': self.controller.stride,
+            'inferred': self.frames_inferred,
+            'extrapolated': self.frames_extrapolated,
+            'avgInferenceMs': round(avg_time * 1000, 1),
+        }
@@ -0,0 +1,258 @@
+"""
+Incremental alerting and district rollups
+Fed with the roundabouts that changed (detector ingest, simulated updates).
+Per district it keeps running sums: a changed roundabout takes its old
+contribution out and puts the new one in, so a batch costs O(changed), not a
+rescan. Alert rules have separate raise and clear thresholds (hysteresis) and
+one alert per roundabout and rule (deduplication). Active alerts and the
+district figures live in tables (IndexedTable, or backend tables shared
+between workers), queryable by district, roundabout, severity and score.
+
+Detectors report a car count as laneUtilization and running totals of risky
+behaviours, so congestion of detector-fed roundabouts comes from their
+congestionLevel, and behaviour rules look at how much a total grew within
+BEHAVIOUR_WINDOW rather than at the total itself.
+
+With several workers only one may run the engine (see app.py); a worker
+taking over calls resync() to rebuild the running sums from the stored state.
+"""
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+from state_store import IndexedTable
+
+ALERT_INDEXES = ('roundaboutId', 'districtId', 'severity', 'type')
+
+BEHAVIOUR_WINDOW = 300.0  # Seconds over which behaviour rules count events
+
+# Lane utilization (percent) a congestion level stands for, for roundabouts that report no percentage
+LEVEL_UTILIZATION = {'Low': 40, 'Moderate': 65, 'High': 85, 'Critical': 95}
+
+# Raised when value(roundabout) >= raise_at, cleared once it drops below clear_below.
+# A cumulative rule's value is a running total; the rule sees its growth over BEHAVIOUR_WINDOW.
+AlertRule = namedtuple('AlertRule', ['type', 'value', 'raise_at', 'clear_below', 'severity', 'message', 'impact',
+                                     'cumulative'], defaults=(False,))
+
+
+def lane_utilization(roundabout):
+    """Lane utilization in percent; detector-fed roundabouts report a car count, so theirs is estimated"""
+    if roundabout.get('source') == 'detector':
+        return LEVEL_UTILIZATION.get(roundabout.get('congestionLevel'))
+    return roundabout.get('laneUtilization')
+
+
+def _risky(field):
+    return lambda roundabout: (roundabout.get('riskyBehaviors') or {}).get(field)
+
+
+ALERT_RULES = (
+    AlertRule('congestion', lane_utilization, 85, 75,
+              lambda value: 'critical' if value >= 95 else 'concern',
+              lambda value: f'High congestion - {value:.0f}% lane utilization',
+              lambda value: f'{max(1, round((value - 60) / 3))}-minute average delay'),
+    AlertRule('severity', lambda roundabout: roundabout.get('severityScore'), 80, 70,
+              lambda value: 'critical' if value >= 90 else 'concern',
+              lambda value: f'Severity score {value:.0f}',
+              lambda value: 'Elevated incident risk'),
+    AlertRule('wrongWay', _risky('wrongWay'), 5, 3,
+              lambda value: 'critical',
+              lambda value: f'{value:.0f} wrong-way drivers in the last {BEHAVIOUR_WINDOW / 60:.0f} minutes',
+              lambda value: 'Head-on collision risk',
+              cumulative=True),
+)
+
+
+class CountWindow:
+    """Growth of a running total over the last window seconds"""
+
+    __slots__ = ('window', 'samples')
+
+    def __init__(self, window=BEHAVIOUR_WINDOW):
+        self.window = window
+        self.samples = deque()  # (time, total), oldest first; the first one is the baseline
+
+    def add(self, now, total):
+        """Record the total; returns its growth within the window, None until there is a baseline"""
+        samples = self.samples
+        if samples and total < samples[-1][1]:
+            # The counter restarted (e.g. a detector restart): count from zero again
+            samples.clear()
+            samples.append((now, 0))
+        samples.append((now, total))
+        while len(samples) > 1 and samples[1][0] <= now - self.window:
+            samples.popleft()
+        if len(samples) == 1:
+            return None
+        return total - samples[0][1]
+
+
+def district_severity(congestion_score):
+    """Severity label of a district from its congestion score"""
+    if congestion_score >= 80:
+        return 'critical'
+    if congestion_score >= 60:
+        return 'concern'
+    if congestion_score >= 40:
+        return 'attention'
+    return 'optimal'
+
+
+class DistrictRollup:
+    """Running sums for one district; view() holds only the derived figures"""
+
+    __slots__ = ('roundabouts', 'utilization_sum', 'active_alerts')
+
+    def __init__(self):
+        self.roundabouts = 0
+        self.utilization_sum = 0.0
+        self.active_alerts = 0
+
+    def view(self, district_id):
+        congestion_score = round(self.utilization_sum / self.roundabouts) if self.roundabouts else 0
+        return {
+            'id': district_id,
+            'reportingRoundabouts': self.roundabouts,
+            'activeAlerts': self.active_alerts,
+            'congestionScore': congestion_score,
+            'severity': district_severity(congestion_score),
+        }
+
+
+class AlertEngine:
+    """District aggregates and active alerts, updated from changed roundabouts"""
+
+    def __init__(self, district_names=None, rules=ALERT_RULES, alerts=None, rollups=None):
+        self.rules = rules
+        self.district_names = dict(district_names or {})
+        if alerts is None:
+            alerts = IndexedTable(indexes=ALERT_INDEXES, range_index='severityScore')
+        self.alerts = alerts
+        self.rollups = rollups if rollups is not None else IndexedTable()  # District id -> view()
+        self._contributions = {}  # roundabout id -> (district id, lane utilization)
+        self._windows = {}  # (rule type, roundabout id) -> CountWindow of a cumulative rule
+        self._districts = {}
+        self._lock = threading.Lock()
+
+    def rollup(self, district_id):
+        """Derived figures of a district, or None when none of its roundabouts reported"""
+        view = self.rollups.get(district_id)
+        if not view or not view['reportingRoundabouts']:
+            return None
+        return {key: value for key, value in view.items() if key != 'id'}
+
+    def resync(self, roundabouts):
+        """Rebuild the running sums from all roundabouts and the stored alerts, then fold them in"""
+        with self._lock:
+            self._contributions = {}
+            self._districts = {}
+            for alert in self.alerts.all():
+                self._district(alert['districtId']).active_alerts += 1
+        return self.observe(roundabouts, publish_all=True)
+
+    def observe(self, roundabouts, publish_all=False, now=None):
+        """Fold changed roundabout records in; returns the resources that changed"""
+        now = time.time() if now is None else now
+        changed = set()
+        puts = []
+        removes = []
+        with self._lock:
+            alerts_before = {district_id: rollup.active_alerts for district_id, rollup in self._districts.items()}
+            touched = set(self._districts) if publish_all else set()
+            # Latest record per roundabout, in case a batch repeats one
+            for roundabout in {roundabout['id']: roundabout for roundabout in roundabouts}.values():
+                touched.update(self._update_rollup(roundabout))
+                self._evaluate(roundabout, puts, removes, now)
+            if puts or removes:
+                changed.add('alerts')
+                self.alerts.put_many(puts)
+                for alert_id in removes:
+                    self.alerts.remove(alert_id)
+            touched.update(district_id for district_id, rollup in self._districts.items()
+                           if rollup.active_alerts != alerts_before.get(district_id, 0))
+            if touched:
+                changed.add('districts')
+                self.rollups.put_many([self._districts[district_id].view(district_id)
+                                       for district_id in touched if district_id is not None])
+        return changed
+
+    def _district(self, district_id):
+        rollup = self._districts.get(district_id)
+        if rollup is None:
+            rollup = self._districts[district_id] = DistrictRollup()
+        return rollup
+
+    def _update_rollup(self, roundabout):
+        """Swap the roundabout's old contribution for its new one; returns the districts that moved"""
+        roundabout_id = roundabout['id']
+        new = (roundabout.get('districtId'), float(lane_utilization(roundabout) or 0))
+        old = self._contributions.get(roundabout_id)
+        if old == new:
+            return ()
+        if old is not None:
+            rollup = self._district(old[0])
+            rollup.roundabouts -= 1
+            rollup.utilization_sum -= old[1]
+            if old[0] != new[0]:
+                self._move_alerts(roundabout_id, old[0], new[0])
+        rollup = self._district(new[0])
+        rollup.roundabouts += 1
+        rollup.utilization_sum += new[1]
+        self._contributions[roundabout_id] = new
+        return {new[0]} if old is None else {old[0], new[0]}
+
+    def _move_alerts(self, roundabout_id, old_district, new_district):
+        alerts, _ = self.alerts.query({'roundaboutId': roundabout_id})
+        if alerts:
+            self._district(old_district).active_alerts -= len(alerts)
+            self._district(new_district).active_alerts += len(alerts)
+            self.alerts.put_many([dict(alert, districtId=new_district,
+                                       districtName=self.district_names.get(new_district, new_district))
+                                  for alert in alerts])
+
+    def _evaluate(self, roundabout, puts, removes, now):
+        roundabout_id = roundabout['id']
+        district_id = roundabout.get('districtId')
+        for rule in self.rules:
+            value = rule.value(roundabout)
+            if value is not None and rule.cumulative:
+                window = self._windows.get((rule.type, roundabout_id))
+                if window is None:
+                    window = self._windows[(rule.type, roundabout_id)] = CountWindow()
+                value = window.add(now, value)
+            if value is None:
+                continue
+            alert_id = f'{rule.type}:{roundabout_id}'
+            active = self.alerts.get(alert_id)
+
+            if active is None:
+                if value >= rule.raise_at:
+                    puts.append(self._alert(alert_id, rule, roundabout, value, datetime.now().isoformat()))
+                    self._district(district_id).active_alerts += 1
+            elif value < rule.clear_below:
+                removes.append(alert_id)
+                self._district(active['districtId']).active_alerts -= 1
+            else:
+                # Still active: refresh it in place, keeping when it was raised
+                alert = self._alert(alert_id, rule, roundabout, value, active['timestamp'],
+                                    active.get('acknowledged', False))
+                if alert != active:
+                    puts.append(alert)
+
+    def _alert(self, alert_id, rule, roundabout, value, timestamp, acknowledged=False):
+        district_id = roundabout.get('districtId')
+        return {
+            'id': alert_id,
+            'roundaboutId': roundabout['id'],
+            'roundaboutName': roundabout.get('name'),
+            'districtId': district_id,
+            'districtName': self.district_names.get(district_id, district_id),
+            'severity': rule.severity(value),
+            'type': rule.type,
+            'message': rule.message(value),
+            'estimatedImpact': rule.impact(value),
+            'timestamp': timestamp,
+            'acknowledged': acknowledged,
+            'severityScore': roundabout.get('severityScore'),
+        }
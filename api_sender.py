@@ -0,0 +1,219 @@
+"""
+Background sender for detection payloads
+Keeps HTTP off the detection loop: frames submit their payload and a worker
+thread posts it over a pooled session, coalescing to the newest payload when
+the API can't keep up. A payload's 'profile' is held apart and goes out with
+whichever payload is posted next, so coalescing never drops it.
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ApiSender:
+    """Post payloads to the API from a background thread"""
+
+    def __init__(self, url, max_rate=10.0, queue_size=1, timeout=5,
+                 max_retries=3, backoff=0.25, max_backoff=5.0, encoder=None, codec=None, profiler=None):
+        self.url = url
+        self.encoder = encoder  # e.g. car_delta.DeltaEncoder; applied at send time so coalescing stays safe
+        self.codec = codec  # e.g. car_codec.BinaryCodec; None posts JSON
+        self.profiler = profiler  # e.g. profiling.Profiler; each HTTP post is timed as stage 'send'
+        self.min_interval = 1.0 / max_rate if max_rate and max_rate > 0 else 0.0
+        self.queue_size = max(1, queue_size)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        # One persistent connection pool, reused for every post
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._last_send = 0.0
+        self._profile = None  # Newest submitted profile not yet delivered
+
+        # Counters
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.resyncs = 0
+        self.last_latency = 0.0
+        self.avg_latency = 0.0
+        self.max_latency = 0.0
+
+    def start(self):
+        """Start the worker thread"""
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='api-sender', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, flush_timeout=2.0):
+        """Stop the worker, giving pending payloads a chance to go out"""
+        deadline = time.monotonic() + flush_timeout
+        with self._cond:
+            while self._pending and time.monotonic() < deadline:
+                self._cond.wait(0.05)
+            self._running = False
+            self.dropped += len(self._pending)
+            self._pending.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=flush_timeout)
+        self.session.close()
+
+    def submit(self, payload):
+        """Queue a payload without blocking; the oldest pending one is coalesced away when full"""
+        with self._cond:
+            if 'profile' in payload:
+                payload = dict(payload)
+                self._profile = payload.pop('profile')
+            if len(self._pending) >= self.queue_size:
+                self._pending.pop(0)
+                self.coalesced += 1
+            self._pending.append(payload)
+            self._cond.notify()
+
+    def stats(self):
+        """Snapshot of the sender counters"""
+        with self._cond:
+            return {
+                'sent': self.sent,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'resyncs': self.resyncs,
+                'pending': len(self._pending),
+                'lastLatencyMs': round(self.last_latency * 1000, 1),
+                'avgLatencyMs': round(self.avg_latency * 1000, 1),
+                'maxLatencyMs': round(self.max_latency * 1000, 1),
+            }
+
+    def _next_payload(self):
+        with self._cond:
+            while self._running and not self._pending:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            payload = self._pending.pop(0)
+            self._cond.notify_all()
+            return payload
+
+    def _has_newer(self):
+        with self._cond:
+            return bool(self._pending)
+
+    def _body(self, payload):
+        """Payload encoded with the codec, or None to post it as JSON"""
+        if self.codec is None:
+            return None
+        try:
+            return self.codec.encode(payload)
+        except ValueError:
+            # Doesn't fit the binary layout (e.g. extra fields); JSON carries anything
+            return None
+
+    def _post(self, payload):
+        """Post one payload; returns the HTTP status or None on connection errors"""
+        with self._cond:
+            profile = self._profile
+        if profile is not None:
+            payload = dict(payload, profile=profile)
+        if self.encoder is not None:
+            payload = self.encoder.encode(payload)
+
+        body = self._body(payload)
+
+        start = time.monotonic()
+        try:
+            if body is None:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            else:
+                response = self.session.post(self.url, data=body, timeout=self.timeout,
+                                             headers={'Content-Type': self.codec.mimetype})
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            status = None
+        latency = time.monotonic() - start
+        if self.profiler is not None:
+            self.profiler.observe('send', latency)
+
+        if status == 415 and body is not None:
+            # API predates the binary encoding; stay on JSON from now on
+            print("API doesn't accept binary payloads, falling back to JSON")
+            self.codec = None
+
+        ok = status == 200
+        if self.encoder is not None:
+            if ok:
+                self.encoder.ack()
+            elif status == 409:
+                self.encoder.reset()
+        if status is not None and status not in (200, 409, 415):
+            print(f"API Error: {status}")
+
+        with self._cond:
+            self.last_latency = latency
+            self.avg_latency = latency if self.sent + self.failed == 0 else self.avg_latency * 0.9 + latency * 0.1
+            self.max_latency = max(self.max_latency, latency)
+            if ok:
+                self.sent += 1
+                if self._profile is profile:
+                    self._profile = None
+            elif status == 409:
+                self.resyncs += 1
+            else:
+                self.failed += 1
+        return status
+
+    def _wait(self, seconds):
+        """Sleep unless stopped; returns early when a newer payload shows up"""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._running or self._pending, timeout=seconds)
+
+    def _run(self):
+        while True:
+            payload = self._next_payload()
+            if payload is None:
+                return
+
+            # Respect the configured max send rate
+            wait = self._last_send + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            attempt = 0
+            while True:
+                self._last_send = time.monotonic()
+                status = self._post(payload)
+                if status == 200:
+                    break
+                attempt += 1
+                if status == 409 and attempt <= self.max_retries:
+                    # Server lost our sequence; resend straight away as a full update
+                    continue
+                if status == 415 and self.codec is None and attempt <= self.max_retries:
+                    # Binary was refused; resend straight away as JSON
+                    continue
+                if attempt > self.max_retries or not self._running:
+                    with self._cond:
+                        self.dropped += 1
+                    break
+                self._wait(min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+                # A newer frame supersedes the one we were retrying
+                if self._has_newer():
+                    with self._cond:
+                        self.coalesced += 1
+                    break
@@ -1,14 +1,32 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
-from datetime import datetime, timedelta
+from datetime import datetime
+import math
+import os
 import random
+import threading
 import time
 
+from alert_engine import ALERT_INDEXES, AlertEngine
+from car_codec import CARS_MIMETYPE, decode_payload
+from car_delta import SequenceGap, apply_delta, index_cars
+from event_stream import ALL_TOPICS, EventBroker, format_event
+from history import HISTORY_TIERS, HistoryStore
+from profiling import Profiler, render_prometheus, valid_snapshot
+from response_cache import ResponseCache
+from state_backend import CarState, create_backend
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend communication
 
-# Mock data structure matching frontend expectations
-DISTRICTS = [
+# Where the state lives: 'memory' (this process only) or 'sqlite:///path/state.db'
+# to share it between the workers of a multi-process WSGI server
+STATE_BACKEND = os.environ.get('ROUNDABOUT_STATE_BACKEND', 'memory')
+BACKEND = create_backend(STATE_BACKEND)
+
+# Mock data structure matching frontend expectations, held in indexed tables
+# (see state_store) so lookups by id and filters don't scan every record
+DISTRICTS = BACKEND.table('districts', [
     {
         'id': 'north',
         'name': 'شمال الرياض',
@@ -64,9 +82,9 @@ DISTRICTS = [
         'latitude': 24.7,
         'longitude': 46.7,
     },
-]
+], indexes=('severity',))
 
-ROUNDABOUTS = [
+ROUNDABOUTS = BACKEND.table('roundabouts', [
     {
         'id': 'n-001',
         'name': 'King Fahd Rd & Olaya St',
@@ -99,29 +117,70 @@ ROUNDABOUTS = [
         'latitude': 24.71,
         'longitude': 46.69,
     },
-]
+], indexes=('districtId', 'congestionLevel'), range_index='severityScore')
 
-ALERTS = [
-    {
-        'id': 'a-001',
-        'roundaboutId': 'n-001',
-        'roundaboutName': 'King Fahd Rd & Olaya St',
-        'districtId': 'north',
-        'districtName': 'Northern District',
-        'severity': 'concern',
-        'type': 'congestion',
-        'message': 'High congestion - 78% lane utilization',
-        'estimatedImpact': '8-minute average delay',
-        'timestamp': (datetime.now() - timedelta(minutes=5)).isoformat(),
-        'acknowledged': False,
-        'severityScore': 75,
-    },
-]
+# Alerts and the live district figures are derived from the roundabouts by the
+# alert engine as they change. They are stored in the backend; with several
+# workers only the one holding the 'alerts' lease runs the engine.
+ALERTS = BACKEND.table('alerts', indexes=ALERT_INDEXES, range_index='severityScore')
+ALERT_ENGINE = AlertEngine({district['id']: district['name'] for district in DISTRICTS},
+                           alerts=ALERTS, rollups=BACKEND.table('district_rollups'))
+ALERT_LEASE_TTL = 15  # Seconds; a worker that held it for less than this continuously resyncs
+_alert_lease = {'held_until': 0.0}
+
+
+def derive_alerts(roundabouts, everything=False):
+    """Run the alert engine if this worker holds the lease; returns the resources that changed"""
+    now = time.monotonic()
+    if not BACKEND.acquire_lease('alerts', ttl=ALERT_LEASE_TTL):
+        _alert_lease['held_until'] = 0.0
+        return set()
+    # The lease may have lapsed and changes been derived elsewhere meanwhile: rebuild from the stored state
+    resync = everything or now > _alert_lease['held_until']
+    _alert_lease['held_until'] = now + ALERT_LEASE_TTL
+    if resync:
+        return ALERT_ENGINE.resync(ROUNDABOUTS.all())
+    return ALERT_ENGINE.observe(roundabouts)
+
+
+derive_alerts((), everything=True)
+
+# Cars currently in roundabouts live in the backend as one CarState per roundabout
+
+# Stage timings of this process (ROUNDABOUT_PROFILING=0 turns them off): one
+# histogram per route and per hot-path stage (ingest parsing, serialization)
+ROUTE_TIMES = Profiler()
+STAGE_TIMES = Profiler()
+# Latest stage timings pushed by each roundabout's detector
+DETECTOR_PROFILES = {}
 
-# Store for cars currently in roundabouts
-CARS_IN_ROUNDABOUTS = {
-    'test-001': []
-}
+# Serialized GET responses, invalidated through the backend when the data changes
+RESPONSES = ResponseCache(STAGE_TIMES.timed('serialize', app.json.dumps), versions=BACKEND)
+
+# Push streams for the dashboard
+EVENTS = EventBroker()
+STREAM_MAX_RATE = 5.0  # Max pushes per second per stream client
+STREAM_HEARTBEAT = 15  # Seconds between keep-alive comments on idle streams
+
+MAX_PAGE_SIZE = 500  # Upper bound for limit on filtered list endpoints
+
+# Bounded per-roundabout history of the statistics, recorded on every change
+HISTORY = HistoryStore()
+HISTORY_DEFAULT_RANGE = 3600  # Seconds covered when 'from' is not given
+
+
+@app.before_request
+def start_route_timer():
+    if ROUTE_TIMES.enabled:
+        g.route_start = time.perf_counter()
+
+
+@app.after_request
+def record_route_time(response):
+    start = g.get('route_start')
+    if start is not None and request.endpoint:
+        ROUTE_TIMES.observe(request.endpoint, time.perf_counter() - start)
+    return response
 
 
 def generate_mock_car():
@@ -144,6 +203,7 @@ def generate_mock_car():
 
 def update_realtime_data():
     """Simulate real-time data updates"""
+    all_changes = {}
     for roundabout in ROUNDABOUTS:
         # Skip the test roundabout as it receives real data
         if roundabout['id'] == 'test-001':
@@ -154,148 +214,492 @@ def update_realtime_data():
         exit_delta = random.randint(-20, 20)
         utilization_delta = random.randint(-3, 3)
         
-        roundabout['vehicleEntry'] = max(200, roundabout['vehicleEntry'] + entry_delta)
-        roundabout['vehicleExit'] = max(200, roundabout['vehicleExit'] + exit_delta)
-        roundabout['laneUtilization'] = min(100, max(20, roundabout['laneUtilization'] + utilization_delta))
+        changes = {
+            'vehicleEntry': max(200, roundabout['vehicleEntry'] + entry_delta),
+            'vehicleExit': max(200, roundabout['vehicleExit'] + exit_delta),
+            'laneUtilization': min(100, max(20, roundabout['laneUtilization'] + utilization_delta)),
+        }
         
         # Update trends
-        roundabout['entryTrend'] = 'up' if entry_delta > 5 else 'down' if entry_delta < -5 else 'stable'
-        roundabout['exitTrend'] = 'up' if exit_delta > 5 else 'down' if exit_delta < -5 else 'stable'
+        changes['entryTrend'] = 'up' if entry_delta > 5 else 'down' if entry_delta < -5 else 'stable'
+        changes['exitTrend'] = 'up' if exit_delta > 5 else 'down' if exit_delta < -5 else 'stable'
         
         # Update congestion level
-        util = roundabout['laneUtilization']
+        util = changes['laneUtilization']
         if util >= 90:
-            roundabout['congestionLevel'] = 'Critical'
+            changes['congestionLevel'] = 'Critical'
         elif util >= 75:
-            roundabout['congestionLevel'] = 'High'
+            changes['congestionLevel'] = 'High'
         elif util >= 55:
-            roundabout['congestionLevel'] = 'Moderate'
+            changes['congestionLevel'] = 'Moderate'
         else:
-            roundabout['congestionLevel'] = 'Low'
+            changes['congestionLevel'] = 'Low'
         
         # Update severity score
         risky = roundabout['riskyBehaviors']
         severity = int(util * 0.6 + (risky['wrongWay'] * 2 + risky['illegalUTurn'] + risky['speeding']) * 0.4)
-        roundabout['severityScore'] = min(100, severity)
-        roundabout['lastUpdated'] = datetime.now().isoformat()
+        changes['severityScore'] = min(100, severity)
+        changes['lastUpdated'] = datetime.now().isoformat()
+        
+        all_changes[roundabout['id']] = changes
+    
+    # Apply all changes in one write
+    updated = ROUNDABOUTS.update_many(all_changes)
+    BACKEND.invalidate('roundabouts', *(f'roundabout:{roundabout_id}' for roundabout_id in updated))
     
     # Mock car generation for test-001 removed to allow real data
 
 
 
+def record_history(roundabout_id, roundabout, t):
+    """Add the current statistics of a roundabout to its history"""
+    values = dict(roundabout or {})
+    summary = BACKEND.get_cars(roundabout_id).summary
+    if summary:
+        values['totalCars'] = summary['totalCars']
+        values['penaltyCount'] = summary['penaltyCount']
+    HISTORY.record(roundabout_id, values, t)
+
+
+def handle_state_changes(keys):
+    """Push changed resources to stream clients and record history (runs in every worker)"""
+    now = time.time()
+    changed = {}
+    for key in keys:
+        kind, _, roundabout_id = key.partition(':')
+        if kind == 'cars':
+            publish_cars(roundabout_id)
+            changed.setdefault(roundabout_id, None)
+        elif kind == 'roundabout':
+            roundabout = ROUNDABOUTS.get(roundabout_id)
+            if roundabout:
+                publish_roundabout(roundabout)
+            changed[roundabout_id] = roundabout
+    
+    # One sample per roundabout, however many of its resources changed
+    for roundabout_id, roundabout in changed.items():
+        record_history(roundabout_id, roundabout or ROUNDABOUTS.get(roundabout_id), now)
+    
+    # Roll the changed roundabouts into districts and alerts (in one worker only)
+    derived = derive_alerts([roundabout for roundabout in changed.values() if roundabout])
+    if derived:
+        BACKEND.invalidate(*derived)
+
+BACKEND.on_change(handle_state_changes)
+
+
 # Background thread to update data
-import threading
+UPDATE_INTERVAL = 5  # Seconds between simulated updates
 
 def background_updater():
     while True:
-        time.sleep(5)  # Update every 5 seconds
-        update_realtime_data()
+        time.sleep(UPDATE_INTERVAL)
+        # With a shared backend only the worker holding the lease runs the updates
+        if BACKEND.acquire_lease('updater', ttl=UPDATE_INTERVAL * 3):
+            update_realtime_data()
 
 # Start background updater
 updater_thread = threading.Thread(target=background_updater, daemon=True)
 updater_thread.start()
 
 
+def page_args():
+    """Offset/limit query parameters, limit capped at MAX_PAGE_SIZE"""
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = request.args.get('limit', MAX_PAGE_SIZE, type=int)
+    return offset, min(max(0, limit), MAX_PAGE_SIZE)
+
+
+def paged_response(records, total):
+    """JSON list response with the unpaginated count in X-Total-Count"""
+    response = jsonify(records)
+    response.headers['X-Total-Count'] = str(total)
+    return response
+
+
 @app.route('/api/roundabouts', methods=['GET'])
 def get_roundabouts():
-    """Get all roundabouts"""
-    return jsonify(ROUNDABOUTS)
+    """Get all roundabouts
+
+    Optional filters: district, congestion, minSeverity, maxSeverity, plus
+    offset/limit pagination, e.g. /api/roundabouts?district=east&minSeverity=70&limit=50
+    """
+    if not request.args:
+        return RESPONSES.respond(request, 'roundabouts', ROUNDABOUTS.all)
+    
+    filters = {}
+    if 'district' in request.args:
+        filters['districtId'] = request.args['district']
+    if 'congestion' in request.args:
+        filters['congestionLevel'] = request.args['congestion']
+    offset, limit = page_args()
+    records, total = ROUNDABOUTS.query(
+        filters,
+        min_value=request.args.get('minSeverity', type=int),
+        max_value=request.args.get('maxSeverity', type=int),
+        offset=offset,
+        limit=limit
+    )
+    return paged_response(records, total)
+
+
+def build_districts():
+    """Districts with the derived figures (reporting roundabouts, alerts, congestion) of those that report"""
+    return [dict(district, **(ALERT_ENGINE.rollup(district['id']) or {})) for district in DISTRICTS]
 
 
 @app.route('/api/districts', methods=['GET'])
 def get_districts():
     """Get all districts"""
-    return jsonify(DISTRICTS)
+    return RESPONSES.respond(request, 'districts', build_districts)
 
 
 @app.route('/api/alerts', methods=['GET'])
 def get_alerts():
-    """Get all alerts"""
-    return jsonify(ALERTS)
+    """Get all alerts
+
+    Optional filters: district, roundabout, severity, minSeverity, plus offset/limit
+    """
+    if not request.args:
+        return RESPONSES.respond(request, 'alerts', ALERTS.all)
+    
+    filters = {}
+    if 'district' in request.args:
+        filters['districtId'] = request.args['district']
+    if 'roundabout' in request.args:
+        filters['roundaboutId'] = request.args['roundabout']
+    if 'severity' in request.args:
+        filters['severity'] = request.args['severity']
+    offset, limit = page_args()
+    records, total = ALERTS.query(
+        filters,
+        min_value=request.args.get('minSeverity', type=int),
+        offset=offset,
+        limit=limit
+    )
+    return paged_response(records, total)
 
 
 @app.route('/api/roundabout/<roundabout_id>', methods=['GET'])
 def get_roundabout(roundabout_id):
     """Get specific roundabout details"""
-    roundabout = next((r for r in ROUNDABOUTS if r['id'] == roundabout_id), None)
+    roundabout = ROUNDABOUTS.get(roundabout_id)
     if roundabout:
-        return jsonify(roundabout)
+        return RESPONSES.respond(request, f'roundabout:{roundabout_id}', lambda: roundabout)
     return jsonify({'error': 'Roundabout not found'}), 404
 
 
-@app.route('/api/roundabout/<roundabout_id>/cars', methods=['GET'])
-def get_roundabout_cars(roundabout_id):
-    """Get cars currently in the roundabout"""
-    if roundabout_id not in CARS_IN_ROUNDABOUTS:
-        CARS_IN_ROUNDABOUTS[roundabout_id] = []
-    
-    cars = CARS_IN_ROUNDABOUTS[roundabout_id]
-    
-    # Calculate summary statistics
-    total_cars = len(cars)
-    penalty_count = sum(1 for car in cars if car['isPenalty'])
-    first_zone_count = sum(1 for car in cars if car['inFirstZone'])
-    second_zone_count = sum(1 for car in cars if car['inSecondZone'])
-    
-    # Count by type
+def summarize_cars(cars):
+    """Summary statistics for a list of cars in a single pass"""
+    penalty_count = 0
+    first_zone_count = 0
+    second_zone_count = 0
     car_types = {}
     for car in cars:
-        car_type = car['type']
-        car_types[car_type] = car_types.get(car_type, 0) + 1
+        if car['isPenalty']:
+            penalty_count += 1
+        if car['inFirstZone']:
+            first_zone_count += 1
+        if car['inSecondZone']:
+            second_zone_count += 1
+        car_types[car['type']] = car_types.get(car['type'], 0) + 1
     
-    return jsonify({
+    return {
+        'totalCars': len(cars),
+        'penaltyCount': penalty_count,
+        'firstZoneCount': first_zone_count,
+        'secondZoneCount': second_zone_count,
+        'carTypes': car_types
+    }
+
+
+def build_cars_response(roundabout_id):
+    """Cars currently in the roundabout plus summary statistics"""
+    state = BACKEND.get_cars(roundabout_id)
+    cars = list(state.cars.values())
+    summary = state.summary or summarize_cars(cars)
+    
+    # The response is cached per update, so the timestamp is when it was built
+    return {
         'roundaboutId': roundabout_id,
         'timestamp': datetime.now().isoformat(),
-        'summary': {
-            'totalCars': total_cars,
-            'penaltyCount': penalty_count,
-            'firstZoneCount': first_zone_count,
-            'secondZoneCount': second_zone_count,
-            'carTypes': car_types
-        },
+        'summary': summary,
         'cars': cars
-    })
+    }
+
+
+def publish_roundabout(roundabout):
+    """Push a roundabout record to stream clients"""
+    if EVENTS.has_subscribers(roundabout['id']):
+        entry = RESPONSES.get(f"roundabout:{roundabout['id']}", lambda: roundabout)
+        EVENTS.publish(roundabout['id'], 'roundabout', entry.body.decode('utf-8'))
+
+
+def publish_cars(roundabout_id):
+    """Push the cars of a roundabout to stream clients"""
+    if EVENTS.has_subscribers(roundabout_id):
+        entry = RESPONSES.get(f'cars:{roundabout_id}', lambda: build_cars_response(roundabout_id))
+        EVENTS.publish(roundabout_id, 'cars', entry.body.decode('utf-8'))
+
+
+@app.route('/api/roundabout/<roundabout_id>/cars', methods=['GET'])
+def get_roundabout_cars(roundabout_id):
+    """Get cars currently in the roundabout"""
+    return RESPONSES.respond(request, f'cars:{roundabout_id}', lambda: build_cars_response(roundabout_id))
+
+
+# Detector statistics that must be numbers
+NUMERIC_STATS = ('vehicleEntry', 'vehicleExit', 'laneUtilization', 'penaltyCount', 'wrongWay', 'illegalUTurn',
+                 'speeding')
+# congestionLevel is an index of the roundabouts table, so only known levels are taken
+CONGESTION_LEVELS = ('Low', 'Moderate', 'High', 'Critical')
+# Fields every car of a full update (or added by a delta) carries; summarize_cars reads them
+CAR_REQUIRED_FIELDS = ('id', 'type', 'inFirstZone', 'inSecondZone', 'isPenalty')
+
+
+def invalid_stats(stats):
+    """Error message for a malformed stats object, None when it is fine"""
+    if not isinstance(stats, dict):
+        return 'stats must be an object'
+    for key in NUMERIC_STATS:
+        value = stats.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                  or not math.isfinite(value)):
+            return f'stats.{key} must be a number'
+    if 'congestionLevel' in stats and stats['congestionLevel'] not in CONGESTION_LEVELS:
+        return f"stats.congestionLevel must be one of {', '.join(CONGESTION_LEVELS)}"
+    return None
+
+
+def invalid_car_id(car_id):
+    return isinstance(car_id, bool) or not isinstance(car_id, (str, int))
+
+
+def invalid_car(car, required=CAR_REQUIRED_FIELDS):
+    """Error message for a malformed car (or changed entry), None when it is fine"""
+    if not isinstance(car, dict):
+        return 'cars must be objects'
+    missing = [key for key in required if key not in car]
+    if missing:
+        return f"car is missing {', '.join(missing)}"
+    if invalid_car_id(car['id']):
+        return 'car id must be a string or an integer'
+    if 'type' in car and not isinstance(car['type'], str):
+        return 'car type must be a string'
+    return None
+
+
+def invalid_payload(data):
+    """Error message for a malformed full or delta update, None when it is fine"""
+    if not isinstance(data, dict) or ('cars' not in data and 'baseSeq' not in data):
+        return 'Invalid data format'
+    keys = ('cars',) if 'cars' in data else ('added', 'changed', 'removed')
+    for key in keys:
+        if not isinstance(data.get(key, []), list):
+            return f'{key} must be a list'
+    if 'cars' in data:
+        cars, changes, removed = data['cars'], [], []
+    else:
+        base_seq = data['baseSeq']
+        if not isinstance(base_seq, int) or isinstance(base_seq, bool):
+            return 'baseSeq must be an integer'
+        cars, changes, removed = data.get('added', []), data.get('changed', []), data.get('removed', [])
+    for car in cars:
+        error = invalid_car(car)
+        if error:
+            return error
+    for change in changes:
+        error = invalid_car(change, required=('id',))
+        if error:
+            return error
+    if any(invalid_car_id(car_id) for car_id in removed):
+        return 'removed must list car ids'
+    return None
+
+
+def apply_roundabout_stats(roundabout_id, stats):
+    """Copy detector statistics onto the roundabout record; returns the resources that changed"""
+    roundabout = ROUNDABOUTS.get(roundabout_id)
+    if roundabout:
+        changes = {key: stats[key] for key in ('vehicleEntry', 'vehicleExit', 'laneUtilization', 'congestionLevel')
+                   if key in stats}
+        if 'penaltyCount' in stats:
+            # Update risky behaviors
+            changes['riskyBehaviors'] = {
+                'wrongWay': stats.get('wrongWay', 0),
+                'illegalUTurn': stats.get('illegalUTurn', 0),
+                'speeding': stats.get('speeding', 0)
+            }
+        # laneUtilization is a car count here, not a percentage; the alert engine goes by congestionLevel
+        changes['source'] = 'detector'
+        changes['lastUpdated'] = datetime.now().isoformat()
+        ROUNDABOUTS.update(roundabout_id, changes)
+        return [f'roundabout:{roundabout_id}', 'roundabouts']
+    return []
 
 
 @app.route('/api/roundabout/<roundabout_id>/update', methods=['POST'])
 def update_roundabout_cars(roundabout_id):
-    """Update cars in the roundabout from detection system"""
-    from flask import request
+    """Update cars in the roundabout from detection system
+
+    Accepts either a full update ({'cars': [...]}) or a delta against the last
+    sequence number ({'baseSeq', 'seq', 'added', 'changed', 'removed'}, see
+    car_delta). Deltas that don't line up with the stored sequence get a 409
+    asking the detector to resync with a full update. Both can be sent as
+    JSON or in the binary layout of car_codec (Content-Type CARS_MIMETYPE).
+    """
+    with STAGE_TIMES.stage('ingest_parse'):
+        if request.mimetype == CARS_MIMETYPE:
+            try:
+                data = decode_payload(request.get_data())
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        else:
+            data = request.json
+    error = invalid_payload(data)
+    if error:
+        return jsonify({'error': error}), 400
+    # Deltas need a sequence number; full updates may leave it out
+    seq = data.get('seq')
+    if ('cars' not in data or seq is not None) and (not isinstance(seq, int) or isinstance(seq, bool)):
+        return jsonify({'error': 'seq must be an integer'}), 400
+    error = invalid_stats(data['stats']) if 'stats' in data else None
+    if error:
+        return jsonify({'error': error}), 400
     
-    data = request.json
-    if not data or 'cars' not in data:
-        return jsonify({'error': 'Invalid data format'}), 400
+    with BACKEND.update_cars(roundabout_id) as update:
+        state = update.state
+        if 'cars' in data:
+            # Full replace (also used to resync a delta stream)
+            cars = index_cars(data['cars'])
+            cars_updated = len(data['cars'])
+        else:
+            if state.seq is None or data['baseSeq'] != state.seq:
+                return jsonify({
+                    'error': 'Sequence gap',
+                    'resync': True,
+                    'expectedBaseSeq': state.seq
+                }), 409
+            try:
+                cars = apply_delta(state.cars, data)
+            except SequenceGap as e:
+                return jsonify({'error': str(e), 'resync': True, 'expectedBaseSeq': state.seq}), 409
+            cars_updated = len(data.get('added', ())) + len(data.get('changed', ())) + len(data.get('removed', ()))
+        
+        update.set(CarState(cars, summarize_cars(cars.values()), seq))
     
-    # Update the cars data
-    CARS_IN_ROUNDABOUTS[roundabout_id] = data['cars']
+    # Detectors push their stage timings every few seconds
+    if valid_snapshot(data.get('profile')):
+        DETECTOR_PROFILES[roundabout_id] = data['profile']
     
     # Also update roundabout statistics if provided
+    changed = [f'cars:{roundabout_id}']
     if 'stats' in data:
-        roundabout = next((r for r in ROUNDABOUTS if r['id'] == roundabout_id), None)
-        if roundabout:
-            stats = data['stats']
-            if 'vehicleEntry' in stats:
-                roundabout['vehicleEntry'] = stats['vehicleEntry']
-            if 'vehicleExit' in stats:
-                roundabout['vehicleExit'] = stats['vehicleExit']
-            if 'laneUtilization' in stats:
-                roundabout['laneUtilization'] = stats['laneUtilization']
-            if 'congestionLevel' in stats:
-                roundabout['congestionLevel'] = stats['congestionLevel']
-            if 'penaltyCount' in stats:
-                # Update risky behaviors
-                roundabout['riskyBehaviors']['wrongWay'] = stats.get('wrongWay', 0)
-                roundabout['riskyBehaviors']['illegalUTurn'] = stats.get('illegalUTurn', 0)
-                roundabout['riskyBehaviors']['speeding'] = stats.get('speeding', 0)
-            roundabout['lastUpdated'] = datetime.now().isoformat()
+        changed += apply_roundabout_stats(roundabout_id, data['stats'])
+    
+    BACKEND.invalidate(*changed)
     
     return jsonify({
         'status': 'success',
         'roundaboutId': roundabout_id,
-        'carsUpdated': len(data['cars'])
+        'seq': seq,
+        'carsUpdated': cars_updated
+    })
+
+
+def parse_time_arg(name, default):
+    """Query parameter as epoch seconds; accepts epoch seconds or an ISO timestamp"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = datetime.fromisoformat(value).timestamp()
+    # inf, nan or far-off times would only fail later, when the response is formatted
+    try:
+        datetime.fromtimestamp(seconds)
+    except (OverflowError, OSError) as e:
+        raise ValueError(str(e))
+    return seconds
+
+
+@app.route('/api/roundabout/<roundabout_id>/history', methods=['GET'])
+def get_roundabout_history(roundabout_id):
+    """Get recorded statistics of a roundabout over a time range
+
+    from/to are epoch seconds or ISO timestamps (default: the last hour).
+    resolution is raw, 1m, 15m or auto (the finest tier that covers 'from').
+    """
+    resolution = request.args.get('resolution', 'auto')
+    if resolution != 'auto' and resolution not in {name for name, _, _ in HISTORY_TIERS}:
+        return jsonify({'error': f'Unknown resolution: {resolution}'}), 400
+    try:
+        t1 = parse_time_arg('to', time.time())
+        t0 = parse_time_arg('from', t1 - HISTORY_DEFAULT_RANGE)
+    except ValueError:
+        return jsonify({'error': 'Invalid from/to'}), 400
+    
+    result = HISTORY.query(roundabout_id, t0, t1, resolution)
+    if result is None:
+        if roundabout_id not in ROUNDABOUTS:
+            return jsonify({'error': 'Roundabout not found'}), 404
+        result = (resolution, [], {})
+    resolution, times, series = result
+    
+    return jsonify({
+        'roundaboutId': roundabout_id,
+        'resolution': resolution,
+        'from': datetime.fromtimestamp(t0).isoformat(),
+        'to': datetime.fromtimestamp(t1).isoformat(),
+        'timestamps': [datetime.fromtimestamp(t).isoformat() for t in times],
+        'series': series
     })
 
 
+def event_stream(topic, initial_messages):
+    """Stream events for a topic as text/event-stream"""
+    # Clients may ask for fewer updates, never for more (or for no limit)
+    max_rate = request.args.get('maxRate', STREAM_MAX_RATE, type=float)
+    if not 0 < max_rate <= STREAM_MAX_RATE:
+        max_rate = STREAM_MAX_RATE
+    subscriber = EVENTS.subscribe(topic, max_rate=max_rate)
+    
+    def generate():
+        try:
+            for message in initial_messages:
+                yield message
+            while not subscriber.closed:
+                messages = subscriber.next_messages(STREAM_HEARTBEAT)
+                yield b''.join(messages) if messages else b': keep-alive\n\n'
+        finally:
+            EVENTS.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@app.route('/api/roundabout/<roundabout_id>/stream', methods=['GET'])
+def stream_roundabout(roundabout_id):
+    """Push roundabout and cars updates for one roundabout (SSE)"""
+    cars = RESPONSES.get(f'cars:{roundabout_id}', lambda: build_cars_response(roundabout_id))
+    initial = [format_event('cars', cars.body.decode('utf-8'))]
+    roundabout = ROUNDABOUTS.get(roundabout_id)
+    if roundabout:
+        entry = RESPONSES.get(f'roundabout:{roundabout_id}', lambda: roundabout)
+        initial.insert(0, format_event('roundabout', entry.body.decode('utf-8')))
+    return event_stream(roundabout_id, initial)
+
+
+@app.route('/api/stream', methods=['GET'])
+def stream_all():
+    """Push roundabout and cars updates for every roundabout (SSE)"""
+    entry = RESPONSES.get('roundabouts', ROUNDABOUTS.all)
+    return event_stream(ALL_TOPICS, [format_event('roundabouts', entry.body.decode('utf-8'))])
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -305,14 +709,45 @@ def health_check():
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Stage timing histograms in the Prometheus text format
+
+    Covers the routes and hot-path stages of this process plus the latest
+    timings pushed by each detector. With several workers every worker
+    reports its own.
+    """
+    text = render_prometheus(
+        'roundabout_api_request_seconds', 'Time spent in each API route',
+        [({'endpoint': name}, snap) for name, snap in sorted(ROUTE_TIMES.snapshot().items())])
+    text += render_prometheus(
+        'roundabout_api_stage_seconds', 'Time spent in API hot-path stages',
+        [({'stage': name}, snap) for name, snap in sorted(STAGE_TIMES.snapshot().items())])
+    text += render_prometheus(
+        'roundabout_detector_stage_seconds', 'Time spent in each detector stage, as pushed by the detector',
+        [({'roundabout': roundabout_id, 'stage': name}, snap)
+         for roundabout_id, profile in sorted(DETECTOR_PROFILES.items())
+         for name, snap in sorted(profile.items())])
+    text += ('# HELP roundabout_api_cache_requests_total Serialized response cache lookups\n'
+             '# TYPE roundabout_api_cache_requests_total counter\n'
+             f'roundabout_api_cache_requests_total{{result="hit"}} {RESPONSES.hits}\n'
+             f'roundabout_api_cache_requests_total{{result="miss"}} {RESPONSES.misses}\n')
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     print("Starting Flask API server...")
     print("API will be available at http://localhost:5000")
+    print(f"State backend: {STATE_BACKEND}")
     print("\nAvailable endpoints:")
     print("  GET /api/roundabouts")
     print("  GET /api/districts")
     print("  GET /api/alerts")
     print("  GET /api/roundabout/<id>")
     print("  GET /api/roundabout/<id>/cars")
+    print("  GET /api/roundabout/<id>/history?from=&to=&resolution=")
+    print("  GET /api/roundabout/<id>/stream  (SSE)")
+    print("  GET /api/stream  (SSE, all roundabouts)")
+    print("  GET /api/metrics  (Prometheus)")
     print("  GET /api/health")
     app.run(debug=True, host='0.0.0.0', port=5000)
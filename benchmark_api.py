@@ -0,0 +1,293 @@
+"""
+API load benchmark
+Starts app.py on a free local port in its own process (or targets --url) and
+runs concurrent detector-like writers against /update and readers against
+/roundabouts and /cars for a fixed time. Reports requests/s and p50/p95/p99
+latency per route, as JSON.
+
+Writers post moving cars to the existing roundabouts as full or delta
+payloads, JSON or binary, like run_detection_with_api does. Readers issue
+requests back to back.
+
+Usage: python benchmark_api.py [--writers 2] [--readers 8] [--duration 10] [--output result.json]
+                               [--baseline previous.json]
+"""
+import argparse
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from benchmarking import TOLERANCE, check_baseline, environment, latency_summary, write_results
+from car_codec import BinaryCodec
+from car_delta import DeltaEncoder
+
+WRITERS = 0  # One per roundabout of the API
+READERS = 8
+DURATION = 10.0
+WARMUP = 1.0  # Seconds of load before latencies count
+CARS = 30
+SERVER_START_TIMEOUT = 15.0
+
+VEHICLE_TYPES = ('car', 'truck', 'bus', 'motorcycle')
+
+# The dev server app.py runs under, without the reloader and request logging
+SERVER_CODE = """
+import logging, sys
+from app import app
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(state_backend=None):
+    """app.py in a child process; returns (process, base url) once it answers"""
+    port = free_port()
+    env = dict(os.environ)
+    if state_backend:
+        env['ROUNDABOUT_STATE_BACKEND'] = state_backend
+    # A file rather than a pipe, which nobody drains during the run and would block the server once full
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen([sys.executable, '-c', SERVER_CODE, str(port)],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                               stdout=subprocess.DEVNULL, stderr=log)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    with log:  # The child keeps its own handle
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                log.seek(0)
+                raise RuntimeError(f"API server exited: {log.read().decode('utf-8', 'replace')}")
+            try:
+                if requests.get(f'{url}/api/health', timeout=1).status_code == 200:
+                    return process, url
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'API server did not start within {SERVER_START_TIMEOUT}s')
+
+
+class RouteStats:
+    """Latencies and outcomes of one route, recorded while the measuring event is set"""
+
+    def __init__(self, measuring):
+        self.measuring = measuring
+        self.latencies = []
+        self.errors = 0
+        self.resyncs = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, status):
+        if not self.measuring.is_set():
+            return
+        with self._lock:
+            if status == 200:
+                self.latencies.append(seconds)
+            elif status == 409:
+                self.resyncs += 1
+            else:
+                self.errors += 1
+
+
+class SyntheticCars:
+    """Cars of one roundabout moving in circles, with a car replaced now and then"""
+
+    def __init__(self, count, rng):
+        self.rng = rng
+        self.next_id = 1
+        self.cars = [self._new_car() for _ in range(count)]
+
+    def _new_car(self):
+        car = {'id': f'car-{self.next_id}', 'type': self.rng.choice(VEHICLE_TYPES),
+               'confidence': round(self.rng.uniform(0.4, 0.95), 2),
+               'angle': self.rng.uniform(0, 2 * math.pi), 'radius': self.rng.uniform(50, 300)}
+        self.next_id += 1
+        return car
+
+    def payload(self):
+        """Detector payload for the next frame"""
+        if self.rng.random() < 0.1:
+            self.cars[self.rng.randrange(len(self.cars))] = self._new_car()
+        timestamp = datetime.now().isoformat()
+        cars = []
+        for car in self.cars:
+            car['angle'] += 0.05
+            x = round(640 + car['radius'] * math.cos(car['angle']))
+            y = round(360 + car['radius'] * math.sin(car['angle']))
+            cars.append({'id': car['id'], 'type': car['type'], 'confidence': car['confidence'],
+                         'position': {'x': x, 'y': y}, 'inFirstZone': x < 640 and y < 360,
+                         'inSecondZone': x >= 640 and y >= 360, 'isPenalty': False, 'timestamp': timestamp})
+        in_roundabout = len(cars)
+        stats = {'vehicleEntry': self.next_id - 1, 'vehicleExit': self.next_id - 1 - in_roundabout,
+                 'laneUtilization': in_roundabout, 'congestionLevel': 'High', 'penaltyCount': 0,
+                 'wrongWay': 0, 'illegalUTurn': 0, 'speeding': 0}
+        return {'cars': cars, 'stats': stats}
+
+
+def writer(url, roundabout_id, args, stats, stop, seed):
+    """Post payloads for one roundabout until stopped"""
+    session = requests.Session()
+    scene = SyntheticCars(args.cars, random.Random(seed))
+    encoder = DeltaEncoder() if args.api_mode == 'delta' else None
+    codec = BinaryCodec() if args.api_encoding == 'binary' else None
+    interval = 1.0 / args.write_rate if args.write_rate > 0 else 0.0
+    endpoint = f'{url}/api/roundabout/{roundabout_id}/update'
+    next_send = time.monotonic()
+    while not stop.is_set():
+        payload = scene.payload()
+        if encoder is not None:
+            payload = encoder.encode(payload)
+        body = codec.encode(payload) if codec is not None else None
+        start = time.perf_counter()
+        try:
+            if body is not None:
+                response = session.post(endpoint, data=body, timeout=args.timeout,
+                                        headers={'Content-Type': codec.mimetype})
+            else:
+                response = session.post(endpoint, json=payload, timeout=args.timeout)
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            status = None
+        stats.record(time.perf_counter() - start, status)
+        if encoder is not None:
+            if status == 200:
+                encoder.ack()
+            elif status == 409:
+                encoder.reset()
+        if interval:
+            next_send += interval
+            stop.wait(max(0.0, next_send - time.monotonic()))
+
+
+def reader(url, roundabout_ids, args, route_stats, stop, seed):
+    """Alternate the read routes back to back until stopped"""
+    session = requests.Session()
+    rng = random.Random(seed)
+    while not stop.is_set():
+        for route in ('roundabouts', 'cars'):
+            if route == 'roundabouts':
+                path = '/api/roundabouts'
+            else:
+                path = f'/api/roundabout/{rng.choice(roundabout_ids)}/cars'
+            start = time.perf_counter()
+            try:
+                status = session.get(url + path, timeout=args.timeout).status_code
+            except requests.exceptions.RequestException:
+                status = None
+            route_stats[route].record(time.perf_counter() - start, status)
+
+
+def run_load(url, args):
+    """Run writers and readers against url; returns the per-route results"""
+    roundabout_ids = [roundabout['id'] for roundabout in requests.get(f'{url}/api/roundabouts', timeout=5).json()]
+    # One writer per roundabout, as with real detectors
+    if args.writers > len(roundabout_ids):
+        raise RuntimeError(f'--writers {args.writers} is more than the {len(roundabout_ids)} roundabouts of the API')
+    writer_ids = roundabout_ids[:args.writers or len(roundabout_ids)]
+    args.writers = len(writer_ids)  # So the result config records the count that ran
+    measuring = threading.Event()
+    route_stats = {route: RouteStats(measuring) for route in ('update', 'roundabouts', 'cars')}
+    stop = threading.Event()
+    threads = [threading.Thread(target=writer, daemon=True,
+                                args=(url, writer_ids[i], args, route_stats['update'], stop, args.seed + i))
+               for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, daemon=True,
+                                 args=(url, roundabout_ids, args, route_stats, stop, args.seed + 1000 + i))
+                for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(args.warmup)
+    measuring.set()
+    start = time.perf_counter()
+    time.sleep(args.duration)
+    measuring.clear()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=args.timeout + 1)
+
+    routes = {}
+    for route, stats in route_stats.items():
+        routes[route] = dict(latency_summary(stats.latencies),
+                             requestsPerSecond=round(len(stats.latencies) / elapsed, 1),
+                             errors=stats.errors, resyncs=stats.resyncs)
+    return routes, elapsed
+
+
+def parse_benchmark_args():
+    parser = argparse.ArgumentParser(description='Load-test the API ingest and read routes')
+    parser.add_argument('--url', help='Benchmark a running API at this base URL instead of starting one')
+    parser.add_argument('--state-backend', help='ROUNDABOUT_STATE_BACKEND of the started server')
+    parser.add_argument('--writers', type=int, default=WRITERS,
+                        help='Concurrent detector writers, at most one per roundabout (0 = one per roundabout)')
+    parser.add_argument('--readers', type=int, default=READERS, help='Concurrent readers')
+    parser.add_argument('--write-rate', type=float, default=0,
+                        help='Posts per second per writer (0 = back to back)')
+    parser.add_argument('--cars', type=int, default=CARS, help='Cars per roundabout in the writer payloads')
+    parser.add_argument('--api-mode', choices=['delta', 'full'], default='delta', help='Writer payload kind')
+    parser.add_argument('--api-encoding', choices=['binary', 'json'], default='binary',
+                        help='Writer payload encoding')
+    parser.add_argument('--duration', type=float, default=DURATION, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=WARMUP, help='Seconds of load before measuring')
+    parser.add_argument('--timeout', type=float, default=5.0, help='Request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic cars')
+    parser.add_argument('--output', help='Write the JSON result here instead of stdout')
+    parser.add_argument('--baseline', help='Earlier result to compare with; exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='Allowed slowdown against the baseline, as a fraction')
+    return parser.parse_args()
+
+
+def main_benchmark_api():
+    args = parse_benchmark_args()
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args.state_backend)
+    try:
+        routes, elapsed = run_load(url.rstrip('/'), args)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=5)
+
+    total = sum(route['count'] for route in routes.values())
+    metrics = {'total.requestsPerSecond': round(total / elapsed, 1)}
+    for name, route in routes.items():
+        metrics[f'{name}.requestsPerSecond'] = route['requestsPerSecond']
+        for key in ('p50Ms', 'p95Ms', 'p99Ms'):
+            metrics[f'{name}.{key}'] = route[key]
+    results = {
+        'benchmark': 'api',
+        'environment': environment(),
+        'config': {key: getattr(args, key) for key in
+                   ('writers', 'readers', 'write_rate', 'cars', 'api_mode', 'api_encoding', 'duration',
+                    'state_backend', 'seed')},
+        'target': 'started' if args.url is None else args.url,
+        'routes': routes,
+        'metrics': metrics,
+    }
+    write_results(results, args.output)
+    if args.baseline:
+        sys.exit(check_baseline(results, args.baseline, args.tolerance))
+
+
+if __name__ == '__main__':
+    main_benchmark_api()
@@ -0,0 +1,186 @@
+"""
+Detector post-inference benchmark
+Drives the per-frame path of main_with_api (extract_detections, the zone,
+entry/exit, penalty and behaviour logic, payload building and encoding,
+optionally drawing) with a stub model that emits synthetic tracked boxes, so
+the numbers don't depend on YOLO, a video or the API. Reports frames/s and
+CPU time per frame for each car density, as JSON.
+
+Usage: python benchmark_detection.py [--cars 10 50 200] [--frames 600] [--output result.json]
+                                     [--baseline previous.json]
+"""
+import argparse
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from ultralytics.engine.results import Boxes
+
+from benchmarking import TOLERANCE, check_baseline, environment, write_results
+from car_codec import BinaryCodec
+from car_delta import DeltaEncoder
+from run_detection_with_api import (
+    DEFAULT_FPS, MAX_SEND_RATE, PROFILER, VEHICLE_CLASS_IDS, FrameAnalyzer, draw_frame_result, extract_detections,
+    send_to_api
+)
+from trajectories import BehaviourDetector
+
+DENSITIES = (10, 50, 200)
+FRAMES = 600
+BOX_SIZE = (40, 24)
+TURNOVER = 0.05  # Share of the cars replaced by new tracks per second
+
+
+class SyntheticModel:
+    """Stands in for YOLO: cars circling the frame center, some leaving and new ones arriving"""
+
+    def __init__(self, cars, frame_shape, fps=DEFAULT_FPS, turnover=TURNOVER, seed=0):
+        self.frame_shape = frame_shape
+        self.fps = fps
+        self.turnover = turnover
+        self.rng = np.random.default_rng(seed)
+        self.ids = np.arange(1, cars + 1)
+        self.next_id = cars + 1
+        self.angle = self.rng.uniform(0, 2 * np.pi, cars)
+        self.radius = self.rng.uniform(0.1, 0.45, cars) * min(frame_shape[:2])
+        self.speed = self.rng.uniform(0.2, 0.8, cars)  # Radians per second
+        self.cls = self.rng.choice(VEHICLE_CLASS_IDS, cars).astype(float)
+
+    def _replace(self, leaving):
+        n = int(leaving.sum())
+        if n:
+            self.ids[leaving] = np.arange(self.next_id, self.next_id + n)
+            self.next_id += n
+            self.angle[leaving] = self.rng.uniform(0, 2 * np.pi, n)
+            self.cls[leaving] = self.rng.choice(VEHICLE_CLASS_IDS, n)
+
+    def track(self, source=None, **kwargs):
+        """One frame of model.track output"""
+        self._replace(self.rng.random(len(self.ids)) < self.turnover / self.fps)
+        self.angle += self.speed / self.fps
+        h, w = self.frame_shape[:2]
+        x = w / 2 + self.radius * np.cos(self.angle)
+        y = h / 2 + self.radius * np.sin(self.angle)
+        data = np.column_stack([x - BOX_SIZE[0] / 2, y - BOX_SIZE[1] / 2, x + BOX_SIZE[0] / 2, y + BOX_SIZE[1] / 2,
+                                self.ids, np.full(len(self.ids), 0.8), self.cls])
+        return [SimpleNamespace(boxes=Boxes(data, self.frame_shape[:2]))]
+
+
+class PayloadSink:
+    """Stands in for ApiSender: encodes payloads as they would go out, at the sender's rate, without HTTP"""
+
+    def __init__(self, api_mode='delta', api_encoding='binary', send_every=1):
+        self.encoder = DeltaEncoder() if api_mode == 'delta' else None
+        self.codec = BinaryCodec() if api_encoding == 'binary' else None
+        self.send_every = max(1, send_every)
+        self.submitted = 0
+        self.sent = 0
+        self.bytes = 0
+
+    def submit(self, payload):
+        # The real sender coalesces to the newest payload, so only every Nth one is encoded
+        self.submitted += 1
+        if self.submitted % self.send_every:
+            return
+        with PROFILER.stage('encode'):
+            if self.encoder is not None:
+                payload = self.encoder.encode(payload)
+                self.encoder.ack()
+            body = None
+            if self.codec is not None:
+                try:
+                    body = self.codec.encode(payload)
+                except ValueError:
+                    body = None
+            if body is None:
+                body = json.dumps(payload).encode('utf-8')
+        self.sent += 1
+        self.bytes += len(body)
+
+
+def run_density(cars, args):
+    """Benchmark one car density; returns its result entry"""
+    frame_shape = (args.height, args.width, 3)
+    frame = np.zeros(frame_shape, dtype=np.uint8)
+
+    # Model output is generated up front so only the post-inference path is timed
+    model = SyntheticModel(cars, frame_shape, args.fps, seed=args.seed)
+    outputs = [model.track(source=frame) for _ in range(args.frames)]
+
+    PROFILER.reset()
+    analyzer = FrameAnalyzer(fps=args.fps, behaviours=BehaviourDetector())
+    sink = PayloadSink(args.api_mode, args.api_encoding, send_every=round(args.fps / MAX_SEND_RATE))
+    detections_total = 0
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for frame_index, results in enumerate(outputs):
+        with PROFILER.stage('extract'):
+            detections = extract_detections(results)
+        with PROFILER.stage('analyze'):
+            result = analyzer.process(frame_index, detections, frame_shape, annotate=args.annotate)
+        with PROFILER.stage('submit'):
+            send_to_api(sink, result.cars, result.stats)
+        if args.annotate:
+            with PROFILER.stage('draw'):
+                draw_frame_result(frame, result)
+        detections_total += len(detections)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    return {
+        'cars': cars,
+        'frames': args.frames,
+        'framesPerSecond': round(args.frames / elapsed, 1),
+        'msPerFrame': round(elapsed / args.frames * 1000, 3),
+        'cpuMsPerFrame': round(cpu / args.frames * 1000, 3),
+        'detectionsPerFrame': round(detections_total / args.frames, 1),
+        'payloadBytes': round(sink.bytes / max(1, sink.sent)),
+        'stages': PROFILER.summary(),
+    }
+
+
+def parse_benchmark_args():
+    parser = argparse.ArgumentParser(description='Benchmark the detector post-inference path on synthetic boxes')
+    parser.add_argument('--cars', type=int, nargs='+', default=list(DENSITIES), help='Car densities to run')
+    parser.add_argument('--frames', type=int, default=FRAMES, help='Frames per density')
+    parser.add_argument('--width', type=int, default=1280, help='Frame width')
+    parser.add_argument('--height', type=int, default=720, help='Frame height')
+    parser.add_argument('--fps', type=float, default=DEFAULT_FPS, help='Source frame rate the tracks move at')
+    parser.add_argument('--annotate', action='store_true', help='Also build and draw boxes, as with --show')
+    parser.add_argument('--api-mode', choices=['delta', 'full'], default='delta', help='Payload kind to encode')
+    parser.add_argument('--api-encoding', choices=['binary', 'json'], default='binary', help='Payload encoding')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic scene')
+    parser.add_argument('--output', help='Write the JSON result here instead of stdout')
+    parser.add_argument('--baseline', help='Earlier result to compare with; exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='Allowed slowdown against the baseline, as a fraction')
+    return parser.parse_args()
+
+
+def main_benchmark_detection():
+    args = parse_benchmark_args()
+    PROFILER.enabled = True
+
+    runs = [run_density(cars, args) for cars in args.cars]
+    metrics = {}
+    for run in runs:
+        metrics[f"cars{run['cars']}.framesPerSecond"] = run['framesPerSecond']
+        metrics[f"cars{run['cars']}.cpuMsPerFrame"] = run['cpuMsPerFrame']
+    results = {
+        'benchmark': 'detection',
+        'environment': environment(),
+        'config': {key: getattr(args, key) for key in
+                   ('frames', 'width', 'height', 'fps', 'annotate', 'api_mode', 'api_encoding', 'seed')},
+        'runs': runs,
+        'metrics': metrics,
+    }
+    write_results(results, args.output)
+    if args.baseline:
+        sys.exit(check_baseline(results, args.baseline, args.tolerance))
+
+
+if __name__ == '__main__':
+    main_benchmark_detection()
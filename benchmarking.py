@@ -0,0 +1,78 @@
+"""
+Shared helpers of the benchmark scripts
+Results are JSON documents with a flat 'metrics' dict, so a run can be
+checked against a saved baseline: rates (names ending in PerSecond) must not
+drop and times must not grow by more than the tolerance.
+"""
+import json
+import os
+import platform
+import statistics
+import sys
+from datetime import datetime
+
+TOLERANCE = 0.2  # Allowed slowdown against a baseline before a metric counts as a regression
+
+
+def environment():
+    """Where a result was measured"""
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def latency_summary(samples):
+    """count, p50/p95/p99/max in milliseconds of latencies in seconds"""
+    if not samples:
+        return {'count': 0, 'p50Ms': None, 'p95Ms': None, 'p99Ms': None, 'maxMs': None}
+    if len(samples) == 1:
+        p50 = p95 = p99 = samples[0]
+    else:
+        cuts = statistics.quantiles(samples, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    return {
+        'count': len(samples),
+        'p50Ms': round(p50 * 1000, 3),
+        'p95Ms': round(p95 * 1000, 3),
+        'p99Ms': round(p99 * 1000, 3),
+        'maxMs': round(max(samples) * 1000, 3),
+    }
+
+
+def regressions(metrics, baseline_metrics, tolerance=TOLERANCE):
+    """(name, baseline, current) of every metric that got worse than the baseline allows"""
+    worse = []
+    for name, value in metrics.items():
+        base = baseline_metrics.get(name)
+        if not base or value is None:
+            continue
+        if name.endswith('PerSecond'):
+            regressed = value < base * (1 - tolerance)
+        else:
+            regressed = value > base * (1 + tolerance)
+        if regressed:
+            worse.append((name, base, value))
+    return worse
+
+
+def write_results(results, output=None):
+    """Results as JSON to the output file, or stdout"""
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+def check_baseline(results, baseline_path, tolerance=TOLERANCE):
+    """Exit status against a baseline result file: 1 when any metric regressed"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    worse = regressions(results['metrics'], baseline.get('metrics', {}), tolerance)
+    for name, base, value in worse:
+        print(f"Regression in {name}: {value} vs baseline {base}", file=sys.stderr)
+    return 1 if worse else 0
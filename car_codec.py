@@ -0,0 +1,226 @@
+"""
+Binary encoding of detector payloads
+Same content as the JSON full/delta payloads of car_delta, in a fixed layout
+that skips repeated key names, ISO timestamps and nested position objects.
+Posted with Content-Type CARS_MIMETYPE; the API keeps accepting JSON.
+
+Layout (little-endian):
+
+    header   magic 'RBC1', kind (0 full, 1 delta), seq, baseSeq (-1 = none),
+             timestamp (epoch seconds), string count, car count, changed count,
+             removed count, meta length
+    strings  string table (class names, ids that aren't 'car-<n>'), each
+             a uint16 length and UTF-8 bytes
+    cars     one 14-byte record per car: full cars, or added then changed
+             cars for a delta
+    removed  one 6-byte id per removed car
+    meta     JSON object with everything else (stats, profile, ...)
+
+A car record is (track number or -1, string index of the id or 0xFFFF,
+field mask, class string index, confidence * 100, zone/penalty bits, x, y).
+The field mask says which fields a record carries, so partial 'changed'
+entries stay partial.
+Per-car timestamps aren't sent: every car of a frame shares one, so
+decoded cars take the payload timestamp, as apply_delta does for deltas.
+"""
+import json
+import struct
+from datetime import datetime
+
+CARS_MIMETYPE = 'application/vnd.roundabout.cars'
+
+MAGIC = b'RBC1'
+KIND_FULL = 0
+KIND_DELTA = 1
+NO_SEQ = -1
+NO_STRING = 0xFFFF
+
+HEADER = struct.Struct('<4sBqqdIIIII')
+CAR = struct.Struct('<iHBBBBhh')
+CAR_ID = struct.Struct('<iH')
+STRING_LENGTH = struct.Struct('<H')
+
+# Field mask bits of a car record
+HAS_TYPE = 1
+HAS_CONFIDENCE = 2
+HAS_POSITION = 4
+HAS_FIRST_ZONE = 8
+HAS_SECOND_ZONE = 16
+HAS_PENALTY = 32
+
+# Zone/penalty bits
+IN_FIRST_ZONE = 1
+IN_SECOND_ZONE = 2
+IS_PENALTY = 4
+
+CAR_FIELDS = {'id', 'type', 'confidence', 'position', 'inFirstZone', 'inSecondZone', 'isPenalty', 'timestamp'}
+PAYLOAD_FIELDS = {'cars', 'added', 'changed', 'removed', 'seq', 'baseSeq', 'timestamp'}
+
+
+class _Strings:
+    """String table built while encoding"""
+
+    def __init__(self):
+        self.index = {}
+
+    def ref(self, value):
+        ref = self.index.get(value)
+        if ref is None:
+            if len(self.index) >= NO_STRING:
+                raise ValueError('Too many distinct strings')
+            ref = self.index[value] = len(self.index)
+        return ref
+
+    def pack(self):
+        parts = []
+        for value in self.index:
+            data = value.encode('utf-8')
+            parts.append(STRING_LENGTH.pack(len(data)))
+            parts.append(data)
+        return b''.join(parts)
+
+
+def _pack_id(car_id, strings):
+    """(track number, string ref) for an id; 'car-<n>' ids need no string"""
+    if car_id.startswith('car-'):
+        number = car_id[4:]
+        if number.isdigit() and str(int(number)) == number and int(number) < 2 ** 31:
+            return int(number), NO_STRING
+    return -1, strings.ref(car_id)
+
+
+def _pack_car(car, strings):
+    if not CAR_FIELDS.issuperset(car):
+        raise ValueError(f'Unsupported car fields: {sorted(set(car) - CAR_FIELDS)}')
+    number, id_ref = _pack_id(car['id'], strings)
+    mask = 0
+    type_ref = 0
+    confidence = 0
+    bits = 0
+    x = y = 0
+    if 'type' in car:
+        mask |= HAS_TYPE
+        type_ref = strings.ref(car['type'])
+    if 'confidence' in car:
+        mask |= HAS_CONFIDENCE
+        confidence = round(car['confidence'] * 100)
+    if 'position' in car:
+        mask |= HAS_POSITION
+        x = car['position']['x']
+        y = car['position']['y']
+    if 'inFirstZone' in car:
+        mask |= HAS_FIRST_ZONE
+        bits |= IN_FIRST_ZONE if car['inFirstZone'] else 0
+    if 'inSecondZone' in car:
+        mask |= HAS_SECOND_ZONE
+        bits |= IN_SECOND_ZONE if car['inSecondZone'] else 0
+    if 'isPenalty' in car:
+        mask |= HAS_PENALTY
+        bits |= IS_PENALTY if car['isPenalty'] else 0
+    try:
+        return CAR.pack(number, id_ref, mask, type_ref, confidence, bits, x, y)
+    except struct.error as e:
+        raise ValueError(f"Car {car['id']} doesn't fit the binary layout: {e}")
+
+
+def encode_payload(payload):
+    """Binary form of a full or delta payload; ValueError when it doesn't fit the layout"""
+    strings = _Strings()
+    delta = 'cars' not in payload
+    if delta:
+        cars = list(payload.get('added', ())) + list(payload.get('changed', ()))
+        n_changed = len(payload.get('changed', ()))
+        timestamp = payload.get('timestamp')
+    else:
+        cars = payload['cars']
+        n_changed = 0
+        timestamp = cars[0].get('timestamp') if cars else None
+    timestamp = datetime.fromisoformat(timestamp).timestamp() if timestamp else datetime.now().timestamp()
+
+    records = b''.join([_pack_car(car, strings) for car in cars])
+    removed = b''.join([CAR_ID.pack(*_pack_id(car_id, strings)) for car_id in payload.get('removed', ())])
+    meta = json.dumps({key: value for key, value in payload.items() if key not in PAYLOAD_FIELDS},
+                      separators=(',', ':')).encode('utf-8')
+    seq = payload.get('seq')
+    base_seq = payload.get('baseSeq')
+    header = HEADER.pack(MAGIC, KIND_DELTA if delta else KIND_FULL,
+                         NO_SEQ if seq is None else seq, NO_SEQ if base_seq is None else base_seq, timestamp,
+                         len(strings.index), len(cars), n_changed, len(removed) // CAR_ID.size, len(meta))
+    return b''.join([header, strings.pack(), records, removed, meta])
+
+
+def decode_payload(data):
+    """The JSON-equivalent payload dict of a binary payload; ValueError when malformed"""
+    try:
+        magic, kind, seq, base_seq, timestamp, n_strings, n_cars, n_changed, n_removed, meta_length = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('Not a binary cars payload')
+        offset = HEADER.size
+
+        strings = []
+        for _ in range(n_strings):
+            (length,) = STRING_LENGTH.unpack_from(data, offset)
+            offset += STRING_LENGTH.size
+            strings.append(bytes(data[offset:offset + length]).decode('utf-8'))
+            offset += length
+
+        iso_timestamp = datetime.fromtimestamp(timestamp).isoformat()
+        end = offset + n_cars * CAR.size
+        cars = []
+        for number, id_ref, mask, type_ref, confidence, bits, x, y in CAR.iter_unpack(data[offset:end]):
+            car = {'id': f'car-{number}' if id_ref == NO_STRING else strings[id_ref]}
+            if mask & HAS_TYPE:
+                car['type'] = strings[type_ref]
+            if mask & HAS_CONFIDENCE:
+                car['confidence'] = confidence / 100
+            if mask & HAS_POSITION:
+                car['position'] = {'x': x, 'y': y}
+            if mask & HAS_FIRST_ZONE:
+                car['inFirstZone'] = bool(bits & IN_FIRST_ZONE)
+            if mask & HAS_SECOND_ZONE:
+                car['inSecondZone'] = bool(bits & IN_SECOND_ZONE)
+            if mask & HAS_PENALTY:
+                car['isPenalty'] = bool(bits & IS_PENALTY)
+            cars.append(car)
+        offset = end
+
+        end = offset + n_removed * CAR_ID.size
+        removed = [f'car-{number}' if id_ref == NO_STRING else strings[id_ref]
+                   for number, id_ref in CAR_ID.iter_unpack(data[offset:end])]
+        offset = end
+
+        if offset + meta_length != len(data):
+            raise ValueError('Length mismatch')
+        payload = json.loads(bytes(data[offset:]).decode('utf-8'))
+        if not isinstance(payload, dict):
+            raise ValueError('Meta is not an object')
+    except (struct.error, IndexError, UnicodeDecodeError, OverflowError, OSError) as e:
+        # OverflowError/OSError: a timestamp (e.g. inf) datetime can't represent
+        raise ValueError(f'Malformed binary payload: {e}')
+
+    if seq != NO_SEQ:
+        payload['seq'] = seq
+    if kind == KIND_FULL:
+        for car in cars:
+            car['timestamp'] = iso_timestamp
+        payload['cars'] = cars
+    elif kind == KIND_DELTA:
+        split = len(cars) - n_changed
+        payload['baseSeq'] = base_seq
+        payload['timestamp'] = iso_timestamp
+        payload['added'] = cars[:split]
+        payload['changed'] = cars[split:]
+        payload['removed'] = removed
+    else:
+        raise ValueError(f'Unknown payload kind {kind}')
+    return payload
+
+
+class BinaryCodec:
+    """Content type and encoder for ApiSender"""
+
+    mimetype = CARS_MIMETYPE
+
+    def encode(self, payload):
+        return encode_payload(payload)
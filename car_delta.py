@@ -0,0 +1,108 @@
+"""
+Delta protocol for roundabout car updates
+Shared by the detector (encoding) and the API (applying). A delta carries only
+the cars added, changed or removed since the last acknowledged sequence number:
+
+    {'seq': 12, 'baseSeq': 11, 'timestamp': '...',
+     'added': [car, ...], 'changed': [{'id': ..., <changed fields>}, ...],
+     'removed': [car_id, ...], 'stats': {...}}
+
+A full update ({'cars': [...], 'seq': n}) is always accepted and resets the
+sequence, so it doubles as the resync message.
+"""
+from datetime import datetime
+
+# Fields that change every frame and are not worth diffing per car
+IGNORED_FIELDS = ('timestamp',)
+
+
+class SequenceGap(Exception):
+    """Delta does not apply on top of the state the server holds"""
+
+
+def index_cars(cars):
+    """Map a list of cars by id"""
+    return {car['id']: car for car in cars}
+
+
+def diff_cars(old, new):
+    """Compute (added, changed, removed) between two {id: car} maps"""
+    added = []
+    changed = []
+    for car_id, car in new.items():
+        prev = old.get(car_id)
+        if prev is None:
+            added.append(car)
+            continue
+        fields = {key: value for key, value in car.items()
+                  if key not in IGNORED_FIELDS and prev.get(key) != value}
+        if fields:
+            fields['id'] = car_id
+            changed.append(fields)
+    removed = [car_id for car_id in old if car_id not in new]
+    return added, changed, removed
+
+
+def apply_delta(cars, delta):
+    """Apply a delta to a {id: car} map and return the new map"""
+    timestamp = delta.get('timestamp') or datetime.now().isoformat()
+    result = dict(cars)
+
+    for car_id in delta.get('removed', ()):
+        result.pop(car_id, None)
+
+    for car in delta.get('added', ()):
+        result[car['id']] = dict(car, timestamp=car.get('timestamp', timestamp))
+
+    for change in delta.get('changed', ()):
+        prev = result.get(change['id'])
+        if prev is None:
+            raise SequenceGap(f"Unknown car {change['id']}")
+        result[change['id']] = {**prev, **change, 'timestamp': timestamp}
+
+    return result
+
+
+class DeltaEncoder:
+    """Turn full detector payloads into deltas against the last acknowledged state"""
+
+    def __init__(self):
+        self.seq = 0
+        self.acked = None
+        self._inflight = None
+
+    def encode(self, payload):
+        """Build the wire payload for a full {'cars', 'stats'} payload"""
+        cars = index_cars(payload['cars'])
+        seq = self.seq + 1
+        self._inflight = (seq, cars)
+
+        if self.acked is None:
+            return dict(payload, seq=seq)
+
+        added, changed, removed = diff_cars(self.acked, cars)
+        delta = {
+            'seq': seq,
+            'baseSeq': self.seq,
+            'timestamp': datetime.now().isoformat(),
+            'added': added,
+            'changed': changed,
+            'removed': removed,
+            'stats': payload.get('stats', {}),
+        }
+        # Anything else the detector sends (e.g. its stage timings) rides along as is
+        for key, value in payload.items():
+            if key != 'cars':
+                delta.setdefault(key, value)
+        return delta
+
+    def ack(self):
+        """The last encoded payload was applied by the server"""
+        if self._inflight is not None:
+            self.seq, self.acked = self._inflight
+            self._inflight = None
+
+    def reset(self):
+        """Server asked for a resync; the next payload goes out in full"""
+        self.acked = None
+        self._inflight = None
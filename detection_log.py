@@ -0,0 +1,134 @@
+"""
+Recorded detections
+A detection log is a directory of raw little-endian column files plus a small
+meta.json. Per detection: track id, class id, confidence and the xyxy box; per
+frame: its index and the end offset of its rows. meta.json is written when
+recording starts and the reader counts rows and frames from the column file
+sizes, so a log cut short by a crash is readable up to the last flushed
+frame. Readers memory-map the columns, so replaying hours of footage reads
+only the bytes it touches.
+"""
+import json
+import os
+
+import numpy as np
+
+LOG_VERSION = 1
+
+# name -> (dtype, values per row)
+DETECTION_COLUMNS = {
+    'track_id': ('<i4', 1),
+    'cls': ('<i2', 1),
+    'conf': ('<f4', 1),
+    'xyxy': ('<f4', 4),
+}
+FRAME_COLUMNS = {
+    'frame_index': ('<i8', 1),
+    'row_end': ('<i8', 1),
+}
+META_FILE = 'meta.json'
+REPLAY_BLOCK_FRAMES = 4096  # Frames decoded from the memmaps at a time
+
+
+class DetectionRecorder:
+    """Appends extract_detections() arrays to a detection log"""
+
+    def __init__(self, path, source=None, fps=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.meta = {'version': LOG_VERSION, 'source': source, 'fps': fps, 'frameShape': None}
+        self.frames = 0
+        self.rows = 0
+        columns = dict(DETECTION_COLUMNS, **FRAME_COLUMNS)
+        self._files = {name: open(os.path.join(path, f'{name}.bin'), 'wb') for name in columns}
+        self._write_meta()
+
+    def _write_meta(self):
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump(self.meta, f)
+
+    def write(self, frame_index, detections, frame_shape):
+        """Record one frame; detections is an (N, 7) extract_detections() array"""
+        if self.meta['frameShape'] is None:
+            self.meta['frameShape'] = list(frame_shape)
+            self._write_meta()
+        files = self._files
+        files['track_id'].write(detections[:, 0].astype('<i4').tobytes())
+        files['cls'].write(detections[:, 1].astype('<i2').tobytes())
+        files['conf'].write(detections[:, 2].astype('<f4').tobytes())
+        files['xyxy'].write(detections[:, 3:7].astype('<f4').tobytes())
+        self.rows += len(detections)
+        self.frames += 1
+        files['frame_index'].write(np.array([frame_index], dtype='<i8').tobytes())
+        files['row_end'].write(np.array([self.rows], dtype='<i8').tobytes())
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self.meta['frames'] = self.frames
+        self.meta['rows'] = self.rows
+        self._write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DetectionLog:
+    """Memory-mapped detection log"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != LOG_VERSION:
+            raise ValueError(f"Unsupported detection log version: {self.meta.get('version')}")
+        self.frame_shape = tuple(self.meta['frameShape'] or ())
+        self.fps = self.meta.get('fps')
+        # Counts come from the files, not the meta, so an unclosed log reads up to its last whole frame
+        rows = min(self._rows_on_disk(name, dtype, width) for name, (dtype, width) in DETECTION_COLUMNS.items())
+        frames = min(self._rows_on_disk(name, dtype, width) for name, (dtype, width) in FRAME_COLUMNS.items())
+        row_end = self._map('row_end', '<i8', 1, frames)
+        frames = int(np.searchsorted(row_end, rows, side='right'))
+        self.frame_count = frames
+        self.columns = {name: self._map(name, dtype, width, rows)
+                        for name, (dtype, width) in DETECTION_COLUMNS.items()}
+        self.columns.update({name: self._map(name, dtype, width, frames)
+                             for name, (dtype, width) in FRAME_COLUMNS.items()})
+
+    def __len__(self):
+        return self.frame_count
+
+    def _rows_on_disk(self, name, dtype, width):
+        path = os.path.join(self.path, f'{name}.bin')
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        return size // (np.dtype(dtype).itemsize * width)
+
+    def _map(self, name, dtype, width, count):
+        shape = (count, width) if width > 1 else (count,)
+        if count == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, f'{name}.bin'), dtype=dtype, mode='r', shape=shape)
+
+    def frames(self, start=0, stop=None):
+        """(frame_index, (N, 7) detections) per recorded frame, in extract_detections layout"""
+        columns = self.columns
+        stop = len(self) if stop is None else min(stop, len(self))
+        row_end = columns['row_end']
+        frame_index = columns['frame_index']
+
+        for block_start in range(start, stop, REPLAY_BLOCK_FRAMES):
+            block_stop = min(block_start + REPLAY_BLOCK_FRAMES, stop)
+            lo = int(row_end[block_start - 1]) if block_start else 0
+            hi = int(row_end[block_stop - 1])
+            # One conversion per block; frames are then plain slices
+            block = np.column_stack([
+                columns['track_id'][lo:hi], columns['cls'][lo:hi], columns['conf'][lo:hi], columns['xyxy'][lo:hi]
+            ]).astype(float)
+            ends = row_end[block_start:block_stop] - lo
+            begin = 0
+            for index, end in zip(frame_index[block_start:block_stop].tolist(), ends.tolist()):
+                yield index, block[begin:end]
+                begin = end
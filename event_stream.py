@@ -0,0 +1,125 @@
+"""
+Server-Sent Events fan-out for the dashboard
+Each update is serialized once and handed to every subscriber of its topic.
+Subscribers keep only the newest message per key, so a slow client skips
+intermediate updates instead of building a backlog, and clients that stop
+reading altogether are disconnected.
+"""
+import threading
+import time
+
+ALL_TOPICS = '*'
+
+
+def format_event(event, data):
+    """Encode one SSE message"""
+    return f"event: {event}\ndata: {data}\n\n".encode('utf-8')
+
+
+class Subscriber:
+    """One connected stream client"""
+
+    def __init__(self, topic, max_rate=None):
+        self.topic = topic
+        # None (or a non-positive rate) means no limit; callers facing clients cap it
+        self.min_interval = 1.0 / max_rate if max_rate and max_rate > 0 else 0.0
+        self.closed = False
+        self.dropped = 0
+        self.pending_since = None  # When the oldest undelivered message was queued
+        self._last_sent = 0.0
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def offer(self, key, message):
+        """Queue a message; replaces a not yet delivered message with the same key"""
+        with self._cond:
+            if key in self._pending:
+                self.dropped += 1
+            elif not self._pending:
+                self.pending_since = time.monotonic()
+            self._pending[key] = message
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def stalled(self, timeout):
+        """True when messages have been waiting longer than timeout"""
+        pending_since = self.pending_since
+        return pending_since is not None and time.monotonic() - pending_since > timeout
+
+    def next_messages(self, timeout):
+        """Block until messages are due (respecting the rate limit) or timeout; [] on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self.closed:
+                now = time.monotonic()
+                if self._pending:
+                    wait = self._last_sent + self.min_interval - now
+                    if wait <= 0:
+                        break
+                else:
+                    wait = deadline - now
+                if now >= deadline:
+                    return []
+                self._cond.wait(min(wait, deadline - now))
+            if self.closed:
+                return []
+            messages = list(self._pending.values())
+            self._pending.clear()
+            self.pending_since = None
+            self._last_sent = time.monotonic()
+            return messages
+
+
+class EventBroker:
+    """Route published events to the subscribers of their topic"""
+
+    def __init__(self, stall_timeout=30.0):
+        self.stall_timeout = stall_timeout
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.disconnected = 0
+
+    def subscribe(self, topic=ALL_TOPICS, max_rate=None):
+        subscriber = Subscriber(topic, max_rate=max_rate)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.topic)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.topic]
+
+    def has_subscribers(self, topic):
+        """Cheap check so publishers can skip serialization when nobody listens"""
+        return bool(self._subscribers.get(topic) or self._subscribers.get(ALL_TOPICS))
+
+    def publish(self, topic, event, data):
+        """Fan a serialized event out to subscribers of topic and of all topics"""
+        message = format_event(event, data)
+        key = (event, topic)
+        with self._lock:
+            targets = list(self._subscribers.get(topic, ())) + list(self._subscribers.get(ALL_TOPICS, ()))
+        self.published += 1
+
+        for subscriber in targets:
+            if subscriber.stalled(self.stall_timeout):
+                # Slow consumer: stop feeding a client that isn't reading
+                self.unsubscribe(subscriber)
+                self.disconnected += 1
+                continue
+            subscriber.offer(key, message)
+
+    def stats(self):
+        with self._lock:
+            clients = sum(len(s) for s in self._subscribers.values())
+        return {'clients': clients, 'published': self.published, 'disconnected': self.disconnected}
@@ -0,0 +1,183 @@
+"""
+Time-series history of roundabout statistics
+Every sample goes into a fixed-size raw ring buffer and is folded into coarser
+tiers (1 minute, 15 minutes) as it arrives, so memory stays bounded no matter
+how long the server runs and a coarse range query reads only its own tier.
+Rings are backed by array.array, not lists of dicts.
+"""
+import math
+import threading
+from array import array
+
+# (field, how samples are folded into a coarser bucket)
+HISTORY_FIELDS = (
+    ('vehicleEntry', 'last'),
+    ('vehicleExit', 'last'),
+    ('laneUtilization', 'mean'),
+    ('severityScore', 'mean'),
+    ('totalCars', 'mean'),
+    ('penaltyCount', 'max'),
+)
+
+# (name, bucket seconds, capacity); raw keeps the last samples as they came in
+HISTORY_TIERS = (
+    ('raw', 0, 720),
+    ('1m', 60, 1440),  # One day
+    ('15m', 900, 672),  # One week
+)
+
+
+class Ring:
+    """Fixed-capacity ring of timestamps and float columns"""
+
+    def __init__(self, capacity, n_columns):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.columns = [array('f', bytes(4 * capacity)) for _ in range(n_columns)]
+        self.head = 0  # Next write position
+        self.size = 0
+
+    def append(self, t, row):
+        i = self.head
+        self.times[i] = t
+        for column, value in zip(self.columns, row):
+            column[i] = value
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def oldest(self):
+        return self.times[self._physical(0)] if self.size else None
+
+    def _physical(self, k):
+        return (self.head - self.size + k) % self.capacity
+
+    def _bisect(self, t, right=False):
+        """First logical index whose time is >= t (> t when right)"""
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self.times[self._physical(mid)]
+            if value < t or (right and value == t):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def slice(self, t0, t1):
+        """(times, columns) for samples with t0 <= t <= t1"""
+        lo = self._bisect(t0)
+        hi = self._bisect(t1, right=True)
+        idx = [self._physical(k) for k in range(lo, hi)]
+        return [self.times[i] for i in idx], [[column[i] for i in idx] for column in self.columns]
+
+
+class Tier:
+    """Ring of fixed-width buckets, filled as samples arrive"""
+
+    def __init__(self, name, seconds, capacity, aggs):
+        self.name = name
+        self.seconds = seconds
+        self.aggs = aggs
+        self.ring = Ring(capacity, len(aggs))
+        self._bucket = None
+        self._acc = None
+        self._counts = None
+
+    def add(self, t, row):
+        if not self.seconds:
+            self.ring.append(t, row)
+            return
+        bucket = math.floor(t / self.seconds)
+        if bucket != self._bucket:
+            if self._bucket is not None:
+                self.ring.append(self._bucket * self.seconds, self._current())
+            self._bucket = bucket
+            self._acc = list(row)
+            self._counts = [0 if math.isnan(value) else 1 for value in row]
+            return
+        for i, (agg, value) in enumerate(zip(self.aggs, row)):
+            if math.isnan(value):
+                continue
+            self._counts[i] += 1
+            if math.isnan(self._acc[i]) or agg == 'last':
+                self._acc[i] = value
+            elif agg == 'mean':
+                self._acc[i] += value
+            elif agg == 'max':
+                self._acc[i] = max(self._acc[i], value)
+
+    def covers(self, t):
+        """True when no sample at or after t has been overwritten yet"""
+        ring = self.ring
+        return ring.size < ring.capacity or ring.oldest() <= t
+
+    def query(self, t0, t1):
+        times, columns = self.ring.slice(t0, t1)
+        # The bucket still filling is the newest point
+        if self.seconds and self._bucket is not None and t0 <= self._bucket * self.seconds <= t1:
+            times.append(self._bucket * self.seconds)
+            for column, value in zip(columns, self._current()):
+                column.append(value)
+        return times, columns
+
+    def _current(self):
+        # Means are kept as running sums until the bucket is read
+        return [value / count if agg == 'mean' and count else value
+                for agg, value, count in zip(self.aggs, self._acc, self._counts)]
+
+
+class RoundaboutHistory:
+    """All tiers for one roundabout"""
+
+    def __init__(self):
+        aggs = [agg for _, agg in HISTORY_FIELDS]
+        self.tiers = {name: Tier(name, seconds, capacity, aggs) for name, seconds, capacity in HISTORY_TIERS}
+
+    def record(self, t, row):
+        for tier in self.tiers.values():
+            tier.add(t, row)
+
+    def pick_tier(self, t0):
+        """Finest tier that still holds data back to t0"""
+        for name, _, _ in HISTORY_TIERS:
+            if self.tiers[name].covers(t0):
+                return name
+        return HISTORY_TIERS[-1][0]
+
+
+def _number(value):
+    """value as a float; NaN (an empty sample) for missing or non-numeric values"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+
+class HistoryStore:
+    """Per-roundabout history, created on the first sample"""
+
+    def __init__(self):
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def record(self, roundabout_id, values, t):
+        """Record a sample; values maps field names to numbers (missing or non-numeric fields stay empty)"""
+        row = [_number(values.get(field)) for field, _ in HISTORY_FIELDS]
+        with self._lock:
+            history = self._histories.get(roundabout_id)
+            if history is None:
+                history = self._histories[roundabout_id] = RoundaboutHistory()
+            history.record(t, row)
+
+    def query(self, roundabout_id, t0, t1, resolution='auto'):
+        """(resolution, times, {field: values}) or None when nothing was recorded"""
+        with self._lock:
+            history = self._histories.get(roundabout_id)
+            if history is None:
+                return None
+            if resolution == 'auto':
+                resolution = history.pick_tier(t0)
+            times, columns = history.tiers[resolution].query(t0, t1)
+
+        series = {field: [None if math.isnan(value) else value for value in column]
+                  for (field, _), column in zip(HISTORY_FIELDS, columns)}
+        return resolution, times, series
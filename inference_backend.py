@@ -0,0 +1,106 @@
+"""
+CPU inference backends
+On GPU-less boxes the PyTorch model is the slowest way to run YOLO. The
+weights can be exported once to ONNX Runtime or OpenVINO (optionally INT8)
+and the artifact is cached, keyed by the weights' hash, the input size and
+the export options, so later starts only load it. A warm-up pass on a blank
+frame moves one-off setup (graph compilation, allocations) out of the first
+live frame.
+
+The cache lives in ROUNDABOUT_MODEL_CACHE (default ~/.cache/roundabout/models).
+Exporting needs the export packages of the backend (onnx or openvino) once;
+running needs onnxruntime or openvino.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from ultralytics import YOLO
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+MODEL_CACHE_DIR = os.environ.get('ROUNDABOUT_MODEL_CACHE', os.path.expanduser('~/.cache/roundabout/models'))
+IMGSZ = 640
+WARMUP_RUNS = 2
+
+# What ultralytics names the artifact; the loader recognises the format by it
+EXPORT_SUFFIX = {'onnx': '.onnx', 'openvino': '_openvino_model'}
+
+
+def file_hash(path, block_size=1 << 20):
+    """Short SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def resolve_weights(model_path):
+    """Local path of the weights, letting ultralytics download names like 'yolov8n.pt'"""
+    if os.path.isfile(model_path):
+        return model_path
+    return getattr(YOLO(model_path), 'ckpt_path', None) or model_path
+
+
+def cache_key(weights, imgsz, int8=False, dynamic=False):
+    """Cache name of an export, without the backend suffix"""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    return f'{stem}-{file_hash(weights)}-{imgsz}' + ('-int8' if int8 else '') + ('-dynamic' if dynamic else '')
+
+
+def export_model(weights, backend, imgsz=IMGSZ, int8=False, dynamic=False, cache_dir=MODEL_CACHE_DIR):
+    """Path of the exported model in the cache, exporting it on a miss; returns (path, was_cached)"""
+    os.makedirs(cache_dir, exist_ok=True)
+    target = os.path.join(cache_dir, cache_key(weights, imgsz, int8, dynamic) + EXPORT_SUFFIX[backend])
+    if os.path.exists(target):
+        return target, True
+
+    # Export from a private copy: ultralytics writes next to the weights, which may be
+    # read-only or shared with another detector exporting at the same time
+    with tempfile.TemporaryDirectory(dir=cache_dir) as work:
+        source = os.path.join(work, os.path.basename(weights))
+        shutil.copyfile(weights, source)
+        exported = YOLO(source).export(format=backend, imgsz=imgsz, int8=int8, dynamic=dynamic, verbose=False)
+        try:
+            os.replace(exported, target)
+        except OSError:
+            # Another process got there first (a directory can't replace a non-empty one)
+            if not os.path.exists(target):
+                raise
+    return target, False
+
+
+def warm_up(model, imgsz=IMGSZ, runs=WARMUP_RUNS):
+    """Run the model on blank frames so the first live frame doesn't pay for setup"""
+    frame = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    for _ in range(runs):
+        model.predict(frame, imgsz=imgsz, verbose=False)
+
+
+def load_model(model_path, backend='torch', imgsz=IMGSZ, int8=False, dynamic=False,
+               cache_dir=MODEL_CACHE_DIR, warmup_runs=WARMUP_RUNS):
+    """YOLO model on the given backend, exported and cached as needed, warmed up"""
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown inference backend {backend!r}, expected one of {BACKENDS}')
+    if int8 and backend != 'openvino':
+        raise ValueError('INT8 quantization needs the openvino backend')
+
+    start = time.perf_counter()
+    if backend == 'torch':
+        model = YOLO(model_path)
+        source = model_path
+    else:
+        source, cached = export_model(resolve_weights(model_path), backend, imgsz, int8, dynamic, cache_dir)
+        if not cached:
+            print(f"Exported {model_path} for {backend} in {time.perf_counter() - start:.1f}s")
+        model = YOLO(source, task='detect')
+    loaded = time.perf_counter()
+
+    if warmup_runs:
+        warm_up(model, imgsz, warmup_runs)
+    print(f"Model {source} ({backend}) ready: loaded in {loaded - start:.2f}s, "
+          f"warmed up in {time.perf_counter() - loaded:.2f}s")
+    return model
@@ -0,0 +1,188 @@
+"""
+Multi-camera roundabout detection
+One process and one model cover several cameras: the latest frame of each
+stream is batched into a single model.predict call, then every stream runs
+its own tracker, FrameAnalyzer and API sender. Streams come from a JSON config:
+
+    {
+        "apiUrl": "http://localhost:5000/api/roundabout/{roundabout_id}/update",
+        "streams": [
+            {
+                "source": "rtsp://camera-1/stream",
+                "roundaboutId": "n-001",
+                "zones": {
+                    "roundabout": [[x, y], ...],
+                    "firstCarZone": [[x, y], ...],
+                    "secondCarZone": [[x, y], ...]
+                },
+                "circulation": "counterclockwise",
+                "pixelsPerMeter": 8.0,
+                "speedLimit": 50
+            }
+        ]
+    }
+
+Zones are polygons in pixel coordinates; a stream without "zones" uses the
+default polygons of the detection script. circulation, pixelsPerMeter and
+speedLimit are optional and default to the command line options.
+
+Usage: python multi_stream.py --config cameras.json [--model ...] [--show]
+"""
+import argparse
+import json
+import queue
+import sys
+import time
+
+import cv2
+
+from api_sender import ApiSender
+from car_codec import BinaryCodec
+from car_delta import DeltaEncoder
+from inference_backend import load_model
+from pipeline import END_OF_STREAM, FrameReader, is_live_source
+from run_detection_with_api import (
+    API_URL_TEMPLATE, VEHICLE_CLASS_IDS, FrameAnalyzer, build_zone_polygons,
+    draw_frame_result, open_video_capture, parse_api_args, send_to_api
+)
+from tracking import create_tracker, tracks_to_detections
+from trajectories import BehaviourDetector
+from zone_masks import config_polygons
+
+BATCH_WAIT = 0.02  # Seconds to wait for frames when filling a batch
+
+
+def parse_stream_args():
+    """Multi-stream options on top of the single-stream ones"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--config', required=True, help='JSON file listing the camera streams')
+    parser.add_argument('--batch-wait', type=float, default=BATCH_WAIT,
+                        help='Seconds to wait for frames when filling an inference batch')
+    stream_args, remaining = parser.parse_known_args()
+
+    sys.argv = sys.argv[:1] + remaining
+    args = parse_api_args()
+    for key, value in vars(stream_args).items():
+        setattr(args, key, value)
+    return args
+
+
+class CameraStream:
+    """Capture, tracking, analysis and API sending for one camera"""
+
+    def __init__(self, config, api_url_template, args):
+        self.roundabout_id = config['roundaboutId']
+        self.source = config['source']
+        self.window_name = f"Vehicle Detection - {self.roundabout_id}"
+        zones = config.get('zones')
+
+        if args.drop_policy == 'auto':
+            drop_frames = is_live_source(self.source)
+        else:
+            drop_frames = args.drop_policy == 'drop'
+        self.cap = open_video_capture(self.source)
+        self.reader = FrameReader(self.cap.read, queue_size=args.queue_size, drop_frames=drop_frames)
+        self.tracker = create_tracker()
+        behaviours = BehaviourDetector(config.get('circulation', args.circulation),
+                                       config.get('pixelsPerMeter', args.pixels_per_meter),
+                                       config.get('speedLimit', args.speed_limit))
+        self.analyzer = FrameAnalyzer(config_polygons(zones) if zones else build_zone_polygons,
+                                      fps=self.cap.get(cv2.CAP_PROP_FPS), behaviours=behaviours)
+
+        encoder = DeltaEncoder() if args.api_mode == 'delta' else None
+        codec = BinaryCodec() if args.api_encoding == 'binary' else None
+        self.sender = ApiSender(api_url_template.format(roundabout_id=self.roundabout_id),
+                                max_rate=args.max_send_rate, max_retries=args.send_retries, encoder=encoder,
+                                codec=codec)
+        self.finished = False
+
+    def start(self):
+        self.reader.start(name=f'decode-{self.roundabout_id}')
+        self.sender.start()
+
+    def stop(self):
+        self.reader.stop()
+        self.cap.release()
+        self.sender.stop()
+
+    def process(self, frame_index, frame, result, annotate=False):
+        """Track this stream's detections from a batched result and run the roundabout logic"""
+        tracks = self.tracker.update(result.boxes.cpu().numpy(), frame)
+        frame_result = self.analyzer.process(frame_index, tracks_to_detections(tracks), frame.shape,
+                                             annotate=annotate)
+        send_to_api(self.sender, frame_result.cars, frame_result.stats)
+        return frame_result
+
+
+def collect_batch(streams, wait):
+    """(stream, (frame_index, frame)) for every stream with a frame ready within wait seconds"""
+    batch = []
+    deadline = time.monotonic() + wait
+    for stream in streams:
+        try:
+            item = stream.reader.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            continue
+        if item is END_OF_STREAM:
+            stream.finished = True
+            continue
+        batch.append((stream, item))
+    return batch
+
+
+def main_multi_stream():
+    """Run detection for every stream in the config with one shared model"""
+    args = parse_stream_args()
+    with open(args.config) as f:
+        config = json.load(f)
+    api_url_template = config.get('apiUrl', API_URL_TEMPLATE)
+
+    # Batch sizes vary with how many streams have a frame ready, so exports take any batch
+    model = load_model(args.model, args.backend, args.imgsz, int8=args.int8, dynamic=True,
+                       cache_dir=args.export_cache, warmup_runs=args.warmup)
+    streams = [CameraStream(entry, api_url_template, args) for entry in config['streams']]
+    for stream in streams:
+        stream.start()
+
+    batches = 0
+    frames = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            active = [stream for stream in streams if not stream.finished]
+            if not active:
+                break
+            batch = collect_batch(active, args.batch_wait)
+            if not batch:
+                continue
+
+            # One forward pass for the whole batch; tracking stays per stream
+            results = model.predict([frame for _, (_, frame) in batch], conf=args.conf, iou=args.iou,
+                                    imgsz=args.imgsz, classes=VEHICLE_CLASS_IDS.tolist(), verbose=False)
+            batches += 1
+            frames += len(batch)
+
+            for (stream, (frame_index, frame)), result in zip(batch, results):
+                frame_result = stream.process(frame_index, frame, result, annotate=args.show)
+                if args.show:
+                    draw_frame_result(frame, frame_result)
+                    cv2.imshow(stream.window_name, frame)
+
+            if args.show and cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+    finally:
+        for stream in streams:
+            stream.stop()
+        elapsed = time.perf_counter() - start
+        print(f"Processed {frames} frames in {batches} batches "
+              f"({frames / max(elapsed, 1e-9):.1f} frames/s, {frames / max(batches, 1):.1f} per batch)")
+        for stream in streams:
+            print(f"  {stream.roundabout_id}: dropped {stream.reader.queue.dropped} frames, "
+                  f"API sender {stream.sender.stats()}")
+        if args.show:
+            cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main_multi_stream()
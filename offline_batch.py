@@ -0,0 +1,236 @@
+"""
+Parallel offline processing of recorded video
+The video is split into time chunks that a process pool runs through YOLO
+tracking, one model per worker. Each chunk starts a few frames early, so its
+tracker is warmed up by the time its own frames begin. Those overlap frames
+are also used to map the chunk's track ids onto the ids of the previous chunk.
+The stitched detections then go through the normal FrameAnalyzer in frame
+order. Entry/exit and penalty totals therefore count each car once across
+chunk boundaries. Results go to a JSON Lines file instead of the API.
+
+Usage: python offline_batch.py --source video.mp4 --output results.jsonl [--workers 8]
+"""
+import sys
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import cv2
+import numpy as np
+
+from run_detection_with_api import EXIT_THRESHOLD_FRAMES, YOLO, FrameAnalyzer, extract_detections, parse_args
+
+CHUNK_SECONDS = 300
+OVERLAP_FRAMES = 2 * EXIT_THRESHOLD_FRAMES  # Tracker warm-up and id matching before each chunk
+MATCH_IOU = 0.5  # Boxes this close in the same frame are the same car
+
+# Per-worker state, set up by init_worker
+_worker = {}
+
+
+def parse_batch_args():
+    """Parse the batch options and hand the remaining ones to the detection parser"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--output', required=True, help='JSON Lines results file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--chunk-seconds', type=float, default=CHUNK_SECONDS, help='Video seconds per chunk')
+    parser.add_argument('--overlap-frames', type=int, default=OVERLAP_FRAMES,
+                        help='Frames each chunk processes before its start to warm up and stitch tracks')
+    parser.add_argument('--output-interval', type=float, default=1.0,
+                        help='Video seconds between result lines (0 = every frame)')
+    batch_args, remaining = parser.parse_known_args()
+
+    sys.argv = sys.argv[:1] + remaining
+    args = parse_args()
+    for key, value in vars(batch_args).items():
+        setattr(args, key, value)
+    return args
+
+
+def video_info(path):
+    """(frame count, fps, frame shape) of a video file"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video: {path}")
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+    cap.release()
+    return frame_count, fps, shape
+
+
+def plan_chunks(frame_count, chunk_frames, overlap_frames):
+    """(read_from, start, end) frame positions per chunk; frames before start only warm up"""
+    chunks = []
+    for start in range(0, frame_count, chunk_frames):
+        chunks.append((max(0, start - overlap_frames), start, min(start + chunk_frames, frame_count)))
+    return chunks
+
+
+def init_worker(model_path, conf, iou, threads):
+    """Load one model per worker process"""
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker['model'] = YOLO(model_path)
+    _worker['conf'] = conf
+    _worker['iou'] = iou
+
+
+def track_chunk(task):
+    """Track one chunk; returns (start, detections with a leading frame position column)"""
+    path, (read_from, start, end) = task
+    model = _worker['model']
+    # A worker runs several chunks; each one starts with fresh tracks
+    for tracker in getattr(model.predictor, 'trackers', None) or ():
+        tracker.reset()
+
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, read_from)
+    arrays = []
+    try:
+        for position in range(read_from, end):
+            ok, frame = cap.read()
+            if not ok:
+                break
+            results = model.track(source=frame, conf=_worker['conf'], iou=_worker['iou'],
+                                  persist=True, verbose=False)
+            detections = extract_detections(results)
+            arrays.append(np.column_stack([np.full(len(detections), position), detections]))
+    finally:
+        cap.release()
+
+    if not arrays:
+        return start, np.empty((0, 8), dtype=np.float32)
+    return start, np.concatenate(arrays).astype(np.float32)
+
+
+def box_iou(a, b):
+    """IoU matrix between two (N, 4) and (M, 4) xyxy arrays"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+class TrackStitcher:
+    """Maps per-chunk track ids onto one global id space"""
+
+    def __init__(self, overlap_frames):
+        self.overlap_frames = overlap_frames
+        self.next_id = 1
+        self._tail = np.empty((0, 8), dtype=np.float32)  # Last stitched frames, global ids
+
+    def stitch(self, start, detections):
+        """Chunk detections from start on, with global track ids"""
+        warmup = detections[detections[:, 0] < start]
+        detections = detections[detections[:, 0] >= start].copy()
+        id_map = self._match(warmup)
+
+        tracked = detections[:, 1] >= 0
+        local_ids = detections[tracked, 1].astype(np.int64)
+        for local_id in np.unique(local_ids).tolist():
+            if local_id not in id_map:
+                id_map[local_id] = self.next_id
+                self.next_id += 1
+        detections[tracked, 1] = [id_map[local_id] for local_id in local_ids.tolist()]
+
+        if len(detections):
+            self._tail = detections[detections[:, 0] > detections[-1, 0] - self.overlap_frames]
+        return detections
+
+    def _match(self, warmup):
+        """{local id: global id} voted over the frames both chunks tracked"""
+        votes = {}
+        tail = self._tail[self._tail[:, 1] >= 0]
+        warmup = warmup[warmup[:, 1] >= 0]
+        for position in np.intersect1d(tail[:, 0], warmup[:, 0]).tolist():
+            old = tail[tail[:, 0] == position]
+            new = warmup[warmup[:, 0] == position]
+            iou = box_iou(new[:, 4:8], old[:, 4:8])
+            for i, j in zip(*np.nonzero(iou >= MATCH_IOU)):
+                key = (int(new[i, 1]), int(old[j, 1]))
+                votes[key] = votes.get(key, 0) + 1
+
+        # Most agreeing pairs first, each id used once
+        id_map = {}
+        used = set()
+        for (local_id, global_id), _ in sorted(votes.items(), key=lambda item: -item[1]):
+            if local_id not in id_map and global_id not in used:
+                id_map[local_id] = global_id
+                used.add(global_id)
+        return id_map
+
+
+def iter_frames(detections, start, end):
+    """(position, frame detections) for every frame of a chunk, empty frames included"""
+    positions = detections[:, 0].astype(np.int64)
+    bounds = np.searchsorted(positions, np.arange(start, end + 1))
+    for offset, position in enumerate(range(start, end)):
+        yield position, detections[bounds[offset]:bounds[offset + 1], 1:].astype(float)
+
+
+def main_offline_batch():
+    """Process a recorded video with a process pool and write the results file"""
+    args = parse_batch_args()
+    frame_count, fps, shape = video_info(args.source)
+    chunk_frames = max(1, int(args.chunk_seconds * fps))
+    chunks = plan_chunks(frame_count, chunk_frames, args.overlap_frames)
+    workers = max(1, min(args.workers, len(chunks)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    output_every = max(1, int(args.output_interval * fps))
+
+    print(f"{frame_count} frames at {fps:.1f} fps: {len(chunks)} chunks on {workers} workers")
+    analyzer = FrameAnalyzer(fps=fps)
+    stitcher = TrackStitcher(args.overlap_frames)
+    frames = 0
+    start_time = time.perf_counter()
+
+    # spawn: torch and fork don't mix
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=init_worker,
+                      initargs=(args.model, args.conf, args.iou, threads)) as pool, \
+            open(args.output, 'w') as out:
+        tasks = [(args.source, chunk) for chunk in chunks]
+        # imap keeps chunk order, so stitching and analysis run while later chunks are tracked
+        for (_, start, end), (_, detections) in zip(chunks, pool.imap(track_chunk, tasks)):
+            detections = stitcher.stitch(start, detections)
+            for position, frame_detections in iter_frames(detections, start, end):
+                result = analyzer.process(position + 1, frame_detections, shape, annotate=False)
+                frames += 1
+                if position % output_every == 0 or position == frame_count - 1:
+                    out.write(json.dumps({
+                        'frameIndex': position + 1,
+                        'time': round(position / fps, 3),
+                        'cars': len(result.cars),
+                        'stats': result.stats,
+                    }) + '\n')
+            print(f"  chunk {start // chunk_frames + 1}/{len(chunks)} done")
+
+        elapsed = time.perf_counter() - start_time
+        summary = {
+            'source': args.source,
+            'frames': frames,
+            'chunks': len(chunks),
+            'workers': workers,
+            'tracks': stitcher.next_id - 1,
+            'elapsedSeconds': round(elapsed, 2),
+            'framesPerSecond': round(frames / max(elapsed, 1e-9), 1),
+            'stats': result.stats if frames else None,
+        }
+        out.write(json.dumps({'summary': summary}) + '\n')
+
+    print(f"Done: {json.dumps(summary)}")
+
+
+if __name__ == "__main__":
+    main_offline_batch()
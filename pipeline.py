@@ -0,0 +1,178 @@
+"""
+Staged frame pipeline for the detector
+Decode and inference run on their own threads, connected to each other and to
+the consumer (post-processing, in the caller's thread) by bounded queues, so
+decoding the next frame overlaps inference on the current one.
+
+For live sources the decode queue drops its oldest frame when inference falls
+behind, which keeps latency bounded. For files nothing is ever dropped; the
+decoder simply waits.
+"""
+import queue
+import threading
+import time
+
+LIVE_SOURCE_PREFIXES = ('rtsp://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+
+END_OF_STREAM = object()
+
+
+def is_live_source(source):
+    """Cameras and network streams are live; file paths are not"""
+    source = str(source)
+    return source.isdigit() or source.lower().startswith(LIVE_SOURCE_PREFIXES)
+
+
+class FrameQueue:
+    """Bounded queue that either blocks or drops its oldest item when full"""
+
+    def __init__(self, maxsize, drop_oldest=False):
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item, stop_event):
+        while not stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self.drop_oldest and item is not END_OF_STREAM:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        return False
+
+    def get(self, timeout=0.1):
+        return self._queue.get(timeout=timeout)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class FrameReader:
+    """Decode thread feeding a FrameQueue with (frame_index, frame) items
+
+    frame_index counts decoded frames, so dropped frames leave gaps. The queue
+    ends with END_OF_STREAM.
+    """
+
+    def __init__(self, read_frame, queue_size=2, drop_frames=False, stop_event=None):
+        self.read_frame = read_frame
+        self.queue = FrameQueue(queue_size, drop_oldest=drop_frames)
+        self.stop_event = stop_event or threading.Event()
+        self.error = None
+        self.frames_decoded = 0
+        self.decode_time = 0.0
+        self._thread = None
+
+    def start(self, name='decode'):
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def get(self, timeout=0.1):
+        """Next item; raises queue.Empty after timeout"""
+        return self.queue.get(timeout)
+
+    def _run(self):
+        try:
+            while not self.stop_event.is_set():
+                start = time.perf_counter()
+                ok, frame = self.read_frame()
+                if not ok:
+                    break
+                self.decode_time += time.perf_counter() - start
+                self.frames_decoded += 1
+                self.queue.put((self.frames_decoded, frame), self.stop_event)
+        except Exception as e:
+            self.error = e
+        self.queue.put(END_OF_STREAM, self.stop_event)
+
+
+class FramePipeline:
+    """Decode -> inference -> consumer, each stage on its own thread
+
+    read_frame() returns (ok, frame) like cv2.VideoCapture.read; infer(frame)
+    returns whatever the consumer needs (infer(frame, frame_index) with
+    pass_index, for stages that track time across frames). Iterating yields
+    (frame_index, frame, inference_output) in source order; frame_index counts
+    decoded frames, so dropped frames leave gaps.
+    """
+
+    def __init__(self, read_frame, infer, queue_size=2, drop_frames=False, pass_index=False):
+        self.infer = infer
+        self.pass_index = pass_index
+        self._stop = threading.Event()
+        self.reader = FrameReader(read_frame, queue_size, drop_frames=drop_frames, stop_event=self._stop)
+        self.inferred = FrameQueue(queue_size)
+        self._error = None
+        self._thread = None
+
+        # Counters
+        self.frames_inferred = 0
+        self.inference_time = 0.0
+
+    def start(self):
+        self.reader.start()
+        self._thread = threading.Thread(target=self._inference, name='inference', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.reader.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def __iter__(self):
+        while True:
+            try:
+                item = self.inferred.get()
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if item is END_OF_STREAM:
+                error = self._error or self.reader.error
+                if error is not None:
+                    raise error
+                return
+            yield item
+
+    def stats(self):
+        reader = self.reader
+        return {
+            'decoded': reader.frames_decoded,
+            'inferred': self.frames_inferred,
+            'dropped': reader.queue.dropped,
+            'decodeQueue': reader.queue.qsize(),
+            'inferenceQueue': self.inferred.qsize(),
+            'avgDecodeMs': round(reader.decode_time / max(1, reader.frames_decoded) * 1000, 1),
+            'avgInferenceMs': round(self.inference_time / max(1, self.frames_inferred) * 1000, 1),
+        }
+
+    def _inference(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = self.reader.get()
+                except queue.Empty:
+                    continue
+                if item is END_OF_STREAM:
+                    break
+                frame_index, frame = item
+                start = time.perf_counter()
+                output = self.infer(frame, frame_index) if self.pass_index else self.infer(frame)
+                self.inference_time += time.perf_counter() - start
+                self.frames_inferred += 1
+                self.inferred.put((frame_index, frame, output), self._stop)
+        except Exception as e:
+            self._error = e
+        self.inferred.put(END_OF_STREAM, self._stop)
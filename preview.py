@@ -0,0 +1,142 @@
+"""
+Sampled MJPEG preview of the annotated detector output
+Detectors run headless; nothing is drawn unless somebody is looking. While a
+client is connected to /preview.mjpg every Nth frame is annotated, JPEG
+encoded and pushed to it. GET /preview.jpg asks for the next frame once.
+Served with the standard library HTTP server on its own threads.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+PREVIEW_EVERY = 10  # Annotate every Nth frame while a client watches
+JPEG_QUALITY = 70
+SNAPSHOT_TIMEOUT = 5.0  # Seconds /preview.jpg waits for a frame
+BOUNDARY = 'frame'
+
+
+class PreviewServer:
+    """Latest annotated JPEG, served as an MJPEG stream and as snapshots"""
+
+    def __init__(self, port, host='0.0.0.0', every=PREVIEW_EVERY, quality=JPEG_QUALITY):
+        self.every = max(1, every)
+        self.quality = quality
+        self.frames_published = 0
+        self._jpeg = None
+        self._frame_id = 0
+        self._clients = 0
+        self._snapshot_waiters = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/preview.mjpg'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='preview', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wants(self, frame_index):
+        """Whether this frame should be annotated and published (cheap, no locking)"""
+        if self._snapshot_waiters:
+            return True
+        return self._clients > 0 and frame_index % self.every == 0
+
+    def publish(self, frame):
+        """Encode an annotated frame and wake the waiting clients"""
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        with self._cond:
+            self._jpeg = jpeg.tobytes()
+            self._frame_id += 1
+            self.frames_published += 1
+            self._cond.notify_all()
+
+    def _next_jpeg(self, last_id, timeout):
+        """(frame id, jpeg) newer than last_id, or (last_id, None) on timeout/stop"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._frame_id == last_id and not self._stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return last_id, None
+                self._cond.wait(remaining)
+            if self._stopped:
+                return last_id, None
+            return self._frame_id, self._jpeg
+
+    def _stream(self, handler):
+        handler.send_response(200)
+        handler.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.end_headers()
+        with self._cond:
+            self._clients += 1
+            last_id = self._frame_id
+        try:
+            while not self._stopped:
+                last_id, jpeg = self._next_jpeg(last_id, timeout=1.0)
+                if jpeg is None:
+                    continue
+                handler.wfile.write(f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                                    f'Content-Length: {len(jpeg)}\r\n\r\n'.encode('ascii'))
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b'\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._cond:
+                self._clients -= 1
+
+    def _snapshot(self, handler):
+        with self._cond:
+            self._snapshot_waiters += 1
+            last_id = self._frame_id
+        try:
+            _, jpeg = self._next_jpeg(last_id, SNAPSHOT_TIMEOUT)
+        finally:
+            with self._cond:
+                self._snapshot_waiters -= 1
+        if jpeg is None:
+            handler.send_error(503, 'No frame available')
+            return
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'image/jpeg')
+        handler.send_header('Content-Length', str(len(jpeg)))
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.end_headers()
+        handler.wfile.write(jpeg)
+
+    def _handler_class(self):
+        preview = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/preview.mjpg':
+                    preview._stream(self)
+                elif path == '/preview.jpg':
+                    preview._snapshot(self)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass  # Keep the detector's console quiet
+
+        return Handler
@@ -0,0 +1,137 @@
+"""
+Hot-path stage timing
+Each stage (decode, inference, zone logic, HTTP routes, ...) gets a
+fixed-bucket latency histogram, cheap enough to stay on in production.
+Snapshots are plain dicts, so the detector can push them to the API, and
+render_prometheus turns histograms into the Prometheus text format.
+
+Set ROUNDABOUT_PROFILING=0 to turn timing off; stage() then costs one
+attribute check.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds; an implicit +Inf bucket follows
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def profiling_enabled():
+    return os.environ.get('ROUNDABOUT_PROFILING', '1').lower() not in ('0', 'false', 'off', 'no')
+
+
+class Histogram:
+    """Latency histogram with fixed buckets"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {'buckets': list(self.buckets), 'counts': list(self.counts), 'count': self.count, 'sum': self.sum}
+
+
+class Profiler:
+    """Named stage histograms"""
+
+    def __init__(self, enabled=None):
+        self.enabled = profiling_enabled() if enabled is None else enabled
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, Histogram())
+        return histogram
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            self.histogram(stage).observe(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the with block as stage name"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).observe(time.perf_counter() - start)
+
+    def timed(self, name, func):
+        """func wrapped so every call is timed as stage name"""
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def snapshot(self):
+        """{stage: histogram snapshot}"""
+        with self._lock:
+            stages = list(self._stages.items())
+        return {name: histogram.snapshot() for name, histogram in stages}
+
+    def reset(self):
+        """Drop all recorded timings"""
+        with self._lock:
+            self._stages = {}
+
+    def summary(self):
+        """{stage: {'count', 'avgMs'}} for log lines"""
+        return {name: {'count': snap['count'], 'avgMs': round(snap['sum'] / max(1, snap['count']) * 1000, 2)}
+                for name, snap in self.snapshot().items()}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_string(labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def render_prometheus(name, help_text, series):
+    """Prometheus text for one histogram metric; series is a list of (labels, snapshot)"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, snap in series:
+        cumulative = 0
+        for bound, count in zip(list(snap['buckets']) + ['+Inf'], snap['counts']):
+            cumulative += count
+            le = bound if bound == '+Inf' else repr(float(bound))
+            lines.append(f'{name}_bucket{{{_label_string(dict(labels, le=le))}}} {cumulative}')
+        label_string = _label_string(labels)
+        lines.append(f'{name}_sum{{{label_string}}} {snap["sum"]}')
+        lines.append(f'{name}_count{{{label_string}}} {snap["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def valid_snapshot(snapshot):
+    """True for a well-formed {stage: histogram snapshot} dict (e.g. one pushed by a detector)"""
+    if not isinstance(snapshot, dict):
+        return False
+    for stage, snap in snapshot.items():
+        if not isinstance(stage, str) or not isinstance(snap, dict):
+            return False
+        buckets, counts = snap.get('buckets'), snap.get('counts')
+        if (not isinstance(buckets, list) or not isinstance(counts, list) or len(counts) != len(buckets) + 1
+                or not all(isinstance(value, (int, float)) for value in buckets + counts)
+                or not isinstance(snap.get('count'), (int, float)) or not isinstance(snap.get('sum'), (int, float))):
+            return False
+    return True
@@ -0,0 +1,105 @@
+"""
+Replay recorded detections through the roundabout logic
+Feeds a detection log (written with run_detection_with_api.py --record)
+through the same zone, entry/exit, penalty and API-sending code as the live
+detector, without decoding video or running YOLO. Use it to try new zone
+polygons or rules in seconds, or as a deterministic fixture.
+
+Usage: python replay_detections.py --log recording/ [--zones zones.json] [--no-api] [--realtime]
+"""
+import argparse
+import json
+import time
+
+from api_sender import ApiSender
+from car_codec import BinaryCodec
+from car_delta import DeltaEncoder
+from detection_log import DetectionLog
+from run_detection_with_api import (
+    API_URL_TEMPLATE, EXIT_THRESHOLD_FRAMES, MAX_SEND_RATE, ROUNDABOUT_ID, FrameAnalyzer, build_zone_polygons,
+    send_to_api
+)
+from zone_masks import config_polygons
+
+
+def parse_replay_args():
+    parser = argparse.ArgumentParser(description='Replay a detection log through the roundabout logic')
+    parser.add_argument('--log', required=True, help='Detection log directory')
+    parser.add_argument('--zones', help='JSON file with {"roundabout", "firstCarZone", "secondCarZone"} '
+                                        'polygons in pixels (default: the detection script polygons)')
+    parser.add_argument('--exit-threshold-frames', type=int, default=EXIT_THRESHOLD_FRAMES,
+                        help='Forget tracks not seen for this many frames')
+    parser.add_argument('--roundabout-id', default=ROUNDABOUT_ID, help='Roundabout the detections belong to')
+    parser.add_argument('--api-url', default=None,
+                        help='Roundabout update endpoint (default: local API for --roundabout-id)')
+    parser.add_argument('--no-api', action='store_true', help="Don't post to the API, only report the totals")
+    parser.add_argument('--api-mode', choices=['delta', 'full'], default='delta',
+                        help='Send only changed cars (delta) or the whole list every frame (full)')
+    parser.add_argument('--api-encoding', choices=['binary', 'json'], default='binary',
+                        help='Post payloads in the compact binary layout (falls back to JSON when the API '
+                             "doesn't take it) or as JSON")
+    parser.add_argument('--max-send-rate', type=float, default=MAX_SEND_RATE,
+                        help='Max posts per second to the API (0 = unlimited)')
+    parser.add_argument('--send-retries', type=int, default=3, help='Retries per payload before dropping it')
+    parser.add_argument('--realtime', action='store_true', help='Pace frames at the recorded fps')
+    args = parser.parse_args()
+    if args.api_url is None:
+        args.api_url = API_URL_TEMPLATE.format(roundabout_id=args.roundabout_id)
+    return args
+
+
+def replay(log, analyzer, sender=None, fps=None):
+    """Run every recorded frame through analyzer; returns (frames, last FrameResult)"""
+    frames = 0
+    result = None
+    start = time.perf_counter()
+    for frame_index, detections in log.frames():
+        result = analyzer.process(frame_index, detections, log.frame_shape, annotate=False)
+        if sender is not None:
+            send_to_api(sender, result.cars, result.stats)
+        frames += 1
+        if fps:
+            delay = start + frames / fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    return frames, result
+
+
+def main_replay():
+    args = parse_replay_args()
+    log = DetectionLog(args.log)
+
+    build_polygons = build_zone_polygons
+    if args.zones:
+        with open(args.zones) as f:
+            build_polygons = config_polygons(json.load(f))
+    analyzer = FrameAnalyzer(build_polygons, exit_threshold_frames=args.exit_threshold_frames, fps=log.fps)
+
+    sender = None
+    if not args.no_api:
+        encoder = DeltaEncoder() if args.api_mode == 'delta' else None
+        codec = BinaryCodec() if args.api_encoding == 'binary' else None
+        sender = ApiSender(args.api_url, max_rate=args.max_send_rate, max_retries=args.send_retries,
+                           encoder=encoder, codec=codec).start()
+
+    fps = log.fps if args.realtime else None
+    if args.realtime and not fps:
+        print("The log has no fps, replaying as fast as possible")
+
+    start = time.perf_counter()
+    try:
+        frames, result = replay(log, analyzer, sender, fps)
+    finally:
+        if sender is not None:
+            sender.stop()
+    elapsed = time.perf_counter() - start
+
+    print(f"Replayed {frames} frames in {elapsed:.2f}s ({frames / max(elapsed, 1e-9):.0f} frames/s)")
+    if result is not None:
+        print(f"Final stats: {result.stats}")
+    if sender is not None:
+        print(f"API sender stats: {sender.stats()}")
+
+
+if __name__ == "__main__":
+    main_replay()
@@ -0,0 +1,100 @@
+"""
+Cache of serialized GET responses
+Each resource has a version that writers bump when they change it (kept by
+the state backend when one is given, so all workers agree on it). Readers
+get the JSON bytes built for the current version, so unchanged data is
+serialized once no matter how many dashboards poll it, and clients holding
+the current ETag get a 304 without a body.
+"""
+import gzip
+import hashlib
+import threading
+
+from flask import Response
+
+GZIP_MIN_SIZE = 1024  # Smaller bodies aren't worth compressing
+GZIP_LEVEL = 5
+
+
+class CachedBody:
+    """Serialized JSON for one resource version"""
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+        self._gzipped = None
+
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, GZIP_LEVEL)
+        return self._gzipped
+
+
+class LocalVersions:
+    """Resource versions for a single process"""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, key):
+        return self._versions.get(key, 0)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+
+class ResponseCache:
+    """Versioned serialized responses keyed by resource name"""
+
+    def __init__(self, dumps, versions=None, use_gzip=True):
+        self.dumps = dumps
+        self.versions = versions or LocalVersions()
+        self.use_gzip = use_gzip
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, *keys):
+        """Mark resources as changed"""
+        self.versions.invalidate(*keys)
+
+    def get(self, key, build):
+        """Cached body for the current version of key, building it with build() if needed"""
+        version = self.versions.version(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = CachedBody(version, self.dumps(build()).encode('utf-8'))
+        # Only keep it if nobody changed the resource while we were building
+        if self.versions.version(key) == version:
+            with self._lock:
+                self._entries[key] = entry
+        return entry
+
+    def respond(self, request, key, build, status=200):
+        """Conditional, optionally gzipped JSON response for key"""
+        entry = self.get(key, build)
+        use_gzip = (self.use_gzip and len(entry.body) >= GZIP_MIN_SIZE
+                    and request.accept_encodings['gzip'] > 0)
+        etag = entry.etag + ('-gz' if use_gzip else '')
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        elif use_gzip:
+            response = Response(entry.gzipped(), status=status, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(entry.body, status=status, mimetype='application/json')
+
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
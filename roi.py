@@ -0,0 +1,100 @@
+"""
+Inference region of interest
+Only the area around the zone polygons matters, so inference can run on that
+crop instead of the whole frame. On wide-angle cameras the crop can also be
+split into overlapping tiles at native resolution, so distant cars are not
+shrunk below what the model can see. Tile boxes are moved back to frame
+coordinates and merged. Boxes cut by a tile seam are kept: a piece lying inside
+a whole box of the same vehicle is dropped, and pieces of a vehicle wider than
+the overlap, seen by no tile whole, are joined.
+"""
+import cv2
+import numpy as np
+
+ROI_MARGIN = 32  # Pixels kept around the zones so cars entering them are detected whole
+TILE_OVERLAP = 0.2  # Share of a tile overlapping its neighbour
+SEAM_MARGIN = 2  # Boxes this close to an inner tile edge may be cut off by it
+SEAM_CONTAINED = 0.7  # Share of a cut box inside a whole box for it to count as a piece of that box
+SEAM_JOIN_OVERLAP = 0.1  # Overlap (of the smaller box) at which two cut boxes are pieces of one vehicle
+
+
+def zone_roi(polygons, frame_shape, margin=ROI_MARGIN):
+    """(x0, y0, x1, y1) bounding all zone polygons plus margin, clipped to the frame"""
+    points = np.concatenate([np.asarray(polygon).reshape(-1, 2) for polygon in polygons])
+    height, width = frame_shape[:2]
+    x0, y0 = np.maximum(points.min(axis=0) - margin, 0).tolist()
+    x1, y1 = np.minimum(points.max(axis=0) + margin + 1, (width, height)).tolist()
+    return int(x0), int(y0), int(x1), int(y1)
+
+
+def tile_grid(roi, tile_size, overlap=TILE_OVERLAP):
+    """Tiles (x0, y0, x1, y1) of at most tile_size pixels covering roi"""
+    x0, y0, x1, y1 = roi
+
+    def starts(lo, hi):
+        if hi - lo <= tile_size:
+            return [lo]
+        step = max(1, int(tile_size * (1 - overlap)))
+        return list(range(lo, hi - tile_size, step)) + [hi - tile_size]
+
+    return [(x, y, min(x + tile_size, x1), min(y + tile_size, y1))
+            for y in starts(y0, y1) for x in starts(x0, x1)]
+
+
+def seam_cut(boxes, tile, roi, margin=SEAM_MARGIN):
+    """Mask of frame-coordinate boxes touching an edge the tile shares with another tile"""
+    tx0, ty0, tx1, ty1 = tile
+    x0, y0, x1, y1 = roi
+    cut = np.zeros(len(boxes), dtype=bool)
+    if tx0 > x0:
+        cut |= boxes[:, 0] <= tx0 + margin
+    if ty0 > y0:
+        cut |= boxes[:, 1] <= ty0 + margin
+    if tx1 < x1:
+        cut |= boxes[:, 2] >= tx1 - margin
+    if ty1 < y1:
+        cut |= boxes[:, 3] >= ty1 - margin
+    return cut
+
+
+def _area(boxes):
+    return np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+
+
+def _intersection(box, boxes):
+    """Intersection areas of one box with each of boxes"""
+    width = np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0])
+    height = np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1])
+    return np.maximum(width, 0) * np.maximum(height, 0)
+
+
+def join_seam_boxes(boxes, cut, contained=SEAM_CONTAINED, join_overlap=SEAM_JOIN_OVERLAP):
+    """Resolve (N, 6) boxes cut by tile seams: drop pieces of a box seen whole, join the other pieces"""
+    whole = boxes[~cut]
+    joined = []
+    for piece in boxes[cut]:
+        area = max(_area(piece[None])[0], 1e-6)
+        same = whole[whole[:, 5] == piece[5]]
+        if len(same) and (_intersection(piece, same) / area >= contained).any():
+            continue
+        for i, other in enumerate(joined):
+            smaller = min(area, _area(other[None])[0])
+            if other[5] == piece[5] and _intersection(piece, other[None])[0] >= join_overlap * smaller:
+                # One vehicle straddling the seam: the union of its pieces, at the best confidence
+                joined[i] = np.concatenate([np.minimum(other[:2], piece[:2]), np.maximum(other[2:4], piece[2:4]),
+                                            [max(other[4], piece[4]), other[5]]])
+                break
+        else:
+            joined.append(piece.copy())
+    return np.concatenate([whole, np.array(joined).reshape(-1, boxes.shape[1])])
+
+
+def merge_tile_boxes(boxes, iou):
+    """Class-wise NMS over (N, 6) x1, y1, x2, y2, conf, cls boxes from overlapping tiles"""
+    if len(boxes) == 0:
+        return boxes
+    # Shift each class far apart so a single NMS pass never merges different classes
+    shifted = boxes[:, :4] + boxes[:, 5:6] * (boxes[:, :4].max() + 1)
+    xywh = np.column_stack([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]])
+    keep = cv2.dnn.NMSBoxes(xywh.tolist(), boxes[:, 4].tolist(), 0.0, iou)
+    return boxes[np.asarray(keep, dtype=int).reshape(-1)]
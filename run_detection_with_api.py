@@ -3,10 +3,30 @@ Integration script to send car detection data to Flask API
 This script runs the roundabout detection and sends results to the API in real-time
 """
 import sys
-import requests
+import argparse
+from collections import OrderedDict, namedtuple
 from datetime import datetime
 import time
 
+import numpy as np
+
+from adaptive_stride import MAX_STRIDE, AdaptiveInference
+from api_sender import ApiSender
+from car_codec import BinaryCodec
+from car_delta import DeltaEncoder
+from detection_log import DetectionRecorder
+from inference_backend import BACKENDS, IMGSZ, MODEL_CACHE_DIR, WARMUP_RUNS, load_model
+from pipeline import FramePipeline, is_live_source
+from preview import PREVIEW_EVERY, PreviewServer
+from profiling import Profiler
+from roi import ROI_MARGIN, join_seam_boxes, merge_tile_boxes, seam_cut, tile_grid, zone_roi
+from tracking import create_tracker, update_tracker
+from trajectories import (
+    CIRCULATION, FLAG_SPEEDING, FLAG_U_TURN, FLAG_WRONG_WAY, PIXELS_PER_METER, SPEED_LIMIT_KMH, BehaviourDetector,
+    TrajectoryStore
+)
+from zone_masks import ZoneMask, ZoneMaskCache
+
 # Add the path to import from roundabout_detection
 sys.path.append('Car Detect2')
 
@@ -14,219 +34,468 @@ sys.path.append('Car Detect2')
 from roundabout_detection import *
 
 # API configuration
-API_URL = 'http://localhost:5000/api/roundabout/test-001/update'
+API_URL_TEMPLATE = 'http://localhost:5000/api/roundabout/{roundabout_id}/update'
 ROUNDABOUT_ID = 'test-001'
+MAX_SEND_RATE = 10.0  # Posts per second; newer frames coalesce over older ones
 
+EXIT_THRESHOLD_FRAMES = 30  # Forget tracks not seen for this many frames
+DEFAULT_FPS = 30.0  # Frame rate assumed when the source doesn't report one
 
-def send_to_api(cars_data, stats_data):
-    """Send detection data to the Flask API"""
-    try:
-        payload = {
-            'cars': cars_data,
-            'stats': stats_data
+# Stage timings (ROUNDABOUT_PROFILING=0 turns them off), pushed to the API with the stats
+PROFILER = Profiler()
+PROFILE_PUSH_INTERVAL = 5.0  # Seconds between timing snapshots sent to the API
+
+# Bit of each zone in the rasterized zone mask
+ZONE_ROUNDABOUT = 0
+ZONE_FIRST_CAR = 1
+ZONE_SECOND_CAR = 2
+
+# COCO class ids we count as vehicles
+VEHICLE_CLASS_IDS = np.array([i for i, name in enumerate(COCO_CLASSES) if name in VEHICLE_CLASSES])
+
+
+def parse_api_args():
+    """Parse the API options and hand the remaining ones to the detection parser"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--roundabout-id', default=ROUNDABOUT_ID, help='Roundabout the detections belong to')
+    parser.add_argument('--api-url', default=None,
+                        help='Roundabout update endpoint (default: local API for --roundabout-id)')
+    parser.add_argument('--max-send-rate', type=float, default=MAX_SEND_RATE,
+                        help='Max posts per second to the API (0 = unlimited)')
+    parser.add_argument('--send-retries', type=int, default=3, help='Retries per payload before dropping it')
+    parser.add_argument('--api-mode', choices=['delta', 'full'], default='delta',
+                        help='Send only changed cars (delta) or the whole list every frame (full)')
+    parser.add_argument('--api-encoding', choices=['binary', 'json'], default='binary',
+                        help='Post payloads in the compact binary layout (falls back to JSON when the API '
+                             "doesn't take it) or as JSON")
+    parser.add_argument('--queue-size', type=int, default=2, help='Frames buffered between pipeline stages')
+    parser.add_argument('--drop-policy', choices=['auto', 'drop', 'block'], default='auto',
+                        help='When inference falls behind: drop the oldest frames (live sources) '
+                             'or wait (files); auto picks from the source type')
+    parser.add_argument('--circulation', choices=sorted(CIRCULATION), default='counterclockwise',
+                        help='Driving direction around the roundabout as seen in the image')
+    parser.add_argument('--pixels-per-meter', type=float, default=PIXELS_PER_METER,
+                        help='Image scale near the roundabout, for speeds')
+    parser.add_argument('--speed-limit', type=float, default=SPEED_LIMIT_KMH, help='Speeding threshold in km/h')
+    parser.add_argument('--roi', action='store_true', help='Run inference only on the region around the zones')
+    parser.add_argument('--roi-margin', type=int, default=ROI_MARGIN, help='Pixels kept around the zones with --roi')
+    parser.add_argument('--tile-size', type=int, default=0,
+                        help='Split the --roi region into tiles of this size at native resolution (0 = no tiling)')
+    parser.add_argument('--target-fps', type=float, default=0,
+                        help='Run inference on every Nth frame when needed to hold this frame rate, '
+                             'extrapolating tracks in between (0 = infer every frame)')
+    parser.add_argument('--max-stride', type=int, default=MAX_STRIDE,
+                        help='Most frames one inference may cover with --target-fps')
+    parser.add_argument('--preview-port', type=int,
+                        help='Serve a sampled annotated MJPEG preview on this port (/preview.mjpg, /preview.jpg)')
+    parser.add_argument('--preview-every', type=int, default=PREVIEW_EVERY,
+                        help='Annotate every Nth frame for the preview while a client watches')
+    parser.add_argument('--record', metavar='DIR',
+                        help='Also write the raw detections to a detection log for replay_detections.py')
+    parser.add_argument('--backend', choices=BACKENDS, default='torch',
+                        help='Run the model with PyTorch or export it (once, cached) to ONNX Runtime or OpenVINO')
+    parser.add_argument('--imgsz', type=int, default=IMGSZ,
+                        help='Inference input size; exported models are built for it')
+    parser.add_argument('--int8', action='store_true', help='INT8-quantize the OpenVINO export')
+    parser.add_argument('--export-cache', default=MODEL_CACHE_DIR, help='Directory of cached exported models')
+    parser.add_argument('--warmup', type=int, default=WARMUP_RUNS,
+                        help='Blank-frame inference runs before the first live frame (0 = none)')
+    api_args, remaining = parser.parse_known_args()
+    if api_args.int8 and api_args.backend != 'openvino':
+        parser.error('--int8 needs --backend openvino')
+
+    sys.argv = sys.argv[:1] + remaining
+    args = parse_args()
+    for key, value in vars(api_args).items():
+        setattr(args, key, value)
+    if args.api_url is None:
+        args.api_url = API_URL_TEMPLATE.format(roundabout_id=args.roundabout_id)
+    return args
+
+
+def build_zone_polygons(frame_shape):
+    """Zone polygons in zone bit order"""
+    return [
+        build_roundabout_polygon(frame_shape),
+        build_first_car_zone_polygon(frame_shape),
+        build_second_car_zone_polygon(frame_shape),
+    ]
+
+
+def extract_detections(results):
+    """Vehicle detections of a frame as an (N, 7) float array
+
+    Columns: track_id (-1 when untracked), class id, confidence, x1, y1, x2, y2.
+    """
+    arrays = []
+    for result in results:
+        boxes = result.boxes
+        if boxes is None or boxes.cls is None or len(boxes) == 0:
+            continue
+        boxes = boxes.cpu().numpy()
+        n = len(boxes.cls)
+        track_ids = boxes.id if boxes.id is not None else np.full(n, -1.0)
+        conf = boxes.conf if boxes.conf is not None else np.zeros(n)
+        arrays.append(np.column_stack([track_ids, boxes.cls, conf, boxes.xyxy]))
+    
+    if not arrays:
+        return np.empty((0, 7))
+    detections = np.concatenate(arrays)
+    return detections[np.isin(detections[:, 1].astype(int), VEHICLE_CLASS_IDS)]
+
+
+class RoiInference:
+    """Tracking on the zone region of the frame only, optionally tiled at native resolution
+
+    Returns extract_detections() arrays in full-frame coordinates.
+    """
+
+    def __init__(self, model, conf, iou, build_polygons=build_zone_polygons, margin=ROI_MARGIN, tile_size=0,
+                 imgsz=IMGSZ):
+        self.model = model
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        self.build_polygons = build_polygons
+        self.margin = margin
+        self.tile_size = tile_size
+        # Tiles come from model.predict, so they are tracked here rather than by model.track
+        self.tracker = create_tracker() if tile_size else None
+        self._regions = {}  # Frame shape -> (roi, tiles)
+    
+    def region(self, frame_shape):
+        key = tuple(frame_shape[:2])
+        region = self._regions.get(key)
+        if region is None:
+            roi = zone_roi(self.build_polygons(frame_shape), frame_shape, self.margin)
+            tiles = tile_grid(roi, self.tile_size) if self.tile_size else []
+            region = self._regions[key] = (roi, tiles)
+            x0, y0, x1, y1 = roi
+            share = (x1 - x0) * (y1 - y0) / (key[0] * key[1])
+            print(f"Inference region {roi}: {share:.0%} of the frame"
+                  + (f" in {len(tiles)} tiles" if tiles else ""))
+        return region
+    
+    def __call__(self, frame):
+        roi, tiles = self.region(frame.shape)
+        if not tiles:
+            x0, y0, x1, y1 = roi
+            results = self.model.track(source=frame[y0:y1, x0:x1], conf=self.conf, iou=self.iou,
+                                       imgsz=self.imgsz, persist=True, verbose=False)
+            detections = extract_detections(results)
+            detections[:, 3:7] += (x0, y0, x0, y0)
+            return detections
+        
+        crops = [frame[ty0:ty1, tx0:tx1] for tx0, ty0, tx1, ty1 in tiles]
+        results = self.model.predict(crops, conf=self.conf, iou=self.iou, imgsz=self.tile_size,
+                                     classes=VEHICLE_CLASS_IDS.tolist(), verbose=False)
+        boxes, cuts = [], []
+        for tile, result in zip(tiles, results):
+            data = np.array(result.boxes.cpu().numpy().data[:, :6], dtype=float)
+            data[:, :4] += (tile[0], tile[1], tile[0], tile[1])
+            boxes.append(data)
+            cuts.append(seam_cut(data, tile, roi))
+        merged = merge_tile_boxes(join_seam_boxes(np.concatenate(boxes), np.concatenate(cuts)), self.iou)
+        return update_tracker(self.tracker, merged, frame)
+
+
+def send_to_api(sender, cars_data, stats_data, profile=None):
+    """Queue detection data for the background API sender (never blocks)"""
+    payload = {
+        'cars': cars_data,
+        'stats': stats_data
+    }
+    if profile is not None:
+        payload['profile'] = profile
+    sender.submit(payload)
+
+
+# Outcome of one frame: cars for the API, stats, HUD counts and boxes to draw
+FrameResult = namedtuple('FrameResult', [
+    'frame_index', 'cars', 'stats', 'vehicle_counts', 'roundabout_counts', 'penalty_count', 'boxes'
+])
+
+
+class FrameAnalyzer:
+    """Zone, entry/exit and penalty logic for one roundabout, one frame at a time"""
+
+    def __init__(self, build_polygons=build_zone_polygons, exit_threshold_frames=EXIT_THRESHOLD_FRAMES,
+                 fps=DEFAULT_FPS, behaviours=None):
+        # Zone polygons rasterized once per frame shape
+        self.zone_masks = ZoneMaskCache(build_polygons)
+        self.exit_threshold_frames = exit_threshold_frames
+        self.fps = fps or DEFAULT_FPS
+        
+        # For tracking
+        self.total_vehicles_entered = 0
+        self.total_vehicles_exited = 0
+        self.total_penalties = 0
+        self.total_wrong_way = 0
+        self.total_u_turns = 0
+        self.total_speeding = 0
+        
+        # Track state of each car: {track_id: was_in_roundabout (bool)}
+        self.track_states = {}
+        
+        # Track last seen frame for cleanup, least recently seen first
+        self.active_tracks = OrderedDict()
+        
+        # Recent positions of every track for speed, heading and U-turn checks
+        self.trajectories = TrajectoryStore()
+        self.behaviours = behaviours or BehaviourDetector()
+    
+    def process(self, frame_index, detections, frame_shape, annotate=True):
+        """Run the per-frame logic on an extract_detections() array
+
+        Boxes and labels for drawing are only built when annotate is set.
+        """
+        zone_mask = self.zone_masks.get(frame_shape)
+        track_states = self.track_states
+        active_tracks = self.active_tracks
+        
+        # Track vehicles and zones
+        vehicle_counts = {name: 0 for name in VEHICLE_CLASSES}
+        roundabout_counts = {name: 0 for name in VEHICLE_CLASSES}
+        first_car_zone_counts = {name: 0 for name in VEHICLE_CLASSES}
+        second_car_zone_counts = {name: 0 for name in VEHICLE_CLASSES}
+        penalty_count = 0
+        
+        # Cars data to send to API
+        cars_in_roundabout = []
+        boxes = []
+        
+        # Zone membership of every detection in one lookup
+        with PROFILER.stage('zones'):
+            boxes_xyxy = detections[:, 3:7].astype(int)
+            centers = np.column_stack([(boxes_xyxy[:, 0] + boxes_xyxy[:, 2]) // 2,
+                                       (boxes_xyxy[:, 1] + boxes_xyxy[:, 3]) // 2])
+            zone_bits = zone_mask.lookup(centers)
+        in_roundabout_flags = ZoneMask.has(zone_bits, ZONE_ROUNDABOUT).tolist()
+        in_first_car_zone_flags = ZoneMask.has(zone_bits, ZONE_FIRST_CAR).tolist()
+        in_second_car_zone_flags = ZoneMask.has(zone_bits, ZONE_SECOND_CAR).tolist()
+        
+        for i, (track_id, cls_id, conf) in enumerate(detections[:, :3].tolist()):
+            track_id = int(track_id) if track_id >= 0 else None
+            cls_name = COCO_CLASSES[int(cls_id)]
+            
+            # Box coordinates
+            x1, y1, x2, y2 = boxes_xyxy[i].tolist()
+            cx, cy = centers[i].tolist()
+            
+            # Update counts
+            vehicle_counts[cls_name] += 1
+            
+            in_roundabout = in_roundabout_flags[i]
+            in_first_car_zone = in_first_car_zone_flags[i]
+            in_second_car_zone = in_second_car_zone_flags[i]
+            
+            # ENTRY / EXIT LOGIC based on Roundabout Zone
+            if track_id is not None:
+                active_tracks[track_id] = frame_index
+                active_tracks.move_to_end(track_id)
+                
+                was_in_roundabout = track_states.get(track_id, False)
+                
+                if in_roundabout and not was_in_roundabout:
+                    # Transition: Outside -> Inside = ENTRY
+                    self.total_vehicles_entered += 1
+                    track_states[track_id] = True
+                elif not in_roundabout and was_in_roundabout:
+                    # Transition: Inside -> Outside = EXIT
+                    self.total_vehicles_exited += 1
+                    track_states[track_id] = False
+                elif in_roundabout:
+                    # Keep state as True if already inside
+                    track_states[track_id] = True
+            
+            if in_roundabout:
+                roundabout_counts[cls_name] += 1
+            
+            if in_first_car_zone:
+                first_car_zone_counts[cls_name] += 1
+            
+            if in_second_car_zone:
+                second_car_zone_counts[cls_name] += 1
+            
+            # Penalty detection
+            is_penalty = False
+            if in_second_car_zone and sum(first_car_zone_counts.values()) > 0:
+                is_penalty = True
+                penalty_count += 1
+            
+            # If car is in roundabout, add to API data
+            if in_roundabout:
+                car_data = {
+                    'id': f'car-{track_id}' if track_id is not None else f'car-{frame_index}-{cx}-{cy}',
+                    'type': cls_name,
+                    'confidence': round(conf, 2),
+                    'position': {'x': cx, 'y': cy},
+                    'inFirstZone': in_first_car_zone,
+                    'inSecondZone': in_second_car_zone,
+                    'isPenalty': is_penalty,
+                    'timestamp': datetime.now().isoformat()
+                }
+                cars_in_roundabout.append(car_data)
+            
+            if not annotate:
+                continue
+            
+            # Box color and label for drawing
+            if is_penalty:
+                color = (0, 0, 255)  # Red
+                label = f"PENALTY {cls_name} {track_id}"
+            elif in_first_car_zone:
+                color = (0, 255, 0)  # Green
+                label = f"{cls_name} {track_id}"
+            elif in_second_car_zone:
+                color = (0, 255, 255)  # Yellow
+                label = f"{cls_name} {track_id}"
+            elif in_roundabout:
+                color = (255, 255, 0)  # Cyan
+                label = f"{cls_name} {track_id}"
+            else:
+                color = (255, 0, 0)  # Blue
+                label = f"{cls_name} {track_id}"
+            boxes.append((x1, y1, x2, y2, color, label))
+        
+        # Risky behaviour of all tracked cars at once
+        tracked = detections[:, 0] >= 0
+        if tracked.any():
+            start = time.perf_counter()
+            trajectories = self.trajectories
+            slots = trajectories.update(detections[tracked, 0].astype(int), centers[tracked],
+                                        frame_index / self.fps)
+            center = zone_mask.centroids[ZONE_ROUNDABOUT] or (frame_shape[1] / 2, frame_shape[0] / 2)
+            behaviour = self.behaviours.evaluate(trajectories, slots, center,
+                                                 ZoneMask.has(zone_bits[tracked], ZONE_ROUNDABOUT))
+            self.total_wrong_way += trajectories.mark(slots, FLAG_WRONG_WAY, behaviour.wrong_way)
+            self.total_u_turns += trajectories.mark(slots, FLAG_U_TURN, behaviour.u_turn)
+            self.total_speeding += trajectories.mark(slots, FLAG_SPEEDING, behaviour.speeding)
+            PROFILER.observe('behaviour', time.perf_counter() - start)
+        
+        # Cleanup old tracks; only the expired ones at the front are visited
+        while active_tracks:
+            track_id, last_seen = next(iter(active_tracks.items()))
+            if frame_index - last_seen <= self.exit_threshold_frames:
+                break
+            del active_tracks[track_id]
+            if track_id in track_states:
+                del track_states[track_id]
+            self.trajectories.remove(track_id)
+        
+        total_in_roundabout = sum(roundabout_counts.values())
+        self.total_penalties += penalty_count
+        
+        stats_data = {
+            'vehicleEntry': self.total_vehicles_entered,
+            'vehicleExit': self.total_vehicles_exited,
+            'laneUtilization': total_in_roundabout, # Sending raw count as requested
+            'congestionLevel': 'Critical' if total_in_roundabout > 8 else 'High' if total_in_roundabout > 5 else 'Moderate' if total_in_roundabout > 2 else 'Low',
+            'penaltyCount': self.total_penalties,
+            'wrongWay': self.total_wrong_way,
+            'illegalUTurn': self.total_u_turns,
+            'speeding': self.total_speeding
         }
-        # Increased timeout to 5 seconds to prevent timeouts
-        response = requests.post(API_URL, json=payload, timeout=5)
-        if response.status_code == 200:
-            return True
-        else:
-            print(f"API Error: {response.status_code}")
-            return False
-    except requests.exceptions.RequestException as e:
-        # print(f"Failed to send to API: {e}") # Suppress frequent errors
-        return False
+        
+        return FrameResult(frame_index, cars_in_roundabout, stats_data,
+                           vehicle_counts, roundabout_counts, penalty_count, boxes)
+
+
+def draw_frame_result(frame, result):
+    """Draw the boxes and HUD of a FrameResult onto the frame"""
+    for x1, y1, x2, y2, color, label in result.boxes:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+        cv2.rectangle(frame, (x1, y1 - th - 4), (x1 + tw, y1), color, -1)
+        cv2.putText(frame, label, (x1, y1 - 2), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2, cv2.LINE_AA)
+    
+    draw_hud(frame, result.vehicle_counts, result.roundabout_counts, result.penalty_count)
 
 
 def main_with_api():
     """Modified main function that sends data to API"""
-    args = parse_args()
+    args = parse_api_args()
+    print(f"Sending data to: {args.api_url} (override with --api-url or --roundabout-id)")
+    print()
     
-    # Load YOLO model
-    model = YOLO(args.model)
+    # Load YOLO model; tiles are batched at their own size, so a tiled export takes any batch
+    imgsz = args.tile_size or args.imgsz
+    model = load_model(args.model, args.backend, imgsz, int8=args.int8, dynamic=bool(args.tile_size),
+                       cache_dir=args.export_cache, warmup_runs=args.warmup)
     
     cap = open_video_capture(args.source)
     
-    # Build polygons
-    roundabout_polygon = None
-    first_car_zone_polygon = None
-    second_car_zone_polygon = None
+    # HTTP runs on its own thread so API hiccups never stall detection
+    encoder = DeltaEncoder() if args.api_mode == 'delta' else None
+    codec = BinaryCodec() if args.api_encoding == 'binary' else None
+    sender = ApiSender(args.api_url, max_rate=args.max_send_rate, max_retries=args.send_retries,
+                       encoder=encoder, codec=codec, profiler=PROFILER).start()
+    
+    behaviours = BehaviourDetector(args.circulation, args.pixels_per_meter, args.speed_limit)
+    analyzer = FrameAnalyzer(fps=cap.get(cv2.CAP_PROP_FPS), behaviours=behaviours)
+    
+    def infer(frame):
+        # Run YOLO tracking (persist=True for tracking)
+        results = model.track(source=frame, conf=args.conf, iou=args.iou, imgsz=args.imgsz, persist=True,
+                              verbose=False)
+        return extract_detections(results)
+    
+    if args.roi or args.tile_size:
+        infer = RoiInference(model, args.conf, args.iou, margin=args.roi_margin, tile_size=args.tile_size,
+                             imgsz=args.imgsz)
+    # Timed here so frames the adaptive stride extrapolates don't count as inference
+    infer = PROFILER.timed('inference', infer)
     
-    # For tracking
-    frame_count = 0
-    total_vehicles_entered = 0
-    total_vehicles_exited = 0
-    total_penalties = 0
+    # Under load, skip inference on some frames and move the tracks along instead
+    adaptive = None
+    if args.target_fps > 0:
+        infer = adaptive = AdaptiveInference(infer, args.target_fps, args.max_stride)
     
-    # Track state of each car: {track_id: was_in_roundabout (bool)}
-    track_states = {}
+    # Decode and inference run on their own threads; post-processing stays here
+    # (imshow needs the main thread). Live sources drop stale frames to stay real-time.
+    if args.drop_policy == 'auto':
+        drop_frames = is_live_source(args.source)
+    else:
+        drop_frames = args.drop_policy == 'drop'
+    pipeline = FramePipeline(PROFILER.timed('decode', cap.read), infer, queue_size=args.queue_size,
+                             drop_frames=drop_frames, pass_index=adaptive is not None).start()
     
-    # Track last seen frame for cleanup
-    active_tracks = {}
-    EXIT_THRESHOLD_FRAMES = 30  # Cleanup threshold
+    # Frames are only annotated when something shows them; headless runs skip drawing entirely
+    preview = None
+    if args.preview_port:
+        preview = PreviewServer(args.preview_port, every=args.preview_every).start()
+        print(f"Preview at {preview.url}")
     
+    recorder = None
+    if args.record:
+        recorder = DetectionRecorder(args.record, source=str(args.source), fps=cap.get(cv2.CAP_PROP_FPS) or None)
+    
+    next_profile_push = time.monotonic()
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            if roundabout_polygon is None:
-                roundabout_polygon = build_roundabout_polygon(frame.shape)
-                first_car_zone_polygon = build_first_car_zone_polygon(frame.shape)
-                second_car_zone_polygon = build_second_car_zone_polygon(frame.shape)
+        for frame_index, frame, detections in pipeline:
+            if recorder is not None:
+                recorder.write(frame_index, detections, frame.shape)
             
-            # Run YOLO tracking (persist=True for tracking)
-            results = model.track(source=frame, conf=args.conf, iou=args.iou, persist=True, verbose=False)
+            publish = preview is not None and preview.wants(frame_index)
+            annotate = args.show or publish
+            with PROFILER.stage('analyze'):
+                result = analyzer.process(frame_index, detections, frame.shape, annotate=annotate)
             
-            # Track vehicles and zones
-            vehicle_counts = {name: 0 for name in VEHICLE_CLASSES}
-            roundabout_counts = {name: 0 for name in VEHICLE_CLASSES}
-            first_car_zone_counts = {name: 0 for name in VEHICLE_CLASSES}
-            second_car_zone_counts = {name: 0 for name in VEHICLE_CLASSES}
-            penalty_count = 0
+            # Stage timings go along every few seconds; the sender attaches the newest to whatever it posts next
+            profile = None
+            now = time.monotonic()
+            if PROFILER.enabled and now >= next_profile_push:
+                profile = PROFILER.snapshot()
+                next_profile_push = now + PROFILE_PUSH_INTERVAL
             
-            # Cars data to send to API
-            cars_in_roundabout = []
+            # Send to API every frame (the sender times its HTTP posts as the 'send' stage)
+            send_to_api(sender, result.cars, result.stats, profile)
             
-            current_frame_track_ids = set()
-            
-            for result in results:
-                boxes = result.boxes
-                if boxes is None:
-                    continue
-                
-                for box in boxes:
-                    cls_id = int(box.cls[0].item()) if box.cls is not None else None
-                    conf = float(box.conf[0].item()) if box.conf is not None else 0.0
-                    
-                    # Get track ID if available
-                    track_id = int(box.id[0].item()) if box.id is not None else None
-                    
-                    if cls_id is None or cls_id < 0 or cls_id >= len(COCO_CLASSES):
-                        continue
-                    
-                    cls_name = COCO_CLASSES[cls_id]
-                    if cls_name not in VEHICLE_CLASSES:
-                        continue
-                    
-                    # Box coordinates
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
-                    
-                    # Update counts
-                    vehicle_counts[cls_name] += 1
-                    
-                    # Center point
-                    cx = (x1 + x2) // 2
-                    cy = (y1 + y2) // 2
-                    
-                    in_roundabout = is_point_in_roundabout((cx, cy), roundabout_polygon)
-                    in_first_car_zone = is_point_in_first_car_zone((cx, cy), first_car_zone_polygon)
-                    in_second_car_zone = is_point_in_second_car_zone((cx, cy), second_car_zone_polygon)
-                    
-                    # ENTRY / EXIT LOGIC based on Roundabout Zone
-                    if track_id is not None:
-                        current_frame_track_ids.add(track_id)
-                        active_tracks[track_id] = frame_count
-                        
-                        was_in_roundabout = track_states.get(track_id, False)
-                        
-                        if in_roundabout and not was_in_roundabout:
-                            # Transition: Outside -> Inside = ENTRY
-                            total_vehicles_entered += 1
-                            track_states[track_id] = True
-                        elif not in_roundabout and was_in_roundabout:
-                            # Transition: Inside -> Outside = EXIT
-                            total_vehicles_exited += 1
-                            track_states[track_id] = False
-                        elif in_roundabout:
-                            # Keep state as True if already inside
-                            track_states[track_id] = True
-                    
-                    if in_roundabout:
-                        roundabout_counts[cls_name] += 1
-                    
-                    if in_first_car_zone:
-                        first_car_zone_counts[cls_name] += 1
-                    
-                    if in_second_car_zone:
-                        second_car_zone_counts[cls_name] += 1
-                    
-                    # Penalty detection
-                    is_penalty = False
-                    if in_second_car_zone and sum(first_car_zone_counts.values()) > 0:
-                        is_penalty = True
-                        penalty_count += 1
-                    
-                    # If car is in roundabout, add to API data
-                    if in_roundabout:
-                        car_data = {
-                            'id': f'car-{track_id}' if track_id is not None else f'car-{frame_count}-{cx}-{cy}',
-                            'type': cls_name,
-                            'confidence': round(conf, 2),
-                            'position': {'x': cx, 'y': cy},
-                            'inFirstZone': in_first_car_zone,
-                            'inSecondZone': in_second_car_zone,
-                            'isPenalty': is_penalty,
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        cars_in_roundabout.append(car_data)
-                    
-                    # Draw on frame
-                    if is_penalty:
-                        color = (0, 0, 255)  # Red
-                        label = f"PENALTY {cls_name} {track_id}"
-                    elif in_first_car_zone:
-                        color = (0, 255, 0)  # Green
-                        label = f"{cls_name} {track_id}"
-                    elif in_second_car_zone:
-                        color = (0, 255, 255)  # Yellow
-                        label = f"{cls_name} {track_id}"
-                    elif in_roundabout:
-                        color = (255, 255, 0)  # Cyan
-                        label = f"{cls_name} {track_id}"
-                    else:
-                        color = (255, 0, 0)  # Blue
-                        label = f"{cls_name} {track_id}"
-                    
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
-                    cv2.rectangle(frame, (x1, y1 - th - 4), (x1 + tw, y1), color, -1)
-                    cv2.putText(frame, label, (x1, y1 - 2), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2, cv2.LINE_AA)
-            
-            # Cleanup old tracks
-            ids_to_remove = []
-            for track_id, last_seen in active_tracks.items():
-                if frame_count - last_seen > EXIT_THRESHOLD_FRAMES:
-                    ids_to_remove.append(track_id)
-            
-            for track_id in ids_to_remove:
-                del active_tracks[track_id]
-                if track_id in track_states:
-                    del track_states[track_id]
-            
-            # Send to API every frame
-            total_in_roundabout = sum(roundabout_counts.values())
-            total_penalties += penalty_count
-            
-            stats_data = {
-                'vehicleEntry': total_vehicles_entered,
-                'vehicleExit': total_vehicles_exited,
-                'laneUtilization': total_in_roundabout, # Sending raw count as requested
-                'congestionLevel': 'Critical' if total_in_roundabout > 8 else 'High' if total_in_roundabout > 5 else 'Moderate' if total_in_roundabout > 2 else 'Low',
-                'penaltyCount': total_penalties,
-                'wrongWay': 0,
-                'illegalUTurn': 0,
-                'speeding': 0
-            }
-            
-            # Send to API
-            send_to_api(cars_in_roundabout, stats_data)
-            
-            # Draw HUD
-            draw_hud(frame, vehicle_counts, roundabout_counts, penalty_count)
+            if annotate:
+                with PROFILER.stage('draw'):
+                    draw_frame_result(frame, result)
+            if publish:
+                preview.publish(frame)
             
             # Show frame
             if args.show:
@@ -235,14 +504,24 @@ def main_with_api():
                     break
     
     finally:
+        pipeline.stop()
         cap.release()
+        sender.stop()
+        if preview is not None:
+            preview.stop()
+        if recorder is not None:
+            recorder.close()
+            print(f"Recorded {recorder.frames} frames to {args.record}")
+        print(f"Pipeline stats: {pipeline.stats()}")
+        if adaptive is not None:
+            print(f"Adaptive inference: {adaptive.stats()}")
+        print(f"API sender stats: {sender.stats()}")
+        if PROFILER.enabled:
+            print(f"Stage timings: {PROFILER.summary()}")
         if args.show:
             cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
     print("Starting roundabout detection with API integration...")
-    print(f"Sending data to: {API_URL}")
-    print("Make sure the Flask API is running on http://localhost:5000")
-    print()
     main_with_api()
@@ -0,0 +1,335 @@
+"""
+State backends for the API
+MemoryBackend keeps everything in this process (the default). SqliteBackend
+keeps it in a SQLite database in WAL mode, so several WSGI worker processes
+serve the same data, see each other's changes and agree on which one runs
+the background updater.
+
+A backend provides:
+    table(name, records, indexes, range_index)  indexed record table
+    get_cars(id) / update_cars(id)              per-roundabout CarState
+    version(key) / invalidate(*keys)            change tracking for caches
+    on_change(listener)                         called with changed keys
+    acquire_lease(name, ttl)                    single-runner election
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+from state_store import IndexedTable
+
+# Cars currently in a roundabout: cars keyed by car id, their summary statistics
+# (computed once per ingest) and the last applied update sequence (None until a
+# sequenced update arrives). A CarState is immutable and replaced in whole, so
+# readers always see cars, summary and seq from the same update.
+CarState = namedtuple('CarState', ['cars', 'summary', 'seq'])
+EMPTY_CAR_STATE = CarState({}, None, None)
+
+PRUNE_EVERY = 1000  # Old change rows are deleted each time this many changes were logged
+
+
+class CarUpdate:
+    """Handle for a read-modify-write of one roundabout's car state"""
+
+    def __init__(self, state):
+        self.state = state
+        self.changed = False
+
+    def set(self, state):
+        self.state = state
+        self.changed = True
+
+
+class MemoryBackend:
+    """Everything in process memory; readers never lock"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._cars = {}
+        self._locks = {}
+        self._versions = {}
+        self._versions_lock = threading.Lock()
+        self._listeners = []
+
+    def table(self, name, records=(), indexes=(), range_index=None):
+        return IndexedTable(records, indexes=indexes, range_index=range_index)
+
+    def get_cars(self, roundabout_id):
+        return self._cars.get(roundabout_id, EMPTY_CAR_STATE)
+
+    @contextmanager
+    def update_cars(self, roundabout_id):
+        with self._locks.setdefault(roundabout_id, threading.Lock()):
+            update = CarUpdate(self.get_cars(roundabout_id))
+            yield update
+            if update.changed:
+                self._cars[roundabout_id] = update.state
+
+    def version(self, key):
+        return self._versions.get(key, 0)
+
+    def invalidate(self, *keys):
+        with self._versions_lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+        for listener in self._listeners:
+            listener(keys)
+
+    def on_change(self, listener):
+        self._listeners.append(listener)
+
+    def acquire_lease(self, name, ttl):
+        return True
+
+
+class SqliteTable:
+    """IndexedTable work-alike stored in a SQLite table
+
+    Indexed fields live in their own indexed columns next to the JSON record,
+    so filters and lookups are answered by SQLite indexes.
+    """
+
+    def __init__(self, backend, name, records=(), indexes=(), range_index=None):
+        self.backend = backend
+        self.table_name = f't_{name}'
+        self.index_fields = tuple(indexes)
+        self.range_field = range_index
+        self.columns = {field: f'c{i}' for i, field in enumerate(self.index_fields + ((range_index,) if range_index else ()))}
+
+        column_defs = ''.join(f', {column}' for column in self.columns.values())
+        with backend.transaction() as conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self.table_name} '
+                         f'(id TEXT PRIMARY KEY, pos INTEGER, data TEXT{column_defs})')
+            for column in self.columns.values():
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {self.table_name}_{column} ON {self.table_name} ({column})')
+            # Seed once; other workers find the rows already there
+            for record in records:
+                self._insert(conn, record, replace=False)
+
+    def __len__(self):
+        return self.backend.connection().execute(f'SELECT COUNT(*) FROM {self.table_name}').fetchone()[0]
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __contains__(self, record_id):
+        return self.get(record_id) is not None
+
+    def get(self, record_id):
+        row = self.backend.connection().execute(
+            f'SELECT data FROM {self.table_name} WHERE id = ?', (record_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self):
+        rows = self.backend.connection().execute(f'SELECT data FROM {self.table_name} ORDER BY pos')
+        return [json.loads(row[0]) for row in rows]
+
+    def put(self, record):
+        return self.put_many([record])[0]
+
+    def put_many(self, records):
+        with self.backend.transaction() as conn:
+            for record in records:
+                self._insert(conn, record, replace=True)
+        return list(records)
+
+    def update(self, record_id, changes):
+        return self.update_many({record_id: changes}).get(record_id)
+
+    def update_many(self, changes_by_id):
+        updated = {}
+        with self.backend.transaction() as conn:
+            for record_id, changes in changes_by_id.items():
+                row = conn.execute(f'SELECT data FROM {self.table_name} WHERE id = ?', (record_id,)).fetchone()
+                if row is None:
+                    continue
+                record = dict(json.loads(row[0]), **changes)
+                self._insert(conn, record, replace=True)
+                updated[record_id] = record
+        return updated
+
+    def remove(self, record_id):
+        record = self.get(record_id)
+        with self.backend.transaction() as conn:
+            conn.execute(f'DELETE FROM {self.table_name} WHERE id = ?', (record_id,))
+        return record
+
+    def query(self, filters=None, min_value=None, max_value=None, offset=0, limit=None):
+        """Same contract as IndexedTable.query: (page, total) in insertion order"""
+        where = []
+        params = []
+        for field, value in (filters or {}).items():
+            if field not in self.index_fields:
+                raise KeyError(f'No index on {field}')
+            where.append(f'{self.columns[field]} = ?')
+            params.append(value)
+        if min_value is not None or max_value is not None:
+            if self.range_field is None:
+                raise KeyError('No range index')
+            if min_value is not None:
+                where.append(f'{self.columns[self.range_field]} >= ?')
+                params.append(min_value)
+            if max_value is not None:
+                where.append(f'{self.columns[self.range_field]} <= ?')
+                params.append(max_value)
+        clause = f" WHERE {' AND '.join(where)}" if where else ''
+
+        conn = self.backend.connection()
+        total = conn.execute(f'SELECT COUNT(*) FROM {self.table_name}{clause}', params).fetchone()[0]
+        rows = conn.execute(f'SELECT data FROM {self.table_name}{clause} ORDER BY pos LIMIT ? OFFSET ?',
+                            params + [-1 if limit is None else limit, offset])
+        return [json.loads(row[0]) for row in rows], total
+
+    def _insert(self, conn, record, replace):
+        columns = ''.join(f', {column}' for column in self.columns.values())
+        placeholders = ', ?' * len(self.columns)
+        values = [record.get(field) for field in self.columns]
+        if replace:
+            updates = ''.join(f', {column} = excluded.{column}' for column in self.columns.values())
+            conflict = f'DO UPDATE SET data = excluded.data{updates}'
+        else:
+            conflict = 'DO NOTHING'
+        conn.execute(
+            f'INSERT INTO {self.table_name} (id, pos, data{columns}) '
+            f'VALUES (?, (SELECT IFNULL(MAX(pos), 0) + 1 FROM {self.table_name}), ?{placeholders}) '
+            f'ON CONFLICT(id) {conflict}',
+            [record['id'], json.dumps(record)] + values)
+
+
+class SqliteBackend:
+    """State shared between processes through one SQLite database in WAL mode"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, poll_interval=0.1, keep_changes=10000):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.keep_changes = keep_changes
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._local = threading.local()
+        self._listeners = []
+        self._watcher = None
+
+        with self.transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS car_states '
+                         '(roundabout_id TEXT PRIMARY KEY, seq INTEGER, cars TEXT, summary TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS versions (key TEXT PRIMARY KEY, version INTEGER)')
+            conn.execute('CREATE TABLE IF NOT EXISTS changes (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires REAL)')
+
+    def connection(self):
+        """Per-thread connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction; takes the database write lock up front"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def table(self, name, records=(), indexes=(), range_index=None):
+        return SqliteTable(self, name, records, indexes=indexes, range_index=range_index)
+
+    def get_cars(self, roundabout_id):
+        row = self.connection().execute(
+            'SELECT cars, summary, seq FROM car_states WHERE roundabout_id = ?', (roundabout_id,)).fetchone()
+        return self._car_state(row)
+
+    @contextmanager
+    def update_cars(self, roundabout_id):
+        with self.transaction() as conn:
+            row = conn.execute('SELECT cars, summary, seq FROM car_states WHERE roundabout_id = ?',
+                               (roundabout_id,)).fetchone()
+            update = CarUpdate(self._car_state(row))
+            yield update
+            if update.changed:
+                state = update.state
+                conn.execute(
+                    'INSERT INTO car_states (roundabout_id, seq, cars, summary) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(roundabout_id) DO UPDATE SET '
+                    'seq = excluded.seq, cars = excluded.cars, summary = excluded.summary',
+                    (roundabout_id, state.seq, json.dumps(state.cars), json.dumps(state.summary)))
+
+    def version(self, key):
+        row = self.connection().execute('SELECT version FROM versions WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def invalidate(self, *keys):
+        # Listeners run from the change watcher in every worker, including this one
+        with self.transaction() as conn:
+            first_id = None
+            for key in keys:
+                change_id = conn.execute('INSERT INTO changes (key) VALUES (?)', (key,)).lastrowid
+                if first_id is None:
+                    first_id = change_id
+                conn.execute('INSERT INTO versions (key, version) VALUES (?, ?) '
+                             'ON CONFLICT(key) DO UPDATE SET version = excluded.version', (key, change_id))
+            # Ids of a multi-key call can step over a multiple, so prune whenever the call crossed one
+            if first_id is not None and (first_id - 1) // PRUNE_EVERY != change_id // PRUNE_EVERY:
+                conn.execute('DELETE FROM changes WHERE id <= ?', (change_id - self.keep_changes,))
+
+    def on_change(self, listener):
+        self._listeners.append(listener)
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch_changes, name='state-watcher', daemon=True)
+            self._watcher.start()
+
+    def acquire_lease(self, name, ttl):
+        """Take or renew a named lease; only one process holds it until it expires"""
+        now = time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                'INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires '
+                'WHERE leases.owner = excluded.owner OR leases.expires < ?',
+                (name, self.owner, now + ttl, now))
+            return cursor.rowcount > 0
+
+    def _car_state(self, row):
+        if row is None:
+            return EMPTY_CAR_STATE
+        cars, summary, seq = row
+        return CarState(json.loads(cars), json.loads(summary), seq)
+
+    def _watch_changes(self):
+        conn = self.connection()
+        last_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM changes').fetchone()[0]
+        while True:
+            time.sleep(self.poll_interval)
+            rows = conn.execute('SELECT id, key FROM changes WHERE id > ? ORDER BY id', (last_id,)).fetchall()
+            if not rows:
+                continue
+            last_id = rows[-1][0]
+            keys = tuple(dict.fromkeys(key for _, key in rows))
+            for listener in self._listeners:
+                try:
+                    listener(keys)
+                except Exception as e:
+                    print(f"State change listener failed: {e}")
+
+
+def create_backend(url):
+    """Backend from a URL: 'memory' or 'sqlite:///path/to/state.db'"""
+    if url == 'memory':
+        return MemoryBackend()
+    if url.startswith('sqlite:///'):
+        return SqliteBackend(url[len('sqlite:///'):])
+    raise ValueError(f'Unknown state backend: {url}')
@@ -0,0 +1,174 @@
+"""
+Indexed in-memory tables for the API state
+Records are plain dicts keyed by 'id'. Besides the id hash index a table keeps
+hash indexes on chosen fields (district, congestion level, ...) and an
+optional sorted index on one numeric field, so lookups are O(1) and filters
+cost O(matches) instead of a scan over every roundabout.
+
+Writes cost O(records written): under one writer lock a record is replaced by
+a new dict in a single assignment and the index buckets it moves between are
+updated in place. Readers never take a lock. Each step of a read (listing the
+records, intersecting buckets, slicing the range index) is one C-level
+operation the GIL keeps whole, so a reader sees every record either before or
+after a write; a read racing a multi-record write may see part of it. Records
+are immutable: update() swaps in a new dict, so never mutate a record
+returned by the table.
+"""
+import bisect
+import threading
+
+
+class IndexedTable:
+    """Dict records with an id index, hash indexes and one range index"""
+
+    def __init__(self, records=(), indexes=(), range_index=None):
+        self.index_fields = tuple(indexes)
+        self.range_field = range_index
+        self.version = 0  # Bumped by every write
+        self._position = 0
+        self._lock = threading.Lock()  # Serializes writers only
+        self._records = {}  # id -> record, in insertion order
+        self._order = {}  # id -> insertion position, keeps listings stable
+        self._indexes = {field: {} for field in self.index_fields}  # field -> value -> set of ids
+        self._range = []  # sorted (value, position, id)
+        self.put_many(records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __contains__(self, record_id):
+        return record_id in self._records
+
+    def get(self, record_id):
+        return self._records.get(record_id)
+
+    def all(self):
+        """All records in insertion order"""
+        return list(self._records.values())
+
+    def put(self, record):
+        """Insert or replace a record"""
+        return self.put_many([record])[0]
+
+    def put_many(self, records):
+        """Insert or replace several records under one write"""
+        return self._write(lambda: [self._put(record) for record in records])
+
+    def update(self, record_id, changes):
+        """Replace a record with a copy carrying changes; returns the new record or None"""
+        return self.update_many({record_id: changes}).get(record_id)
+
+    def update_many(self, changes_by_id):
+        """Apply {id: changes} under one write; returns {id: new record} for ids that exist"""
+        def apply():
+            updated = {}
+            for record_id, changes in changes_by_id.items():
+                old = self._records.get(record_id)
+                if old is not None:
+                    updated[record_id] = self._put(dict(old, **changes))
+            return updated
+        return self._write(apply)
+
+    def remove(self, record_id):
+        return self._write(lambda: self._remove(record_id))
+
+    def query(self, filters=None, min_value=None, max_value=None, offset=0, limit=None):
+        """Records matching all equality filters and the range bounds, in insertion order
+
+        Returns (page, total) so callers can paginate.
+        """
+        candidates = None
+
+        # Start from the smallest hash index bucket, then intersect
+        buckets = sorted((self._bucket(field, value) for field, value in (filters or {}).items()), key=len)
+        for bucket in buckets:
+            candidates = frozenset(bucket) if candidates is None else candidates & bucket
+            if not candidates:
+                return [], 0
+
+        if min_value is not None or max_value is not None:
+            in_range = self._range_ids(min_value, max_value)
+            candidates = in_range if candidates is None else candidates & in_range
+
+        records = self._records
+        if candidates is None:
+            matches = list(records.values())
+        else:
+            order = self._order
+            # Ids removed by a racing write have no position (or record) any more and drop out
+            ids = sorted(candidates, key=lambda record_id: order.get(record_id, 0))
+            matches = [record for record in map(records.get, ids) if record is not None]
+
+        end = None if limit is None else offset + limit
+        return matches[offset:end], len(matches)
+
+    def _write(self, apply):
+        with self._lock:
+            result = apply()
+            self.version += 1
+            return result
+
+    def _put(self, record):
+        record_id = record['id']
+        old = self._records.get(record_id)
+        if old is None:
+            self._position += 1
+            self._order[record_id] = self._position
+        self._reindex(record_id, old, record)
+        self._records[record_id] = record
+        return record
+
+    def _remove(self, record_id):
+        old = self._records.pop(record_id, None)
+        if old is not None:
+            self._reindex(record_id, old, None)
+            del self._order[record_id]
+        return old
+
+    def _reindex(self, record_id, old, new):
+        """Move record_id between the buckets of its old and new field values"""
+        for field, buckets in self._indexes.items():
+            old_value = old.get(field) if old is not None else None
+            new_value = new.get(field) if new is not None else None
+            if old is not None and new is not None and old_value == new_value:
+                continue
+            if old is not None:
+                bucket = buckets.get(old_value)
+                if bucket is not None:
+                    bucket.discard(record_id)
+                    if not bucket:
+                        del buckets[old_value]
+            if new is not None:
+                buckets.setdefault(new_value, set()).add(record_id)
+        if self.range_field is not None:
+            old_key = self._range_key(record_id, old)
+            new_key = self._range_key(record_id, new)
+            if old_key != new_key:
+                if old_key is not None:
+                    pos = bisect.bisect_left(self._range, old_key)
+                    if pos < len(self._range) and self._range[pos] == old_key:
+                        del self._range[pos]
+                if new_key is not None:
+                    bisect.insort(self._range, new_key)
+
+    def _range_key(self, record_id, record):
+        value = record.get(self.range_field) if record is not None else None
+        if value is None:
+            return None
+        return (value, self._order[record_id], record_id)
+
+    def _bucket(self, field, value):
+        if field not in self._indexes:
+            raise KeyError(f'No index on {field}')
+        return self._indexes[field].get(value, frozenset())
+
+    def _range_ids(self, min_value, max_value):
+        if self.range_field is None:
+            raise KeyError('No range index')
+        entries = self._range
+        lo = 0 if min_value is None else bisect.bisect_left(entries, (min_value,))
+        hi = len(entries) if max_value is None else bisect.bisect_right(entries, (max_value, float('inf')))
+        return frozenset(entry[2] for entry in entries[lo:hi])
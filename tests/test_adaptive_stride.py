@@ -0,0 +1,42 @@
+import numpy as np
+
+from adaptive_stride import AdaptiveInference, TrackExtrapolator
+
+
+def box(track_id, x):
+    return [track_id, 2, 0.9, x, 0, x + 10, 10]
+
+
+class SlowModel:
+    """A tracked box moving 1 px per source frame (the frame is its index) and an untracked one"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, frame):
+        self.calls.append(frame)
+        return np.array([box(1, frame), box(-1, 100)], dtype=float)
+
+
+def test_extrapolation_follows_frame_index_gaps(monkeypatch):
+    clock = iter(np.arange(0, 100, 0.5))
+    monkeypatch.setattr('adaptive_stride.time.perf_counter', lambda: next(clock))
+    model = SlowModel()
+    adaptive = AdaptiveInference(model, target_fps=4, max_stride=3)
+
+    # Stride 2 from the start; frames 1, 3, 5 and 6 were dropped before inference
+    indexes = [0, 2, 4, 7, 8]
+    outputs = [adaptive(index, index) for index in indexes]
+
+    assert model.calls == [0, 4, 8]
+    # 4 px in the 4 frames from 0 to 4, then 3 frames ahead: only the tracked box, at x=7
+    assert outputs[3][:, [0, 3]].tolist() == [[1.0, 7.0]]
+
+
+def test_untracked_detections_are_not_extrapolated():
+    extrapolator = TrackExtrapolator()
+    extrapolator.update(np.array([box(1, 0), box(-1, 50)], dtype=float), 1)
+    extrapolator.update(np.array([box(1, 3), box(-1, 50)], dtype=float), 1)
+    predicted = extrapolator.predict(2)
+    assert predicted[:, 0].tolist() == [1]
+    assert predicted[:, 3].tolist() == [9.0]
@@ -0,0 +1,94 @@
+from alert_engine import BEHAVIOUR_WINDOW, AlertEngine, CountWindow
+
+
+def roundabout(utilization, roundabout_id='r-1', district='north', severity=50, wrong_way=0):
+    return {'id': roundabout_id, 'name': roundabout_id, 'districtId': district, 'laneUtilization': utilization,
+            'severityScore': severity, 'riskyBehaviors': {'wrongWay': wrong_way}}
+
+
+def alert_types(engine):
+    return sorted(alert['type'] for alert in engine.alerts.all())
+
+
+def test_congestion_alert_has_hysteresis():
+    engine = AlertEngine({'north': 'North'})
+    assert engine.observe([roundabout(90)]) == {'alerts', 'districts'}
+    assert alert_types(engine) == ['congestion']
+    raised_at = engine.alerts.get('congestion:r-1')['timestamp']
+
+    # Between the clear and raise thresholds the alert stays, keeping when it was raised
+    engine.observe([roundabout(80)])
+    assert engine.alerts.get('congestion:r-1')['timestamp'] == raised_at
+    assert engine.rollup('north')['activeAlerts'] == 1
+
+    engine.observe([roundabout(70)])
+    assert alert_types(engine) == []
+    assert engine.rollup('north')['activeAlerts'] == 0
+
+    # Climbing back into the band doesn't raise it again
+    engine.observe([roundabout(80)])
+    assert alert_types(engine) == []
+
+
+def test_one_alert_per_roundabout_and_rule():
+    engine = AlertEngine()
+    engine.observe([roundabout(90, severity=95, wrong_way=0)], now=0)
+    engine.observe([roundabout(91, severity=96, wrong_way=6)], now=10)
+    engine.observe([roundabout(91, severity=96, wrong_way=7)], now=20)
+    assert alert_types(engine) == ['congestion', 'severity', 'wrongWay']
+
+
+def test_detector_congestion_comes_from_its_level():
+    engine = AlertEngine()
+    live = dict(roundabout(12), source='detector', congestionLevel='High')
+    engine.observe([live])
+    assert alert_types(engine) == ['congestion']
+    assert engine.rollup('north')['congestionScore'] == 85
+    engine.observe([dict(live, congestionLevel='Moderate')])
+    assert alert_types(engine) == []
+
+
+def test_behaviour_rules_count_growth_within_the_window():
+    engine = AlertEngine()
+    engine.observe([roundabout(50, wrong_way=100)], now=0)
+    assert alert_types(engine) == []  # A long-running total alone says nothing
+    engine.observe([roundabout(50, wrong_way=105)], now=60)
+    assert alert_types(engine) == ['wrongWay']
+    # No new wrong-way drivers: once the window has moved past them the alert clears
+    engine.observe([roundabout(50, wrong_way=105)], now=60 + BEHAVIOUR_WINDOW)
+    assert alert_types(engine) == []
+
+
+def test_count_window_restarts_with_its_counter():
+    window = CountWindow(window=60)
+    assert window.add(0, 10) is None
+    assert window.add(30, 14) == 4
+    assert window.add(40, 2) == 2  # Counter restarted
+    assert window.add(200, 2) == 0
+
+
+def test_rollup_holds_only_derived_figures():
+    engine = AlertEngine()
+    engine.observe([roundabout(60, 'r-1'), roundabout(80, 'r-2'), roundabout(40, 'r-3', district='south')])
+    assert engine.rollup('north') == {'reportingRoundabouts': 2, 'activeAlerts': 0, 'congestionScore': 70,
+                                      'severity': 'concern'}
+    assert engine.rollup('east') is None
+
+    # Moving a roundabout to another district moves its contribution
+    engine.observe([roundabout(80, 'r-2', district='south')])
+    assert engine.rollup('north')['reportingRoundabouts'] == 1
+    assert engine.rollup('south')['congestionScore'] == 60
+
+
+def test_resync_rebuilds_from_stored_alerts():
+    leader = AlertEngine()
+    leader.observe([roundabout(90)])
+
+    # A new leader sharing the tables picks up where the old one stopped
+    follower = AlertEngine(alerts=leader.alerts, rollups=leader.rollups)
+    follower.resync([roundabout(80)])
+    assert alert_types(follower) == ['congestion']
+    assert follower.rollup('north')['activeAlerts'] == 1
+    follower.observe([roundabout(70)])
+    assert alert_types(follower) == []
+    assert follower.rollup('north')['activeAlerts'] == 0
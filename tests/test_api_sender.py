@@ -0,0 +1,57 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api_sender import ApiSender
+from profiling import Profiler
+
+
+@pytest.fixture
+def api():
+    """Local endpoint recording the JSON bodies it is posted"""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/update', received
+    server.shutdown()
+    server.server_close()
+
+
+def test_profile_of_a_coalesced_payload_goes_out_with_the_next(api):
+    url, received = api
+    profiler = Profiler(enabled=True)
+    sender = ApiSender(url, max_rate=0, profiler=profiler)
+    # Not started yet, so the first payload is coalesced away by the second
+    sender.submit({'cars': [], 'stats': {'frame': 1}, 'profile': {'stage': 1}})
+    sender.submit({'cars': [], 'stats': {'frame': 2}})
+    sender.start()
+    sender.stop()
+
+    assert received == [{'cars': [], 'stats': {'frame': 2}, 'profile': {'stage': 1}}]
+    assert profiler.summary()['send']['count'] == 1
+
+
+def test_profile_is_sent_once(api):
+    url, received = api
+    sender = ApiSender(url, max_rate=0).start()
+    sender.submit({'cars': [], 'stats': {}, 'profile': {'stage': 1}})
+    deadline = time.monotonic() + 5
+    while sender.stats()['sent'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sender.submit({'cars': [], 'stats': {}})
+    sender.stop()
+    assert ['profile' in payload for payload in received] == [True, False]
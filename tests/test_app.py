@@ -0,0 +1,195 @@
+import gzip
+import json
+
+import pytest
+
+import app as api
+from car_codec import CARS_MIMETYPE, encode_payload
+
+
+@pytest.fixture
+def client():
+    return api.app.test_client()
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('', api.STREAM_MAX_RATE),
+    ('?maxRate=0', api.STREAM_MAX_RATE),
+    ('?maxRate=-3', api.STREAM_MAX_RATE),
+    ('?maxRate=1000', api.STREAM_MAX_RATE),
+    ('?maxRate=0.5', 0.5),
+])
+def test_stream_rate_is_capped(client, monkeypatch, query, expected):
+    rates = []
+    subscribe = api.EVENTS.subscribe
+
+    def capture(topic, max_rate=None):
+        rates.append(max_rate)
+        return subscribe(topic, max_rate=max_rate)
+
+    monkeypatch.setattr(api.EVENTS, 'subscribe', capture)
+    response = client.get(f'/api/roundabout/test-001/stream{query}')
+    response.close()
+    assert rates == [expected]
+
+
+def post(client, roundabout_id, payload):
+    return client.post(f'/api/roundabout/{roundabout_id}/update', json=payload)
+
+
+def test_delta_after_full_update_applies(client):
+    cars = [{'id': 'car-1', 'type': 'car', 'confidence': 0.9, 'position': {'x': 1, 'y': 1},
+             'inFirstZone': False, 'inSecondZone': False, 'isPenalty': False}]
+    assert post(client, 'delta-ok', {'cars': cars, 'seq': 1}).status_code == 200
+    response = post(client, 'delta-ok', {'seq': 2, 'baseSeq': 1, 'added': [], 'removed': [],
+                                         'changed': [{'id': 'car-1', 'position': {'x': 2, 'y': 1},
+                                                      'timestamp': '2024-01-01T00:00:00'}]})
+    assert response.status_code == 200
+    cars = client.get('/api/roundabout/delta-ok/cars').json['cars']
+    assert cars[0]['position'] == {'x': 2, 'y': 1}
+
+
+def test_delta_with_wrong_base_asks_for_resync(client):
+    assert post(client, 'delta-gap', {'cars': [], 'seq': 5}).status_code == 200
+    response = post(client, 'delta-gap', {'seq': 7, 'baseSeq': 6, 'added': [], 'changed': [], 'removed': []})
+    assert response.status_code == 409
+    assert response.json['resync'] is True
+    assert response.json['expectedBaseSeq'] == 5
+
+
+def test_delta_for_unknown_car_asks_for_resync(client):
+    assert post(client, 'delta-unknown', {'cars': [], 'seq': 1}).status_code == 200
+    response = post(client, 'delta-unknown', {'seq': 2, 'baseSeq': 1, 'changed': [{'id': 'car-9'}]})
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize('seq', [None, '2', 2.5, True])
+def test_delta_without_integer_seq_is_rejected(client, seq):
+    assert post(client, 'delta-seq', {'cars': [], 'seq': 1}).status_code == 200
+    payload = {'baseSeq': 1, 'added': [], 'changed': [], 'removed': []}
+    if seq is not None:
+        payload['seq'] = seq
+    assert post(client, 'delta-seq', payload).status_code == 400
+
+
+@pytest.mark.parametrize('payload', [
+    ['not', 'an', 'object'],
+    {'cars': 'abc'},
+    {'cars': [{'id': 'car-1', 'type': 'car'}]},
+    {'cars': ['car-1']},
+    {'cars': [{'id': ['car-1'], 'type': 'car', 'inFirstZone': False, 'inSecondZone': False, 'isPenalty': False}]},
+    {'seq': 2, 'baseSeq': 1, 'added': [{'type': 'car'}]},
+    {'seq': 2, 'baseSeq': 1, 'changed': {'id': 'car-1'}},
+    {'seq': 2, 'baseSeq': 1, 'changed': [{'id': 'car-1', 'type': ['bus']}]},
+    {'seq': 2, 'baseSeq': 1, 'removed': [{'id': 'car-1'}]},
+    {'seq': 2, 'baseSeq': '1'},
+])
+def test_malformed_payloads_are_rejected(client, payload):
+    assert post(client, 'shape', {'cars': [], 'seq': 1}).status_code == 200
+    assert post(client, 'shape', payload).status_code == 400
+    assert client.get('/api/roundabout/shape/cars').json['cars'] == []
+
+
+def test_districts_keep_static_totals(client):
+    static = {district['id']: district['totalRoundabouts'] for district in api.DISTRICTS}
+    for district in client.get('/api/districts').json:
+        assert district['totalRoundabouts'] == static[district['id']]
+
+
+@pytest.mark.parametrize('stats', [
+    {'laneUtilization': 'abc'},
+    {'laneUtilization': float('inf')},
+    {'congestionLevel': ['x']},
+    {'congestionLevel': 'Gridlock'},
+])
+def test_invalid_stats_are_rejected_before_state_changes(client, stats):
+    before = client.get('/api/roundabout/test-001').json
+    cars_before = client.get('/api/roundabout/test-001/cars').json['cars']
+    response = post(client, 'test-001', {'cars': [{'id': 'car-x', 'type': 'car', 'inFirstZone': False,
+                                                   'inSecondZone': False, 'isPenalty': False}], 'stats': stats})
+    assert response.status_code == 400
+    after = client.get('/api/roundabout/test-001').json
+    assert (after['laneUtilization'], after['congestionLevel']) == (before['laneUtilization'],
+                                                                    before['congestionLevel'])
+    assert client.get('/api/roundabout/test-001/cars').json['cars'] == cars_before
+
+
+def test_binary_update_is_decoded(client):
+    cars = [{'id': 'car-7', 'type': 'bus', 'confidence': 0.5, 'position': {'x': 9, 'y': 9},
+             'inFirstZone': False, 'inSecondZone': True, 'isPenalty': False, 'timestamp': '2024-01-01T00:00:00'}]
+    response = client.post('/api/roundabout/binary/update', data=encode_payload({'cars': cars, 'seq': 1}),
+                           content_type=CARS_MIMETYPE)
+    assert response.status_code == 200
+    assert client.get('/api/roundabout/binary/cars').json['cars'][0]['type'] == 'bus'
+
+
+def test_malformed_binary_update_is_rejected(client):
+    response = client.post('/api/roundabout/binary/update', data=b'RBC1', content_type=CARS_MIMETYPE)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('query', ['to=inf', 'from=1e20', 'from=nan', 'to=-1e300', 'from=yesterday'])
+def test_history_rejects_unusable_times(client, query):
+    response = client.get(f'/api/roundabout/test-001/history?{query}')
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid from/to'
+
+
+def full_car(n):
+    return {'id': f'car-{n}', 'type': 'car', 'confidence': 0.9, 'position': {'x': n, 'y': n},
+            'inFirstZone': False, 'inSecondZone': False, 'isPenalty': False}
+
+
+def test_unchanged_cars_answer_304_for_their_etag(client):
+    assert post(client, 'etag', {'cars': [full_car(1)], 'seq': 1}).status_code == 200
+    first = client.get('/api/roundabout/etag/cars')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag
+    again = client.get('/api/roundabout/etag/cars', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+
+
+def test_ingest_invalidates_the_cached_cars_body(client):
+    assert post(client, 'etag-ingest', {'cars': [full_car(1)], 'seq': 1}).status_code == 200
+    etag = client.get('/api/roundabout/etag-ingest/cars').headers['ETag']
+    assert post(client, 'etag-ingest', {'cars': [full_car(1), full_car(2)], 'seq': 2}).status_code == 200
+    response = client.get('/api/roundabout/etag-ingest/cars', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [car['id'] for car in response.json['cars']] == ['car-1', 'car-2']
+
+
+def test_large_bodies_are_gzipped_when_accepted(client):
+    assert post(client, 'gzip', {'cars': [full_car(n) for n in range(40)], 'seq': 1}).status_code == 200
+    plain = client.get('/api/roundabout/gzip/cars')
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+
+    zipped = client.get('/api/roundabout/gzip/cars', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    etag = zipped.headers['ETag']
+    assert etag.strip('"') == plain.headers['ETag'].strip('"') + '-gz'
+    assert json.loads(gzip.decompress(zipped.data)) == plain.json
+
+    # Each representation only matches its own ETag
+    assert client.get('/api/roundabout/gzip/cars', headers={'Accept-Encoding': 'gzip',
+                                                           'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/roundabout/gzip/cars', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_small_bodies_are_not_gzipped(client):
+    assert post(client, 'gzip-small', {'cars': [], 'seq': 1}).status_code == 200
+    response = client.get('/api/roundabout/gzip-small/cars', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert not response.headers['ETag'].strip('"').endswith('-gz')
+
+
+def test_roundabout_filters_page_with_total_count(client):
+    response = client.get('/api/roundabouts?limit=1')
+    assert len(response.json) == 1
+    assert response.headers['X-Total-Count'] == str(len(api.ROUNDABOUTS))
+    response = client.get('/api/roundabouts?district=north&minSeverity=0&maxSeverity=100')
+    assert {roundabout['districtId'] for roundabout in response.json} <= {'north'}
+    assert response.headers['X-Total-Count'] == str(len(response.json))
@@ -0,0 +1,50 @@
+import pytest
+
+from car_codec import HEADER, decode_payload, encode_payload
+
+TIMESTAMP = '2024-01-01T12:00:00'
+
+
+def car(car_id, x, **fields):
+    value = {'id': car_id, 'type': 'car', 'confidence': 0.87, 'position': {'x': x, 'y': 20},
+             'inFirstZone': True, 'inSecondZone': False, 'isPenalty': False, 'timestamp': TIMESTAMP}
+    value.update(fields)
+    return value
+
+
+def test_full_payload_round_trip():
+    payload = {'seq': 3, 'cars': [car('car-1', 10), car('lane-b', -5, type='truck', isPenalty=True)],
+               'stats': {'vehicleEntry': 4}, 'profile': {'decode': {'count': 1}}}
+    assert decode_payload(encode_payload(payload)) == payload
+
+
+def test_delta_round_trip_keeps_partial_changes():
+    # Delta cars take the payload timestamp, so added cars carry none of their own
+    added = car('car-5', 1)
+    del added['timestamp']
+    payload = {'seq': 8, 'baseSeq': 7, 'timestamp': TIMESTAMP, 'added': [added],
+               'changed': [{'id': 'car-2', 'position': {'x': 3, 'y': 4}}, {'id': 'car-3', 'isPenalty': True}],
+               'removed': ['car-1', 'gone'], 'stats': {}}
+    assert decode_payload(encode_payload(payload)) == payload
+
+
+def test_unsupported_car_fields_are_refused():
+    with pytest.raises(ValueError):
+        encode_payload({'cars': [car('car-1', 1, colour='red')]})
+
+
+def with_timestamp(timestamp):
+    """An empty full payload whose header carries timestamp"""
+    data = encode_payload({'cars': []})
+    fields = list(HEADER.unpack_from(data))
+    fields[4] = timestamp
+    return HEADER.pack(*fields) + data[HEADER.size:]
+
+
+@pytest.mark.parametrize('data', [
+    b'', b'JSON{}', encode_payload({'cars': [car('car-1', 1)]})[:-3],
+    with_timestamp(1e300), with_timestamp(float('inf')), with_timestamp(float('nan')),
+])
+def test_malformed_payloads_are_refused(data):
+    with pytest.raises(ValueError):
+        decode_payload(data)
@@ -0,0 +1,46 @@
+import pytest
+
+from car_delta import DeltaEncoder, SequenceGap, apply_delta, diff_cars, index_cars
+
+
+def car(car_id, x, zone=False):
+    return {'id': car_id, 'type': 'car', 'confidence': 0.9, 'position': {'x': x, 'y': 10},
+            'inFirstZone': zone, 'inSecondZone': False, 'isPenalty': False, 'timestamp': '2024-01-01T00:00:00'}
+
+
+def strip_timestamps(cars):
+    return {car_id: {k: v for k, v in value.items() if k != 'timestamp'} for car_id, value in cars.items()}
+
+
+def test_delta_round_trip_rebuilds_the_new_state():
+    old = index_cars([car('car-1', 1), car('car-2', 2), car('car-3', 3)])
+    new = index_cars([car('car-1', 5), car('car-3', 3, zone=True), car('car-4', 4)])
+    encoder = DeltaEncoder()
+    encoder.encode({'cars': list(old.values())})
+    encoder.ack()
+    delta = encoder.encode({'cars': list(new.values()), 'stats': {}})
+
+    assert delta['baseSeq'] == 1 and delta['seq'] == 2
+    assert [c['id'] for c in delta['added']] == ['car-4']
+    assert delta['removed'] == ['car-2']
+    assert strip_timestamps(apply_delta(old, delta)) == strip_timestamps(new)
+
+
+def test_changed_entry_carrying_a_timestamp_applies():
+    cars = index_cars([car('car-1', 1)])
+    delta = {'timestamp': '2024-01-01T00:00:05', 'changed': [{'id': 'car-1', 'position': {'x': 2, 'y': 10},
+                                                              'timestamp': '2024-01-01T00:00:04'}]}
+    result = apply_delta(cars, delta)
+    assert result['car-1']['position'] == {'x': 2, 'y': 10}
+    assert result['car-1']['timestamp'] == '2024-01-01T00:00:05'
+
+
+def test_change_to_unknown_car_is_a_sequence_gap():
+    with pytest.raises(SequenceGap):
+        apply_delta({}, {'changed': [{'id': 'car-9', 'position': {'x': 1, 'y': 1}}]})
+
+
+def test_diff_ignores_timestamps():
+    old = index_cars([car('car-1', 1)])
+    new = index_cars([dict(car('car-1', 1), timestamp='later')])
+    assert diff_cars(old, new) == ([], [], [])
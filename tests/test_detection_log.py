@@ -0,0 +1,35 @@
+import numpy as np
+
+from detection_log import DetectionLog, DetectionRecorder
+
+
+def detections(n, offset=0):
+    rows = np.arange(n, dtype=float) + offset
+    return np.column_stack([rows, np.full(n, 2.0), np.full(n, 0.5), rows, rows, rows + 10, rows + 10])
+
+
+def test_closed_log_round_trip(tmp_path):
+    with DetectionRecorder(str(tmp_path), source='cam.mp4', fps=25) as recorder:
+        recorder.write(0, detections(3), (720, 1280, 3))
+        recorder.write(2, detections(0), (720, 1280, 3))
+        recorder.write(3, detections(2, 10), (720, 1280, 3))
+    log = DetectionLog(str(tmp_path))
+    frames = list(log.frames())
+    assert len(log) == 3
+    assert log.frame_shape == (720, 1280, 3)
+    assert [index for index, _ in frames] == [0, 2, 3]
+    assert np.array_equal(frames[2][1], detections(2, 10))
+
+
+def test_unclosed_log_reads_up_to_the_last_whole_frame(tmp_path):
+    recorder = DetectionRecorder(str(tmp_path), fps=25)
+    recorder.write(0, detections(3), (720, 1280, 3))
+    recorder.write(1, detections(2), (720, 1280, 3))
+    for f in recorder._files.values():
+        f.flush()
+    # A crash mid-frame: rows of the next frame written, but not its frame entry
+    recorder._files['track_id'].write(np.zeros(4, dtype='<i4').tobytes())
+    recorder._files['track_id'].flush()
+
+    log = DetectionLog(str(tmp_path))
+    assert [(index, len(rows)) for index, rows in log.frames()] == [(0, 3), (1, 2)]
@@ -0,0 +1,47 @@
+import time
+
+from event_stream import ALL_TOPICS, EventBroker, Subscriber, format_event
+
+
+def test_idle_subscriber_is_not_disconnected_by_back_to_back_updates():
+    broker = EventBroker(stall_timeout=0.2)
+    subscriber = broker.subscribe('r-1')
+    time.sleep(0.3)  # Idle longer than the stall timeout, only heartbeats in between
+    broker.publish('r-1', 'roundabout', '{}')
+    broker.publish('r-1', 'cars', '{}')
+    assert broker.disconnected == 0
+    assert len(subscriber.next_messages(0.1)) == 2
+
+
+def test_subscriber_that_stops_reading_is_disconnected():
+    broker = EventBroker(stall_timeout=0.1)
+    subscriber = broker.subscribe('r-1')
+    broker.publish('r-1', 'cars', '{}')
+    time.sleep(0.2)
+    broker.publish('r-1', 'cars', '{}')
+    assert broker.disconnected == 1
+    assert subscriber.closed
+
+
+def test_newest_message_per_key_is_kept():
+    broker = EventBroker()
+    subscriber = broker.subscribe(ALL_TOPICS)
+    broker.publish('r-1', 'cars', '1')
+    broker.publish('r-1', 'cars', '2')
+    assert subscriber.next_messages(0.1) == [format_event('cars', '2')]
+    assert subscriber.dropped == 1
+
+
+def test_rate_limit_spaces_deliveries():
+    subscriber = Subscriber('r-1', max_rate=10)
+    subscriber.offer('a', b'1')
+    assert subscriber.next_messages(0.5) == [b'1']
+    subscriber.offer('a', b'2')
+    start = time.monotonic()
+    assert subscriber.next_messages(0.5) == [b'2']
+    assert time.monotonic() - start >= 0.08
+
+
+def test_non_positive_rate_means_no_negative_interval():
+    assert Subscriber('r-1', max_rate=0).min_interval == 0.0
+    assert Subscriber('r-1', max_rate=-5).min_interval == 0.0
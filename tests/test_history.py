@@ -0,0 +1,15 @@
+from history import HistoryStore
+
+
+def test_non_numeric_values_are_recorded_as_gaps():
+    store = HistoryStore()
+    store.record('r-1', {'laneUtilization': 'abc', 'vehicleEntry': 5, 'severityScore': True}, 100.0)
+    resolution, times, series = store.query('r-1', 0, 200, resolution='raw')
+    assert times == [100.0]
+    assert series['laneUtilization'] == [None]
+    assert series['severityScore'] == [None]
+    assert series['vehicleEntry'] == [5.0]
+
+
+def test_missing_roundabout_has_no_history():
+    assert HistoryStore().query('nope', 0, 1) is None
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+offline_batch = pytest.importorskip('offline_batch', reason='needs the detection dependencies')
+
+
+def rows(positions, local_id, x0, speed=5.0):
+    """Detections of one car moving right, in the chunk layout (position, id, cls, conf, x1, y1, x2, y2)"""
+    return [[position, local_id, 2, 0.9, x0 + speed * position, 100, x0 + speed * position + 40, 130]
+            for position in positions]
+
+
+def chunk(*cars):
+    detections = np.array([row for car in cars for row in car], dtype=np.float32)
+    return detections[np.argsort(detections[:, 0], kind='stable')]
+
+
+def test_plan_chunks_reads_overlap_before_each_start():
+    assert offline_batch.plan_chunks(25, 10, 4) == [(0, 0, 10), (6, 10, 20), (16, 20, 25)]
+
+
+def test_global_ids_continue_across_the_chunk_boundary():
+    stitcher = offline_batch.TrackStitcher(overlap_frames=4)
+    first = stitcher.stitch(0, chunk(rows(range(0, 10), 1, 0), rows(range(0, 10), 2, 300)))
+    assert sorted(set(first[:, 1].tolist())) == [1, 2]
+
+    # The next chunk's tracker numbers the same cars differently, and sees a new one
+    second = stitcher.stitch(10, chunk(rows(range(6, 14), 7, 0), rows(range(6, 14), 1, 300),
+                                       rows(range(11, 14), 4, 600), [[12, -1, 2, 0.5, 0, 0, 10, 10]]))
+
+    assert second[:, 0].min() == 10  # Warm-up frames are not handed on
+    tracked = second[second[:, 1] >= 0]
+    # Cars told apart by where they started
+    assert {int(row[4] - 5 * row[0]): int(row[1]) for row in tracked} == {0: 1, 300: 2, 600: 3}
+    assert (second[:, 1] == -1).sum() == 1
+    assert stitcher.next_id == 4
+
+
+def test_unmatched_tracks_get_fresh_ids():
+    stitcher = offline_batch.TrackStitcher(overlap_frames=4)
+    stitcher.stitch(0, chunk(rows(range(0, 10), 1, 0)))
+    # Nothing near the old car in the overlap: no match, no reuse
+    second = stitcher.stitch(10, chunk(rows(range(6, 14), 1, 900)))
+    assert set(second[:, 1].tolist()) == {2}
+
+
+def test_iter_frames_yields_empty_frames_too():
+    detections = chunk(rows([10, 12, 12], 1, 0))
+    frames = list(offline_batch.iter_frames(detections, 10, 14))
+    assert [position for position, _ in frames] == [10, 11, 12, 13]
+    assert [len(frame) for _, frame in frames] == [1, 0, 2, 0]
+    assert frames[0][1].shape[1] == 7
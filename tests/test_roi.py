@@ -0,0 +1,42 @@
+import numpy as np
+
+from roi import join_seam_boxes, seam_cut, tile_grid
+
+ROI = (0, 0, 1000, 500)
+TILES = [(0, 0, 500, 500), (400, 0, 900, 500), (500, 0, 1000, 500)]
+
+
+def tile_boxes(boxes_per_tile):
+    boxes = np.array([box for boxes in boxes_per_tile for box in boxes], dtype=float)
+    cut = np.concatenate([seam_cut(np.array(boxes, dtype=float).reshape(-1, 6), tile, ROI)
+                          for tile, boxes in zip(TILES, boxes_per_tile)])
+    return boxes, cut
+
+
+def test_seam_cut_ignores_outer_edges():
+    boxes = np.array([[0, 0, 50, 50, 0.9, 2], [450, 10, 500, 60, 0.9, 2]], dtype=float)
+    assert seam_cut(boxes, TILES[0], ROI).tolist() == [False, True]
+
+
+def test_piece_of_a_box_seen_whole_is_dropped():
+    boxes, cut = tile_boxes([[[470, 10, 500, 60, 0.8, 2]], [[460, 10, 520, 60, 0.9, 2]], []])
+    assert join_seam_boxes(boxes, cut).tolist() == [[460, 10, 520, 60, 0.9, 2]]
+
+
+def test_vehicle_wider_than_the_overlap_is_joined():
+    # A bus from x=350 to x=950 is cut by every tile
+    boxes, cut = tile_boxes([[[350, 100, 500, 200, 0.6, 5]], [[400, 100, 900, 200, 0.7, 5]],
+                             [[500, 100, 950, 200, 0.8, 5]]])
+    assert cut.all()
+    assert join_seam_boxes(boxes, cut).tolist() == [[350, 100, 950, 200, 0.8, 5]]
+
+
+def test_pieces_of_other_classes_are_not_joined():
+    boxes, cut = tile_boxes([[[450, 100, 500, 200, 0.6, 2]], [[400, 100, 480, 200, 0.7, 7]], []])
+    assert len(join_seam_boxes(boxes, cut)) == 2
+
+
+def test_tile_grid_covers_roi():
+    tiles = tile_grid(ROI, 500)
+    assert tiles[0][:2] == (0, 0)
+    assert tiles[-1][2:] == (1000, 500)
@@ -0,0 +1,11 @@
+from state_backend import SqliteBackend
+
+
+def test_changes_are_pruned_when_multi_key_calls_step_over_the_interval(tmp_path):
+    backend = SqliteBackend(str(tmp_path / 'state.db'), keep_changes=10)
+    # Three keys per call: ids 1-3, 4-6, ... so most calls never end on a multiple of 1000
+    for _ in range(400):
+        backend.invalidate('a', 'b', 'c')
+    conn = backend.connection()
+    assert conn.execute('SELECT MIN(id), MAX(id) FROM changes').fetchone() == (993, 1200)
+    assert backend.version('c') == 1200
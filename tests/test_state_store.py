@@ -0,0 +1,94 @@
+import pytest
+
+from state_backend import SqliteBackend
+from state_store import IndexedTable
+
+
+def roundabouts():
+    return IndexedTable([
+        {'id': 'a', 'districtId': 'north', 'severityScore': 10},
+        {'id': 'b', 'districtId': 'north', 'severityScore': 50},
+        {'id': 'c', 'districtId': 'south', 'severityScore': 90},
+    ], indexes=('districtId',), range_index='severityScore')
+
+
+def ids(result):
+    return [record['id'] for record in result[0]]
+
+
+def test_update_moves_a_record_between_buckets_and_range_entries():
+    table = roundabouts()
+    table.update('a', {'districtId': 'south', 'severityScore': 95})
+    assert ids(table.query({'districtId': 'north'})) == ['b']
+    assert ids(table.query({'districtId': 'south'})) == ['a', 'c']
+    assert ids(table.query(min_value=90)) == ['a', 'c']
+    assert ids(table.query(max_value=20)) == []
+
+
+def test_remove_and_reinsert():
+    table = roundabouts()
+    version = table.version
+    assert table.remove('b')['id'] == 'b'
+    assert table.version == version + 1
+    assert 'b' not in table and len(table) == 2
+    assert ids(table.query({'districtId': 'north'})) == ['a']
+    table.put({'id': 'b', 'districtId': 'north', 'severityScore': 50})
+    # A re-inserted record goes to the end of the listing
+    assert [record['id'] for record in table.all()] == ['a', 'c', 'b']
+
+
+def test_records_returned_earlier_are_not_changed_by_updates():
+    table = roundabouts()
+    before = table.get('a')
+    table.update('a', {'severityScore': 70})
+    assert before['severityScore'] == 10
+    assert table.get('a')['severityScore'] == 70
+
+
+RECORDS = [
+    {'id': 'r1', 'districtId': 'north', 'congestionLevel': 'High', 'severityScore': 75},
+    {'id': 'r2', 'districtId': 'north', 'congestionLevel': 'Low', 'severityScore': 30},
+    {'id': 'r3', 'districtId': 'south', 'congestionLevel': 'High', 'severityScore': 75},
+    {'id': 'r4', 'districtId': 'north', 'congestionLevel': 'High', 'severityScore': 90},
+    {'id': 'r5', 'districtId': 'east', 'congestionLevel': 'Moderate', 'severityScore': 50},
+    {'id': 'r6', 'districtId': 'north', 'congestionLevel': 'High'},  # Not in the range index
+]
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def table(request, tmp_path):
+    indexes = ('districtId', 'congestionLevel')
+    if request.param == 'memory':
+        return IndexedTable(RECORDS, indexes=indexes, range_index='severityScore')
+    backend = SqliteBackend(str(tmp_path / 'state.db'))
+    return backend.table('roundabouts', RECORDS, indexes=indexes, range_index='severityScore')
+
+
+@pytest.mark.parametrize('filters, bounds, page, expected, total', [
+    ({}, {}, {}, ['r1', 'r2', 'r3', 'r4', 'r5', 'r6'], 6),
+    ({'districtId': 'north'}, {}, {}, ['r1', 'r2', 'r4', 'r6'], 4),
+    # Buckets intersect
+    ({'districtId': 'north', 'congestionLevel': 'High'}, {}, {}, ['r1', 'r4', 'r6'], 3),
+    ({'districtId': 'east', 'congestionLevel': 'High'}, {}, {}, [], 0),
+    ({'districtId': 'west'}, {}, {}, [], 0),
+    # Bounds are inclusive, also when several records share the bound value
+    ({}, {'min_value': 75}, {}, ['r1', 'r3', 'r4'], 3),
+    ({}, {'max_value': 75}, {}, ['r1', 'r2', 'r3', 'r5'], 4),
+    ({}, {'min_value': 75, 'max_value': 75}, {}, ['r1', 'r3'], 2),
+    ({}, {'min_value': 76, 'max_value': 89}, {}, [], 0),
+    ({'congestionLevel': 'High'}, {'min_value': 50}, {}, ['r1', 'r3', 'r4'], 3),
+    # Pages keep the unpaginated total
+    ({'districtId': 'north'}, {}, {'offset': 1, 'limit': 2}, ['r2', 'r4'], 4),
+    ({'districtId': 'north'}, {}, {'offset': 3}, ['r6'], 4),
+    ({'districtId': 'north'}, {}, {'offset': 10, 'limit': 5}, [], 4),
+    ({}, {}, {'limit': 0}, [], 6),
+])
+def test_query_matches_between_tables(table, filters, bounds, page, expected, total):
+    records, count = table.query(filters, **bounds, **page)
+    assert [record['id'] for record in records] == expected
+    assert count == total
+
+
+def test_query_on_an_unindexed_field_fails(table):
+    with pytest.raises(KeyError):
+        table.query({'name': 'x'})
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from trajectories import FLAG_WRONG_WAY, BehaviourDetector, TrajectoryStore
+
+
+def feed(store, track_points, times):
+    """Feed {track id: [(x, y) per time]}; returns the slots of the tracks"""
+    track_ids = np.array(list(track_points))
+    for i, t in enumerate(times):
+        points = np.array([track_points[track_id][i] for track_id in track_ids.tolist()], dtype=np.float32)
+        slots = store.update(track_ids, points, t)
+    return slots
+
+
+def test_ring_wraps_around_keeping_the_newest_samples():
+    store = TrajectoryStore(capacity=4, length=4, sample_interval=0.1)
+    slots = feed(store, {1: [(x, 0) for x in range(6)]}, [float(i) for i in range(6)])
+    assert store.count[slots].tolist() == [4]
+    newest, _ = store.sample(slots, np.array([0]))
+    oldest, _ = store.sample(slots, np.array([3]))
+    clamped, _ = store.sample(slots, np.array([10]))
+    assert newest.tolist() == [[5, 0]]
+    assert oldest.tolist() == [[2, 0]]
+    assert clamped.tolist() == oldest.tolist()
+
+
+def test_samples_closer_than_the_interval_are_skipped():
+    store = TrajectoryStore(capacity=4, sample_interval=0.2)
+    slots = feed(store, {1: [(0, 0), (1, 0), (2, 0)]}, [0.0, 0.1, 0.2])
+    assert store.count[slots].tolist() == [2]
+
+
+def test_removed_slot_is_reused_clean():
+    store = TrajectoryStore(capacity=2)
+    slots = feed(store, {1: [(0, 0)], 2: [(5, 5)]}, [0.0])
+    store.mark(slots, FLAG_WRONG_WAY, np.array([True, False]))
+    store.remove(1)
+    assert len(store) == 1
+    reused = store.slots([3])
+    assert reused.tolist() == [slots[0]]
+    assert store.count[reused].tolist() == [0] and store.flags[reused].tolist() == [0]
+    # Full: a new track grows the arrays
+    assert store.slots([4]).tolist() == [2]
+    assert len(store.count) == 4
+
+
+def behaviour_store():
+    # Samples come 0.2 s apart; a smaller interval keeps float noise from skipping one
+    return TrajectoryStore(capacity=4, sample_interval=0.1)
+
+
+def circling(clockwise, seconds=1.2, radius=200.0, angular_speed=0.2):
+    """Points of a car going around (0, 0), image coordinates (y down)"""
+    times = np.arange(0, seconds + 1e-9, 0.2)
+    angle = angular_speed * times * (1 if clockwise else -1)
+    return [(radius * np.cos(a), radius * np.sin(a)) for a in angle], times
+
+
+@pytest.mark.parametrize('circulation, clockwise, wrong_way', [
+    ('counterclockwise', False, False),
+    ('counterclockwise', True, True),
+    ('clockwise', True, False),
+    ('clockwise', False, True),
+])
+def test_wrong_way_follows_the_circulation(circulation, clockwise, wrong_way):
+    store = behaviour_store()
+    points, times = circling(clockwise)
+    slots = feed(store, {1: points}, times)
+    behaviour = BehaviourDetector(circulation).evaluate(store, slots, (0, 0), np.array([True]))
+    assert behaviour.wrong_way.tolist() == [wrong_way]
+    assert behaviour.u_turn.tolist() == [False]
+
+
+def test_u_turn_is_judged_outside_the_roundabout_only():
+    store = behaviour_store()
+    times = np.arange(0, 1.21, 0.2)
+    there_and_back = [(x, 500) for x in (0, 40, 80, 120, 80, 40, 0)]
+    straight = [(x, 600) for x in (0, 40, 80, 120, 160, 200, 240)]
+    slots = feed(store, {1: there_and_back, 2: straight}, times)
+    detector = BehaviourDetector()
+    assert detector.evaluate(store, slots, (0, 0), np.array([False, False])).u_turn.tolist() == [True, False]
+    assert detector.evaluate(store, slots, (0, 0), np.array([True, True])).u_turn.tolist() == [False, False]
+
+
+def test_speeding_needs_enough_history():
+    store = behaviour_store()
+    fast = [(300 * t, 0) for t in np.arange(0, 1.21, 0.2)]  # 300 px/s = 135 km/h at 8 px/m
+    slots = feed(store, {1: fast[:2]}, [0.0, 0.2])
+    assert BehaviourDetector().evaluate(store, slots, (0, 500), np.array([False])).speeding.tolist() == [False]
+    slots = feed(store, {1: fast[2:]}, np.arange(0.4, 1.21, 0.2))
+    behaviour = BehaviourDetector().evaluate(store, slots, (0, 500), np.array([False]))
+    assert behaviour.speeding.tolist() == [True]
+    assert behaviour.speed_kmh[0] == pytest.approx(135, rel=0.01)
@@ -0,0 +1,33 @@
+"""
+Standalone trackers
+For code paths that run model.predict and track themselves (batched streams,
+tiled inference) instead of calling model.track.
+"""
+import numpy as np
+from ultralytics.engine.results import Boxes
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+TRACKER_CONFIG = 'bytetrack.yaml'
+TRACKER_FRAME_RATE = 30
+
+
+def create_tracker(config=TRACKER_CONFIG, frame_rate=TRACKER_FRAME_RATE):
+    """A fresh tracker with its own track ids and state"""
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(config)))
+    return TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+
+
+def tracks_to_detections(tracks):
+    """Tracker output rows (x1, y1, x2, y2, id, conf, cls, idx) in extract_detections layout"""
+    if len(tracks) == 0:
+        return np.empty((0, 7))
+    tracks = np.asarray(tracks, dtype=float)
+    return np.column_stack([tracks[:, 4], tracks[:, 6], tracks[:, 5], tracks[:, :4]])
+
+
+def update_tracker(tracker, boxes, frame):
+    """Track (N, 6) x1, y1, x2, y2, conf, cls detections of a frame; returns extract_detections layout"""
+    tracks = tracker.update(Boxes(boxes, frame.shape[:2]), frame)
+    return tracks_to_detections(tracks)
@@ -0,0 +1,151 @@
+"""
+Per-track trajectories and risky-behaviour checks
+Every live track owns a slot in fixed-size NumPy arrays: a ring of its last
+centers and their times, sampled at most every SAMPLE_INTERVAL seconds. Each
+frame, speed, heading around the roundabout and U-turn shape are computed
+for all tracks at once with array operations, with no per-track Python loop.
+Flags are kept per slot, so each track counts at most once per behaviour.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+TRAJECTORY_LENGTH = 32  # Samples kept per track
+SAMPLE_INTERVAL = 0.2  # Seconds between samples, so the ring covers about 6 seconds
+SPEED_SAMPLES = 5  # Speed is measured over the last this many samples (about a second)
+MIN_TRACK_SECONDS = 0.6  # History needed before a track is judged
+MIN_MOVING_SPEED = 15.0  # Pixels per second; slower tracks have no reliable heading
+
+PIXELS_PER_METER = 8.0  # Camera dependent; calibrate per installation
+SPEED_LIMIT_KMH = 50.0
+WRONG_WAY_SHARE = 0.5  # Share of the speed going against the circulation
+U_TURN_COS = -0.7  # Heading change of the second half of the window vs the first
+U_TURN_MIN_DISTANCE = 40.0  # Pixels each leg of a U-turn must cover
+
+# Signed direction around the roundabout center, image coordinates (y down)
+CIRCULATION = {'clockwise': 1.0, 'counterclockwise': -1.0}
+
+# Behaviour flag bits per track
+FLAG_WRONG_WAY = 1
+FLAG_U_TURN = 2
+FLAG_SPEEDING = 4
+
+Behaviour = namedtuple('Behaviour', ['speed_kmh', 'wrong_way', 'u_turn', 'speeding'])
+
+
+class TrajectoryStore:
+    """Ring buffers of recent centers for every live track"""
+
+    def __init__(self, capacity=256, length=TRAJECTORY_LENGTH, sample_interval=SAMPLE_INTERVAL):
+        self.length = length
+        self.sample_interval = sample_interval
+        self.points = np.zeros((capacity, length, 2), dtype=np.float32)
+        self.times = np.zeros((capacity, length))
+        self.count = np.zeros(capacity, dtype=np.int32)
+        self.head = np.zeros(capacity, dtype=np.int32)  # Next write position
+        self.flags = np.zeros(capacity, dtype=np.uint8)
+        self._slots = {}
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _grow(self):
+        capacity = len(self.count)
+        self.points = np.concatenate([self.points, np.zeros_like(self.points)])
+        self.times = np.concatenate([self.times, np.zeros_like(self.times)])
+        self.count = np.concatenate([self.count, np.zeros_like(self.count)])
+        self.head = np.concatenate([self.head, np.zeros_like(self.head)])
+        self.flags = np.concatenate([self.flags, np.zeros_like(self.flags)])
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def slots(self, track_ids):
+        """Slot of each track id, allocating slots for new tracks"""
+        slots = self._slots
+        result = []
+        for track_id in track_ids:
+            slot = slots.get(track_id)
+            if slot is None:
+                if not self._free:
+                    self._grow()
+                slot = slots[track_id] = self._free.pop()
+            result.append(slot)
+        return np.array(result, dtype=np.intp)
+
+    def update(self, track_ids, points, t):
+        """Record the centers of the tracks seen at time t; returns their slots"""
+        slots = self.slots(track_ids.tolist())
+        last = (self.head[slots] - 1) % self.length
+        due = (self.count[slots] == 0) | (t - self.times[slots, last] >= self.sample_interval)
+        slots_due = slots[due]
+        head = self.head[slots_due]
+        self.points[slots_due, head] = points[due]
+        self.times[slots_due, head] = t
+        self.head[slots_due] = (head + 1) % self.length
+        self.count[slots_due] = np.minimum(self.count[slots_due] + 1, self.length)
+        return slots
+
+    def remove(self, track_id):
+        slot = self._slots.pop(track_id, None)
+        if slot is not None:
+            self.count[slot] = 0
+            self.head[slot] = 0
+            self.flags[slot] = 0
+            self._free.append(slot)
+
+    def sample(self, slots, back):
+        """(points, times) `back` samples before the newest one, clamped to the oldest"""
+        back = np.minimum(back, self.count[slots] - 1)
+        index = (self.head[slots] - 1 - back) % self.length
+        return self.points[slots, index], self.times[slots, index]
+
+    def mark(self, slots, flag, mask):
+        """Set flag on the masked slots; returns how many didn't have it yet"""
+        slots = slots[mask]
+        new = (self.flags[slots] & flag) == 0
+        self.flags[slots] |= flag
+        return int(new.sum())
+
+
+class BehaviourDetector:
+    """Speeding, wrong-way and U-turn checks over a TrajectoryStore"""
+
+    def __init__(self, circulation='counterclockwise', pixels_per_meter=PIXELS_PER_METER,
+                 speed_limit_kmh=SPEED_LIMIT_KMH):
+        self.direction = CIRCULATION[circulation]
+        self.pixels_per_meter = pixels_per_meter
+        self.speed_limit_kmh = speed_limit_kmh
+
+    def evaluate(self, store, slots, center, in_roundabout):
+        """Behaviour arrays for slots; wrong way is judged inside the roundabout, U-turns outside it"""
+        count = store.count[slots]
+        last, t_last = store.sample(slots, np.zeros_like(count))
+        recent, t_recent = store.sample(slots, np.full_like(count, SPEED_SAMPLES - 1))
+        first, t_first = store.sample(slots, count - 1)
+        middle, _ = store.sample(slots, (count - 1) // 2)
+        judged = (t_last - t_first) >= MIN_TRACK_SECONDS
+
+        # Speed over the last second or so
+        movement = last - recent
+        speed = np.hypot(movement[:, 0], movement[:, 1]) / np.maximum(t_last - t_recent, 1e-6)
+        speed_kmh = speed / self.pixels_per_meter * 3.6
+        speeding = judged & (speed_kmh > self.speed_limit_kmh)
+
+        # Tangential part of the movement around the center; the sign gives the direction
+        radial = last - np.asarray(center, dtype=np.float32)
+        radius = np.maximum(np.hypot(radial[:, 0], radial[:, 1]), 1e-6)
+        tangential = (radial[:, 0] * movement[:, 1] - radial[:, 1] * movement[:, 0]) / radius
+        tangential /= np.maximum(t_last - t_recent, 1e-6)
+        wrong_way = (judged & in_roundabout & (speed > MIN_MOVING_SPEED)
+                     & (tangential * self.direction < -WRONG_WAY_SHARE * speed))
+
+        # U-turn: second half of the window heads back against the first half
+        first_leg = middle - first
+        second_leg = last - middle
+        first_length = np.hypot(first_leg[:, 0], first_leg[:, 1])
+        second_length = np.hypot(second_leg[:, 0], second_leg[:, 1])
+        cos = (first_leg * second_leg).sum(axis=1) / np.maximum(first_length * second_length, 1e-6)
+        u_turn = (judged & ~in_roundabout & (first_length > U_TURN_MIN_DISTANCE)
+                  & (second_length > U_TURN_MIN_DISTANCE) & (cos < U_TURN_COS))
+
+        return Behaviour(speed_kmh, wrong_way, u_turn, speeding)
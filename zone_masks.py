@@ -0,0 +1,76 @@
+"""
+Rasterized zone lookup
+The zone polygons are drawn once per frame shape into a single mask image with
+one bit per zone, so zone membership for every detection in a frame is one
+NumPy gather over the center points instead of a polygon test per box.
+"""
+import cv2
+import numpy as np
+
+# Config keys of the zone polygons, in zone bit order
+ZONE_KEYS = ('roundabout', 'firstCarZone', 'secondCarZone')
+
+
+class ZoneMask:
+    """Bitmask image of a set of zone polygons"""
+
+    def __init__(self, shape, polygons):
+        """polygons: zone polygons in bit order (bit i set = inside polygons[i])"""
+        height, width = shape[:2]
+        if len(polygons) <= 8:
+            dtype = np.uint8
+        elif len(polygons) <= 16:
+            dtype = np.uint16
+        else:
+            dtype = np.uint32
+        self.shape = (height, width)
+        self.mask = np.zeros(self.shape, dtype=dtype)
+
+        self.centroids = []  # (x, y) center of each zone, None when it is off the frame
+        layer = np.zeros(self.shape, dtype=np.uint8)
+        for bit, polygon in enumerate(polygons):
+            layer[:] = 0
+            points = np.asarray(polygon, dtype=np.int32).reshape(-1, 1, 2)
+            cv2.fillPoly(layer, [points], 1)
+            self.mask[layer.astype(bool)] |= dtype(1 << bit)
+            moments = cv2.moments(layer, binaryImage=True)
+            self.centroids.append((moments['m10'] / moments['m00'], moments['m01'] / moments['m00'])
+                                  if moments['m00'] else None)
+
+    def lookup(self, points):
+        """Zone bits for an (N, 2) array of x, y points; points off the frame get 0"""
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        x = points[:, 0]
+        y = points[:, 1]
+        height, width = self.shape
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        bits = np.zeros(len(points), dtype=self.mask.dtype)
+        bits[inside] = self.mask[y[inside], x[inside]]
+        return bits
+
+    @staticmethod
+    def has(bits, bit):
+        """Boolean array: which entries of bits are inside zone number bit"""
+        return (bits >> bit) & 1 == 1
+
+
+class ZoneMaskCache:
+    """One ZoneMask per frame shape, built on first use"""
+
+    def __init__(self, build_polygons):
+        """build_polygons(frame_shape) -> list of polygons in bit order"""
+        self.build_polygons = build_polygons
+        self._masks = {}
+
+    def get(self, shape):
+        key = tuple(shape[:2])
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._masks[key] = ZoneMask(key, self.build_polygons(shape))
+        return mask
+
+
+def config_polygons(zones):
+    """build_polygons function returning fixed zones, {zone key: [[x, y], ...]} in pixels"""
+    polygons = [np.asarray(zones[key], dtype=np.int32) for key in ZONE_KEYS]
+    return lambda frame_shape: polygons